@@ -0,0 +1,49 @@
+"""Low-stock index table and inventory shortfall index
+
+Revision ID: a41c7e2b9d03
+Revises: f75ddf0f5bd8
+Create Date: 2026-10-18 09:12:04.118202
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a41c7e2b9d03'
+down_revision: Union[str, None] = 'f75ddf0f5bd8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index(
+        'ix_inventory_shortfall',
+        'inventory',
+        [sa.text('(reorder_threshold - quantity_on_hand)'), 'product_id'],
+        unique=False,
+    )
+    op.create_table('inventory_low_stock',
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('inventory_id', sa.Integer(), nullable=False),
+    sa.Column('shortfall', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['inventory_id'], ['inventory.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('product_id')
+    )
+    op.create_index('ix_inventory_low_stock_shortfall', 'inventory_low_stock', ['shortfall', 'product_id'], unique=False)
+    op.execute(
+        "INSERT INTO inventory_low_stock (product_id, inventory_id, shortfall) "
+        "SELECT product_id, id, reorder_threshold - quantity_on_hand "
+        "FROM inventory WHERE quantity_on_hand <= reorder_threshold"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_low_stock_shortfall', table_name='inventory_low_stock')
+    op.drop_table('inventory_low_stock')
+    op.drop_index('ix_inventory_shortfall', table_name='inventory')
@@ -0,0 +1,30 @@
+"""Keyset indexes on inventory_history
+
+Revision ID: b7d2e94f10c6
+Revises: a41c7e2b9d03
+Create Date: 2026-10-18 10:02:37.540118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b7d2e94f10c6'
+down_revision: Union[str, None] = 'a41c7e2b9d03'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_inventory_history_changed', 'inventory_history', ['changed_at', 'id'], unique=False)
+    op.create_index('ix_inventory_history_product_changed', 'inventory_history', ['product_id', 'changed_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_history_product_changed', table_name='inventory_history')
+    op.drop_index('ix_inventory_history_changed', table_name='inventory_history')
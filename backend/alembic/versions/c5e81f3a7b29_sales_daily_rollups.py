@@ -0,0 +1,60 @@
+"""Sales daily rollup tables
+
+Revision ID: c5e81f3a7b29
+Revises: b7d2e94f10c6
+Create Date: 2026-10-18 11:40:12.903317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c5e81f3a7b29'
+down_revision: Union[str, None] = 'b7d2e94f10c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('sales_daily_rollup',
+    sa.Column('sale_day', sa.Date(), nullable=False),
+    sa.Column('revenue', sa.DECIMAL(precision=14, scale=2), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('sale_day')
+    )
+    op.create_table('sales_category_daily_rollup',
+    sa.Column('sale_day', sa.Date(), nullable=False),
+    sa.Column('category_id', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.DECIMAL(precision=14, scale=2), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['category_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('sale_day', 'category_id')
+    )
+    op.create_index('ix_sales_category_daily_rollup_category', 'sales_category_daily_rollup', ['category_id', 'sale_day'], unique=False)
+    op.execute(
+        "INSERT INTO sales_daily_rollup (sale_day, revenue, order_count, units) "
+        "SELECT DATE(s.sale_date), SUM(s.total_amount), COUNT(s.id), COALESCE(SUM(u.units), 0) "
+        "FROM sales s LEFT JOIN ("
+        "  SELECT sale_id, SUM(quantity) AS units FROM sale_items GROUP BY sale_id"
+        ") u ON u.sale_id = s.id "
+        "GROUP BY DATE(s.sale_date)"
+    )
+    op.execute(
+        "INSERT INTO sales_category_daily_rollup (sale_day, category_id, revenue, order_count, units) "
+        "SELECT DATE(s.sale_date), p.category_id, SUM(si.line_total), COUNT(DISTINCT s.id), SUM(si.quantity) "
+        "FROM sales s JOIN sale_items si ON si.sale_id = s.id JOIN products p ON p.id = si.product_id "
+        "GROUP BY DATE(s.sale_date), p.category_id"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_sales_category_daily_rollup_category', table_name='sales_category_daily_rollup')
+    op.drop_table('sales_category_daily_rollup')
+    op.drop_table('sales_daily_rollup')
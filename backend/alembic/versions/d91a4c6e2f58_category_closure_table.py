@@ -0,0 +1,46 @@
+"""Category closure table
+
+Revision ID: d91a4c6e2f58
+Revises: c5e81f3a7b29
+Create Date: 2026-10-18 15:02:37.118402
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd91a4c6e2f58'
+down_revision: Union[str, None] = 'c5e81f3a7b29'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('category_closure',
+    sa.Column('ancestor_id', sa.Integer(), nullable=False),
+    sa.Column('descendant_id', sa.Integer(), nullable=False),
+    sa.Column('depth', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['ancestor_id'], ['categories.id'], ),
+    sa.ForeignKeyConstraint(['descendant_id'], ['categories.id'], ),
+    sa.PrimaryKeyConstraint('ancestor_id', 'descendant_id')
+    )
+    op.create_index('ix_category_closure_descendant', 'category_closure', ['descendant_id', 'depth'], unique=False)
+    op.execute(
+        "INSERT INTO category_closure (ancestor_id, descendant_id, depth) "
+        "WITH RECURSIVE paths (ancestor_id, descendant_id, depth) AS ("
+        "  SELECT id, id, 0 FROM categories"
+        "  UNION ALL"
+        "  SELECT p.ancestor_id, c.id, p.depth + 1"
+        "  FROM paths p JOIN categories c ON c.parent_id = p.descendant_id"
+        ") SELECT ancestor_id, descendant_id, depth FROM paths"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_category_closure_descendant', table_name='category_closure')
+    op.drop_table('category_closure')
@@ -0,0 +1,36 @@
+"""Inventory snapshots table
+
+Revision ID: e8b3f1c2a6d4
+Revises: d91a4c6e2f58
+Create Date: 2026-10-18 17:21:45.603118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b3f1c2a6d4'
+down_revision: Union[str, None] = 'd91a4c6e2f58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('inventory_snapshots',
+    sa.Column('taken_at', sa.DateTime(timezone=True), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity_on_hand', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['product_id'], ['products.id'], ),
+    sa.PrimaryKeyConstraint('taken_at', 'product_id')
+    )
+    op.create_index('ix_inventory_snapshots_product', 'inventory_snapshots', ['product_id', 'taken_at'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_inventory_snapshots_product', table_name='inventory_snapshots')
+    op.drop_table('inventory_snapshots')
@@ -0,0 +1,309 @@
+"""
+Result cache for the sales analytics endpoints.
+
+Entries are serialized JSON response bodies keyed by the endpoint and its
+normalized parameters. Each entry records the sale_date ranges it was
+computed from (naive, in DB_TIMEZONE, half-open), so a new sale only drops
+the entries whose ranges contain its sale_date. Ranges that ended before
+"now" are closed -- only a back-dated write can change them, and that write
+invalidates them -- so they get the long ANALYTICS_CACHE_CLOSED_TTL, but
+only in a backend shared by every worker: an invalidation reaches only the
+backend of the process that made it (a worker, or `manage.py`), so the
+per-process memory backend keeps closed entries no longer than
+ANALYTICS_CACHE_TTL, bounding how stale another worker's write leaves it.
+
+Backends:
+  memory  per-process LRU (default)
+  sqlite  a SQLite file shared by every worker on the host
+  off     no caching
+"""
+import bisect
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable, Iterable, List, Optional, Sequence, Tuple
+from zoneinfo import ZoneInfo
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from .config import settings
+
+# [lo, hi) in DB time; None means unbounded on that side
+Range = Tuple[Optional[datetime], Optional[datetime]]
+
+BYPASS_HEADER = "x-cache-bypass"
+
+
+def _overlaps(ranges: Sequence[Range], days: List[datetime]) -> bool:
+    """Whether any of the sorted instants `days` falls inside one of `ranges`."""
+    for lo, hi in ranges:
+        i = 0 if lo is None else bisect.bisect_left(days, lo)
+        if i < len(days) and (hi is None or days[i] < hi):
+            return True
+    return False
+
+
+class MemoryBackend:
+    """Bounded LRU dict with per-entry expiry, local to this process."""
+    name = "memory"
+    shared = False
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[bytes, float, Sequence[Range]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key: str, body: bytes, ttl: float, ranges: Sequence[Range]) -> int:
+        """Store an entry; returns how many were evicted to make room."""
+        with self._lock:
+            self._entries[key] = (body, time.time() + ttl, tuple(ranges))
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def invalidate(self, days: List[datetime]) -> int:
+        with self._lock:
+            stale = [k for k, (_, _, ranges) in self._entries.items() if _overlaps(ranges, days)]
+            for k in stale:
+                del self._entries[k]
+            return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteBackend:
+    """
+    LRU over a local SQLite file, so every worker process on the host shares
+    entries and invalidations. Ranges live in their own indexed table.
+    """
+    name = "sqlite"
+    shared = True
+
+    def __init__(self, path: str, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "  key TEXT PRIMARY KEY, body BLOB NOT NULL,"
+            "  expires REAL NOT NULL, used REAL NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_entries_used ON entries (used);"
+            "CREATE TABLE IF NOT EXISTS ranges ("
+            "  key TEXT NOT NULL, lo TEXT NOT NULL, hi TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS ix_ranges_lo ON ranges (lo, hi);"
+            "CREATE INDEX IF NOT EXISTS ix_ranges_key ON ranges (key);"
+        )
+
+    @staticmethod
+    def _bound(v: Optional[datetime], default: str) -> str:
+        return default if v is None else v.isoformat(sep=" ")
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT body FROM entries WHERE key = ? AND expires > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute("UPDATE entries SET used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def put(self, key: str, body: bytes, ttl: float, ranges: Sequence[Range]) -> int:
+        now = time.time()
+        with self._lock:
+            c = self._conn
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                self._delete(c, [key])
+                c.execute("INSERT INTO entries VALUES (?, ?, ?, ?)", (key, body, now + ttl, now))
+                c.executemany("INSERT INTO ranges VALUES (?, ?, ?)", [
+                    (key, self._bound(lo, ""), self._bound(hi, "~")) for lo, hi in ranges
+                ])
+                expired = [k for (k,) in c.execute("SELECT key FROM entries WHERE expires <= ?", (now,))]
+                self._delete(c, expired)
+                (count,) = c.execute("SELECT COUNT(*) FROM entries").fetchone()
+                evicted = max(0, count - self.max_entries)
+                if evicted:
+                    self._delete(c, [k for (k,) in c.execute(
+                        "SELECT key FROM entries ORDER BY used LIMIT ?", (evicted,)
+                    )])
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+            return evicted
+
+    @staticmethod
+    def _delete(c, keys: List[str]) -> int:
+        c.executemany("DELETE FROM ranges WHERE key = ?", [(k,) for k in keys])
+        c.executemany("DELETE FROM entries WHERE key = ?", [(k,) for k in keys])
+        return len(keys)
+
+    def invalidate(self, days: List[datetime]) -> int:
+        with self._lock:
+            stale = set()
+            for d in days:
+                t = d.isoformat(sep=" ")
+                stale.update(k for (k,) in self._conn.execute(
+                    "SELECT key FROM ranges WHERE lo <= ? AND hi > ?", (t, t)
+                ))
+            self._conn.execute("BEGIN IMMEDIATE")
+            removed = self._delete(self._conn, list(stale))
+            self._conn.execute("COMMIT")
+            return removed
+
+    def clear(self):
+        with self._lock:
+            self._conn.executescript("DELETE FROM ranges; DELETE FROM entries;")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+
+class AnalyticsCache:
+    """A backend plus this process's hit/miss/eviction counters."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = dict.fromkeys(
+            ("hits", "misses", "bypasses", "stores", "evictions", "invalidations"), 0
+        )
+        # bumped on every invalidation, so a result computed while a write
+        # landed is not stored over the invalidation
+        self.generation = 0
+        # monotonic time of the last invalidation in this process: with read
+        # replicas, results computed in the next READ_YOUR_WRITES_SECONDS may
+        # come from a replica that has not applied the write yet, so they are
+        # not stored (writes through other workers are not seen here)
+        self.invalidated_at = float("-inf")
+
+    def get(self, key: str) -> Optional[bytes]:
+        if self.backend is None:
+            return None
+        body = self.backend.get(key)
+        self.counters["hits" if body is not None else "misses"] += 1
+        return body
+
+    def put(self, key: str, body: bytes, ranges: Sequence[Range], generation: int):
+        if self.backend is None or generation != self.generation:
+            return
+        if (settings.DATABASE_REPLICA_URLS
+                and time.monotonic() - self.invalidated_at < settings.READ_YOUR_WRITES_SECONDS):
+            return
+        closed = all(hi is not None and hi <= _db_now() for _, hi in ranges)
+        long_lived = closed and self.backend.shared
+        ttl = settings.ANALYTICS_CACHE_CLOSED_TTL if long_lived else settings.ANALYTICS_CACHE_TTL
+        self.counters["evictions"] += self.backend.put(key, body, ttl, ranges)
+        self.counters["stores"] += 1
+
+    def invalidate(self, sale_dates: Iterable[datetime]):
+        """Drop every entry computed over one of `sale_dates`."""
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        if self.backend is None:
+            return
+        days = sorted({_to_db_time(d) for d in sale_dates})
+        if days:
+            self.counters["invalidations"] += self.backend.invalidate(days)
+
+    def clear(self):
+        self.generation += 1
+        self.invalidated_at = time.monotonic()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend.name if self.backend is not None else "off",
+            "entries": len(self.backend) if self.backend is not None else 0,
+            **self.counters,
+        }
+
+
+def _db_zone() -> ZoneInfo:
+    return ZoneInfo(settings.DB_TIMEZONE)
+
+
+def _db_now() -> datetime:
+    return datetime.now(_db_zone()).replace(tzinfo=None)
+
+
+def _to_db_time(d) -> datetime:
+    if not isinstance(d, datetime):
+        d = datetime.combine(d, datetime.min.time())
+    return d.astimezone(_db_zone()).replace(tzinfo=None) if d.tzinfo else d
+
+
+def cache_key(endpoint: str, **params) -> str:
+    raw = json.dumps([endpoint, params], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+async def cached_json(
+    request:  Request,
+    key:      str,
+    compute:  Callable,
+    encode:   Callable[[object], bytes],
+    ranges:   Callable[[], Sequence[Range]],
+) -> Response:
+    """
+    Serve `key` from the cache, or await `compute()`, encode it and cache it
+    under the sale_date `ranges()` it covers. `X-Cache-Bypass: 1` skips the
+    lookup (the fresh result still replaces the entry); the outcome is
+    reported in an `X-Cache: HIT | MISS | BYPASS` response header.
+    """
+    bypass = request.headers.get(BYPASS_HEADER, "").lower() in ("1", "true", "yes")
+    if bypass:
+        cache.counters["bypasses"] += 1
+    else:
+        body = cache.get(key)
+        if body is not None:
+            return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+
+    generation = cache.generation
+    body = encode(await compute())
+    cache.put(key, body, ranges(), generation)
+    return Response(body, media_type="application/json",
+                    headers={"X-Cache": "BYPASS" if bypass else "MISS"})
+
+
+def _make_backend():
+    kind = settings.ANALYTICS_CACHE
+    if kind == "off":
+        return None
+    if kind == "sqlite":
+        return SQLiteBackend(settings.ANALYTICS_CACHE_PATH, settings.ANALYTICS_CACHE_SIZE)
+    if kind == "memory":
+        return MemoryBackend(settings.ANALYTICS_CACHE_SIZE)
+    raise ValueError(f"Unknown ANALYTICS_CACHE backend: {kind}")
+
+
+cache = AnalyticsCache(_make_backend())
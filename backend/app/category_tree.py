@@ -0,0 +1,93 @@
+"""
+Immutable in-memory snapshot of the category hierarchy.
+
+A snapshot is built from one `SELECT id, name, parent_id FROM categories`
+and never mutated afterwards; a category write swaps in a fresh one (see
+crud.categories.get_tree), so readers can hold a reference without locking.
+"""
+import json
+import time
+from collections import defaultdict
+from types import MappingProxyType
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+
+
+class CategoryNode(NamedTuple):
+    id:        int
+    name:      str
+    parent_id: Optional[int]
+    depth:     int
+    children:  Tuple["CategoryNode", ...]
+
+
+class CategoryTree:
+    __slots__ = ("nodes", "roots", "built_at", "_json")
+
+    def __init__(self, rows: Iterable[Tuple[int, str, Optional[int]]]):
+        rows = list(rows)
+        known = {id_ for id_, _, _ in rows}
+        kids = defaultdict(list)
+        for id_, name, parent_id in rows:
+            # a dangling parent_id makes the category a root rather than vanish
+            kids[parent_id if parent_id in known else None].append((id_, name, parent_id))
+
+        # depth-first order from the roots, then build bottom-up so every
+        # node is created after (and holds a tuple of) its children
+        depth, order, stack = {}, [], [(r, 0) for r in kids[None]]
+        while stack:
+            row, d = stack.pop()
+            depth[row[0]] = d
+            order.append(row)
+            stack.extend((k, d + 1) for k in kids[row[0]])
+
+        nodes = {}
+        for id_, name, parent_id in reversed(order):
+            children = tuple(sorted((nodes[k[0]] for k in kids[id_]), key=lambda n: n.id))
+            nodes[id_] = CategoryNode(id_, name, parent_id, depth[id_], children)
+
+        self.nodes = MappingProxyType(nodes)
+        self.roots = tuple(sorted((nodes[r[0]] for r in kids[None]), key=lambda n: n.id))
+        self.built_at = time.monotonic()
+        self._json = None
+
+    def __len__(self) -> int:
+        return len(self.nodes)
+
+    def subtree_ids(self, category_id: int) -> List[int]:
+        """`category_id` and every category below it; [] if unknown."""
+        node = self.nodes.get(category_id)
+        out, stack = [], [node] if node else []
+        while stack:
+            node = stack.pop()
+            out.append(node.id)
+            stack.extend(node.children)
+        return out
+
+    def ancestors(self, category_id: int) -> List[int]:
+        """Parent, grandparent, ... up to the root."""
+        out, node = [], self.nodes.get(category_id)
+        while node is not None and node.parent_id in self.nodes:
+            out.append(node.parent_id)
+            node = self.nodes[node.parent_id]
+        return out
+
+    def to_json(self, root_id: Optional[int] = None) -> bytes:
+        """
+        The forest (or the subtree at `root_id`) as a JSON list of nested
+        {id, name, parent_id, children} objects. The full forest is encoded
+        once per snapshot.
+        """
+        if root_id is not None:
+            return json.dumps([_as_dict(self.nodes[root_id])], separators=(",", ":")).encode()
+        if self._json is None:
+            self._json = json.dumps([_as_dict(r) for r in self.roots], separators=(",", ":")).encode()
+        return self._json
+
+
+def _as_dict(node: CategoryNode) -> dict:
+    return {
+        "id": node.id,
+        "name": node.name,
+        "parent_id": node.parent_id,
+        "children": [_as_dict(c) for c in node.children],
+    }
@@ -1,8 +1,111 @@
+from typing import Optional
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
     DATABASE_URL: str
 
+    # connection pool per engine (per worker process): base size, extra
+    # connections allowed under load, seconds to wait for one before failing,
+    # and seconds after which a connection is replaced (-1: never; set it
+    # below MySQL's wait_timeout)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30
+    DB_POOL_RECYCLE: int = -1
+    # liveness check on checkout: "always" (a round trip every checkout),
+    # "idle" (only after DB_POOL_PING_IDLE seconds unused) or "never"
+    DB_POOL_PRE_PING: str = "always"
+    DB_POOL_PING_IDLE: int = 30
+    # ";"-separated statements run on every new connection, e.g.
+    # "SET SESSION innodb_lock_wait_timeout = 5" or "PRAGMA busy_timeout = 5000"
+    DB_SESSION_SETTINGS: str = ""
+
+    # run request handlers on an AsyncEngine (aiomysql / aiosqlite / asyncpg)
+    # instead of the blocking engine in Starlette's threadpool
+    ASYNC_DB: bool = False
+    # defaults to DATABASE_URL with the driver swapped for its async twin
+    ASYNC_DATABASE_URL: Optional[str] = None
+
+    # comma-separated read replica URLs; GET endpoints read from them round
+    # robin (async twins are derived like ASYNC_DATABASE_URL)
+    DATABASE_REPLICA_URLS: str = ""
+    # seconds after a write during which the writing client reads from the
+    # primary; keep it above the replicas' worst replication lag
+    READ_YOUR_WRITES_SECONDS: int = 5
+
+    # serve /inventory/low-stock from the maintained inventory_low_stock
+    # table; when off, query inventory through ix_inventory_shortfall
+    LOW_STOCK_INDEX: bool = True
+
+    # how many levels of Category.children a response embeds
+    CATEGORY_TREE_DEPTH: int = 3
+    # seconds the in-memory category tree is served before it is reloaded;
+    # writes through this process invalidate it at once
+    CATEGORY_TREE_TTL: int = 60
+
+    # GET /products/search: build the in-memory index at startup (else on the
+    # first search), seconds before products created by other workers are
+    # picked up, and matches of a query's rarest word that are ranked
+    PRODUCT_SEARCH_PRELOAD: bool = True
+    PRODUCT_SEARCH_REFRESH: int = 30
+    PRODUCT_SEARCH_MAX_CANDIDATES: int = 20000
+
+    # hot-key cache of GET /products/{id}, /products/by-sku/{sku} and
+    # /inventory/{product_id} responses (see app/lookup_cache.py): entries
+    # per process (0: off), seconds an entry is served (writes through this
+    # process invalidate it at once), and seconds an unknown id or SKU is
+    # remembered
+    LOOKUP_CACHE_SIZE: int = 10000
+    LOOKUP_CACHE_TTL: int = 30
+    LOOKUP_CACHE_NEGATIVE_TTL: int = 5
+
+    # batch reads by id list (see app/multi_get.py): ids per request, and
+    # ids per IN (...) query
+    MULTI_GET_MAX_IDS: int = 5000
+    MULTI_GET_CHUNK_SIZE: int = 1000
+
+    # zone the naive timestamps in the database are recorded in
+    DB_TIMEZONE: str = "UTC"
+
+    # result cache for /sales/stats and /sales/compare: "memory" (per
+    # process), "sqlite" (a file at ANALYTICS_CACHE_PATH shared by all
+    # workers on the host) or "off"
+    ANALYTICS_CACHE: str = "memory"
+    ANALYTICS_CACHE_PATH: str = "analytics_cache.db"
+    ANALYTICS_CACHE_SIZE: int = 1024
+    # seconds an entry lives when its range reaches into the present, and
+    # when it is wholly in the past (new sales invalidate either at once in
+    # the writing process; the long TTL applies only to the shared sqlite
+    # backend, memory entries never outlive ANALYTICS_CACHE_TTL)
+    ANALYTICS_CACHE_TTL: int = 60
+    ANALYTICS_CACHE_CLOSED_TTL: int = 86400
+
+    # comma-separated list endpoints served by the ORM-free read path
+    # (products, sales, sale_items, inventory); see app/fast_read.py
+    FAST_READ_ENDPOINTS: str = ""
+
+    # `manage.py archive-history` moves inventory history older than this
+    # many days into compressed segment files in HISTORY_ARCHIVE_DIR (read
+    # back transparently by the history endpoints; see app/history_archive.py)
+    HISTORY_RETENTION_DAYS: int = 365
+    HISTORY_ARCHIVE_DIR: str = "history_archive"
+    # spacing of the stock snapshots written by `manage.py snapshot-inventory`
+    # (point-in-time reads replay at most this much history)
+    INVENTORY_SNAPSHOT_INTERVAL_HOURS: int = 24
+
+    # rows fetched per round trip by the streaming /export endpoints
+    EXPORT_BATCH_SIZE: int = 5000
+
+    # sales per transaction for POST /sales/bulk
+    BULK_SALES_BATCH_SIZE: int = 1000
+
+    # lines per transaction for POST /inventory/adjustments
+    INVENTORY_ADJUST_BATCH_SIZE: int = 1000
+
+    # per-request SQL stats in a Server-Timing header, and per-route
+    # Prometheus histograms at /metrics (see app/metrics.py)
+    REQUEST_METRICS: bool = True
+
     model_config = SettingsConfigDict(env_file=".env")
 
 settings = Settings()
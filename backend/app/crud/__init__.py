@@ -1,21 +1,41 @@
-from .categories import create_category, get_category, list_categories
-from .inventory import get_inventory, list_inventory, update_inventory
+from .categories import (
+    create_category, get_category, list_categories,
+    rebuild_closure, subtree_ids, get_tree, invalidate_tree,
+)
+from .inventory import (
+    get_inventory, get_inventories, list_inventory, update_inventory, adjust_inventory, apply_adjustments,
+    list_low_stock, refresh_low_stock, rebuild_low_stock,
+    apply_stock_changes, InsufficientStockError,
+)
 from .inventory_history import record_inventory_change, list_inventory_history
-from .products import create_product, get_product, list_products
-from .sales import create_sale, get_sale, list_sales
+from .inventory_snapshots import inventory_as_of, stock_as_of, snapshot_inventory, check_snapshots
+from .products import (
+    create_product, get_product, get_products, get_product_by_sku, list_products, search_products,
+)
+from .sales import create_sale, create_sales_bulk, get_sale, get_sales_by_ids, list_sales
 from .sales_items import list_sale_items
+from .rollups import record_sales, rebuild_rollups, daily_totals
 
 _all_ = [
     # Category
     "create_category", "get_category", "list_categories",
+    "rebuild_closure", "subtree_ids", "get_tree", "invalidate_tree",
     # Inventory
-    "get_inventory", "list_inventory", "update_inventory",
+    "get_inventory", "get_inventories", "list_inventory", "update_inventory", "adjust_inventory",
+    "apply_adjustments",
+    "list_low_stock", "refresh_low_stock", "rebuild_low_stock",
+    "apply_stock_changes", "InsufficientStockError",
     # Inventory History
     "record_inventory_change", "list_inventory_history",
+    # Inventory Snapshots
+    "inventory_as_of", "stock_as_of", "snapshot_inventory", "check_snapshots",
     # Products
-    "create_product", "get_product", "list_products",
+    "create_product", "get_product", "get_products", "get_product_by_sku", "list_products",
+    "search_products",
     # Sales
-    "create_sale", "get_sale", "list_sales",
+    "create_sale", "create_sales_bulk", "get_sale", "get_sales_by_ids", "list_sales",
     # Sale Items
     "list_sale_items",
+    # Rollups
+    "record_sales", "rebuild_rollups", "daily_totals",
 ]
\ No newline at end of file
@@ -0,0 +1,258 @@
+import bisect
+from collections import namedtuple
+from datetime import date, datetime, time, timedelta, timezone
+from decimal import Decimal
+from typing import List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from sqlalchemy import Integer, cast, func, literal_column, select
+from sqlalchemy.exc import CompileError
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+from sqlalchemy.types import String
+
+from .. import models
+from ..config import settings
+from .rollups import daily_totals
+
+UNITS = ("hour", "day", "week", "month", "quarter", "year")
+
+Bucket = namedtuple("Bucket", "bucket_start revenue orders")
+
+# hourly buckets need both bounds, at most this many days apart: every hour
+# is zero-filled, so a year is already 8760 buckets
+MAX_HOURLY_DAYS = 92
+
+
+# --- time slots in SQL -------------------------------------------------------
+
+def _const(n: int):
+    # inlined rather than bound: the same expression appears in SELECT and
+    # GROUP BY, and servers that bind parameters see two different placeholders
+    return literal_column(str(int(n)), Integer)
+
+
+class time_slot(FunctionElement):
+    """
+    `col` truncated to the start of its hour (or quarter-hour), rendered as
+    a 'YYYY-MM-DD HH:MM:SS' string or timestamp. The WHERE clause stays a
+    plain range on `col`, so the date index drives the scan; this is only
+    evaluated for the GROUP BY.
+    """
+    type = String()
+    inherit_cache = True
+
+    def __init__(self, col, minutes: int = 60):
+        self.minutes = minutes
+        # carried as a clause too so it is part of the statement cache key
+        super().__init__(col, _const(minutes))
+
+
+@compiles(time_slot)
+def _time_slot_default(element, compiler, **kw):
+    raise CompileError(f"time_slot is not supported on {compiler.dialect.name}")
+
+
+@compiles(time_slot, "mysql")
+def _time_slot_mysql(element, compiler, **kw):
+    col = list(element.clauses)[0]
+    if element.minutes == 60:
+        expr = func.date_format(col, literal_column("'%Y-%m-%d %H:00:00'"))
+    else:
+        expr = func.concat(
+            func.date_format(col, literal_column("'%Y-%m-%d %H:'")),
+            func.lpad((func.minute(col) // _const(element.minutes)) * _const(element.minutes),
+                      literal_column("2"), literal_column("'0'")),
+            literal_column("':00'"),
+        )
+    return compiler.process(expr, **kw)
+
+
+@compiles(time_slot, "postgresql")
+def _time_slot_postgresql(element, compiler, **kw):
+    col = list(element.clauses)[0]
+    expr = func.date_trunc(literal_column("'hour'"), col)
+    if element.minutes != 60:
+        minute = cast(func.extract("minute", col), Integer)
+        expr = expr + (minute // _const(element.minutes)) * literal_column(
+            f"interval '{element.minutes} minutes'"
+        )
+    return compiler.process(expr, **kw)
+
+
+@compiles(time_slot, "sqlite")
+def _time_slot_sqlite(element, compiler, **kw):
+    col = list(element.clauses)[0]
+    if element.minutes == 60:
+        expr = func.strftime(literal_column("'%Y-%m-%d %H:00:00'"), col)
+    else:
+        minute = cast(func.strftime(literal_column("'%M'"), col), Integer)
+        expr = (
+            func.strftime(literal_column("'%Y-%m-%d %H:'"), col)
+            .concat(func.printf(literal_column("'%02d'"),
+                                (minute // _const(element.minutes)) * _const(element.minutes)))
+            .concat(literal_column("':00'"))
+        )
+    return compiler.process(expr, **kw)
+
+
+# --- bucket boundaries -------------------------------------------------------
+
+def get_zone(tz: str) -> ZoneInfo:
+    try:
+        return ZoneInfo(tz)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f"Unknown timezone: {tz}")
+
+
+def _floor_local(d: date, unit: str) -> date:
+    if unit == "week":
+        return d - timedelta(days=d.weekday())          # ISO weeks, Monday first
+    if unit == "month":
+        return d.replace(day=1)
+    if unit == "quarter":
+        return d.replace(month=(d.month - 1) // 3 * 3 + 1, day=1)
+    if unit == "year":
+        return d.replace(month=1, day=1)
+    return d
+
+
+def _next_local(d: date, unit: str) -> date:
+    if unit == "day":
+        return d + timedelta(days=1)
+    if unit == "week":
+        return d + timedelta(days=7)
+    months = {"month": 1, "quarter": 3, "year": 12}[unit]
+    m = d.month - 1 + months
+    return d.replace(year=d.year + m // 12, month=m % 12 + 1)
+
+
+def bucket_starts(start: datetime, end: datetime, unit: str, zone: ZoneInfo) -> List[datetime]:
+    """
+    Aware start instants (in `zone`) of every `unit` bucket overlapping
+    [start, end). Hours step in absolute time, so DST transitions give 23-
+    or 25-bucket days; larger units begin at local midnight.
+    """
+    if unit not in UNITS:
+        raise ValueError(f"Invalid bucket unit: {unit}")
+    starts = []
+    if unit == "hour":
+        cur = start.astimezone(zone).replace(minute=0, second=0, microsecond=0)
+        cur = cur.astimezone(timezone.utc)
+        while cur < end:
+            starts.append(cur.astimezone(zone))
+            cur += timedelta(hours=1)
+        return starts
+    d = _floor_local(start.astimezone(zone).date(), unit)
+    while True:
+        b = datetime.combine(d, time.min, tzinfo=zone)
+        if b >= end:
+            return starts
+        starts.append(b)
+        d = _next_local(d, unit)
+
+
+# --- revenue buckets ---------------------------------------------------------
+
+def _to_db(dt: datetime, db_zone: ZoneInfo) -> datetime:
+    """Aware instant -> the naive wall time sales.sale_date stores it as."""
+    return dt.astimezone(db_zone).replace(tzinfo=None)
+
+
+def _parse_slot(v) -> datetime:
+    return v if isinstance(v, datetime) else datetime.fromisoformat(v)
+
+
+def db_range(start: Optional[date], end: Optional[date], tz: str = "UTC"):
+    """
+    Local days start..end inclusive in `tz` as a half-open [lo, hi) of naive
+    DB_TIMEZONE datetimes -- what sales.sale_date is compared against. A
+    missing bound is None.
+    """
+    zone, db_zone = get_zone(tz), get_zone(settings.DB_TIMEZONE)
+    lo = hi = None
+    if start is not None:
+        lo = _to_db(datetime.combine(start, time.min, tzinfo=zone), db_zone)
+    if end is not None:
+        hi = _to_db(datetime.combine(end + timedelta(days=1), time.min, tzinfo=zone), db_zone)
+    return lo, hi
+
+
+def revenue_buckets(
+    db:    Session,
+    unit:  str,
+    start: Optional[date] = None,
+    end:   Optional[date] = None,
+    tz:    str = "UTC",
+    category_ids=None,
+) -> List[Bucket]:
+    """
+    Revenue and order count per `unit` bucket in the caller's timezone, for
+    sales on local days start..end inclusive, with empty buckets zero-filled.
+    Without bounds the range runs from the first to the last sale, except
+    for hours: those need both, at most MAX_HOURLY_DAYS days apart.
+    `category_ids` (a list or a SELECT of ids) restricts it to those
+    categories' lines, and revenue becomes SUM(line_total).
+
+    When buckets line up with the days sales_daily_rollup is keyed on
+    (tz == DB_TIMEZONE and unit >= day) they are summed from the rollup;
+    otherwise raw sales are grouped per hour -- or quarter-hour for zones
+    with fractional offsets -- over an index range scan and re-bucketed here.
+    """
+    zone, db_zone = get_zone(tz), get_zone(settings.DB_TIMEZONE)
+    if unit not in UNITS:
+        raise ValueError(f"Invalid bucket unit: {unit}")
+
+    if unit == "hour":
+        if start is None or end is None:
+            raise ValueError("Hourly buckets need start_date and end_date")
+        if (end - start).days + 1 > MAX_HOURLY_DAYS:
+            raise ValueError(f"Hourly buckets span at most {MAX_HOURLY_DAYS} days")
+
+    sale = models.Sale
+    if start is None or end is None:
+        first, last = db.execute(select(func.min(sale.sale_date), func.max(sale.sale_date))).one()
+        if first is None:
+            return []
+        first, last = (_parse_slot(v).replace(tzinfo=db_zone) for v in (first, last))
+        start = start or first.astimezone(zone).date()
+        end = end or last.astimezone(zone).date()
+    lo = datetime.combine(start, time.min, tzinfo=zone)
+    hi = datetime.combine(end + timedelta(days=1), time.min, tzinfo=zone)
+    starts = bucket_starts(lo, hi, unit, zone)
+    if not starts:
+        return []
+
+    totals = {b: [Decimal(0), 0] for b in starts}
+    if unit != "hour" and zone.key == db_zone.key:
+        days = daily_totals(db, _to_db(lo, db_zone),
+                            _to_db(hi, db_zone) - timedelta(microseconds=1), category_ids)
+        for day, (revenue, orders) in days.items():
+            b = starts[bisect.bisect_right(starts, datetime.combine(day, time.min, tzinfo=zone)) - 1]
+            totals[b][0] += revenue
+            totals[b][1] += orders
+    else:
+        edges = [_to_db(b, db_zone) for b in starts]
+        minutes = 60 if all(e.minute == 0 for e in edges) else 15
+        slot = time_slot(sale.sale_date, minutes).label("slot")
+        if category_ids is None:
+            q = select(slot, func.sum(sale.total_amount), func.count(sale.id))
+        else:
+            item, prod = models.SaleItem, models.Product
+            q = (
+                select(slot, func.sum(item.line_total), func.count(func.distinct(sale.id)))
+                  .join(item, item.sale_id == sale.id)
+                  .join(prod, prod.id == item.product_id)
+                  .where(prod.category_id.in_(category_ids))
+            )
+        rows = db.execute(
+            q.where(sale.sale_date >= _to_db(lo, db_zone), sale.sale_date < _to_db(hi, db_zone))
+             .group_by(slot)
+        )
+        for slot_start, revenue, orders in rows:
+            b = starts[bisect.bisect_right(edges, _parse_slot(slot_start)) - 1]
+            totals[b][0] += Decimal(revenue or 0)
+            totals[b][1] += orders
+
+    return [Bucket(b, totals[b][0], totals[b][1]) for b in starts]
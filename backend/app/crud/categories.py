@@ -1,15 +1,147 @@
-from sqlalchemy.orm import Session
-from .. import models, schemas
+import threading
+import time
+from sqlalchemy import insert, literal, select
+from sqlalchemy.orm import Session, selectinload
+from typing import Optional
+from .. import lookup_cache, models, schemas
+from ..category_tree import CategoryTree
+from ..config import settings
+from ..fast_read import as_dicts
+from ..pagination import keyset
+
+KEYSET = (models.Category.id,)
+
+def children_loader(path=None, depth: Optional[int] = None):
+    """
+    Eager-load Category.children (one SELECT per level) down to
+    CATEGORY_TREE_DEPTH levels, optionally chained off another loader.
+    """
+    depth = settings.CATEGORY_TREE_DEPTH if depth is None else depth
+    load = path.selectinload if path is not None else selectinload
+    return load(models.Category.children, recursion_depth=depth)
+
+def category_dicts(db: Session, ids, depth: Optional[int] = None) -> dict:
+    """
+    {id: category} for `ids`, each a plain dict shaped like schemas.Category
+    with its children embedded `depth` levels deep -- the Core counterpart
+    of children_loader(), also one SELECT per level.
+    """
+    depth = settings.CATEGORY_TREE_DEPTH if depth is None else depth
+    cat = models.Category.__table__
+    cols = (cat.c.name, cat.c.parent_id, cat.c.id, cat.c.created_at, cat.c.updated_at)
+    found = {}
+    for r in as_dicts(db.execute(select(*cols).where(cat.c.id.in_(set(ids))))):
+        r["children"] = []
+        found[r["id"]] = r
+    level = found
+    for _ in range(depth):
+        if not level:
+            break
+        rows = as_dicts(db.execute(
+            select(*cols).where(cat.c.parent_id.in_(list(level))).order_by(cat.c.id)
+        ))
+        below = {}
+        for r in rows:
+            r["children"] = []
+            below[r["id"]] = r
+            level[r["parent_id"]]["children"].append(r)
+        level = below
+    return found
 
 def create_category(db: Session, cat: schemas.CategoryCreate):
+    """
+    Insert the category and its closure rows (itself, plus one per ancestor
+    of its parent) in one transaction, then drop the cached tree (and the
+    cached product lookups, which embed categories' children).
+    """
+    if cat.parent_id is not None and db.get(models.Category, cat.parent_id) is None:
+        raise ValueError(f"Parent category {cat.parent_id} not found")
     db_cat = models.Category(**cat.dict())
     db.add(db_cat)
+    db.flush()
+    _add_closure(db, db_cat.id, db_cat.parent_id)
     db.commit()
+    invalidate_tree()
     db.refresh(db_cat)
     return db_cat
 
+def _add_closure(db: Session, cat_id: int, parent_id: Optional[int]):
+    closure = models.CategoryClosure
+    db.execute(insert(closure).values(ancestor_id=cat_id, descendant_id=cat_id, depth=0))
+    if parent_id is not None:
+        db.execute(insert(closure).from_select(
+            ["ancestor_id", "descendant_id", "depth"],
+            select(closure.ancestor_id, literal(cat_id), closure.depth + 1)
+              .where(closure.descendant_id == parent_id),
+        ))
+
+def rebuild_closure(db: Session):
+    """Recompute category_closure from categories.parent_id and commit."""
+    cat, closure = models.Category, models.CategoryClosure
+    paths = select(
+        cat.id.label("ancestor_id"), cat.id.label("descendant_id"), literal(0).label("depth")
+    ).cte("paths", recursive=True)
+    paths = paths.union_all(
+        select(paths.c.ancestor_id, cat.id, paths.c.depth + 1)
+          .join(cat, cat.parent_id == paths.c.descendant_id)
+    )
+    db.execute(closure.__table__.delete())
+    db.execute(insert(closure).from_select(
+        ["ancestor_id", "descendant_id", "depth"], select(paths)
+    ))
+    db.commit()
+    invalidate_tree()
+
+def subtree_ids(category_id: int):
+    """
+    SELECT of `category_id` and all its descendants, for use in an IN/join
+    -- a range read on the closure primary key.
+    """
+    closure = models.CategoryClosure
+    return select(closure.descendant_id).where(closure.ancestor_id == category_id)
+
+# --- in-memory tree ---
+
+_tree: Optional[CategoryTree] = None
+_tree_lock = threading.Lock()
+_generation = 0     # bumped on every write so a load that raced one is not kept
+
+def invalidate_tree():
+    global _tree, _generation
+    _generation += 1
+    _tree = None
+    lookup_cache.clear()
+
+def get_tree(db: Session) -> CategoryTree:
+    """
+    The current CategoryTree snapshot, loading it if it was invalidated or
+    is older than CATEGORY_TREE_TTL (writes made by other processes).
+
+    The load runs outside _tree_lock: with ASYNC_DB the query is awaited on
+    the event-loop thread, so a second load blocking on the lock there would
+    stop the loop the first one is waiting on. Concurrent loads may each
+    read the table; the lock only guards the swap.
+    """
+    global _tree
+    tree = _tree
+    if tree is not None and time.monotonic() - tree.built_at < settings.CATEGORY_TREE_TTL:
+        return tree
+    generation, cat = _generation, models.Category
+    tree = CategoryTree(db.execute(select(cat.id, cat.name, cat.parent_id)))
+    with _tree_lock:
+        current = _tree
+        if generation == _generation and (current is None or current.built_at < tree.built_at):
+            _tree = tree
+    return tree
+
 def get_category(db: Session, cat_id: int):
-    return db.query(models.Category).filter(models.Category.id == cat_id).first()
+    return (
+        db.query(models.Category)
+          .options(children_loader())
+          .filter(models.Category.id == cat_id)
+          .first()
+    )
 
-def list_categories(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Category).offset(skip).limit(limit).all()
+def list_categories(db: Session, skip: int = 0, limit: int = 100, after: Optional[str] = None):
+    q = keyset(db.query(models.Category).options(children_loader()), KEYSET, after)
+    return q.offset(skip).limit(limit).all()
@@ -1,41 +1,35 @@
+from sqlalchemy import and_, bindparam, case, delete, insert, or_, select, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
 from sqlalchemy.orm import Session
-from .. import models, schemas
+from typing import Dict, Iterable, List, Optional, Sequence
+from .. import lookup_cache, models, schemas
+from ..config import settings
+from ..fast_read import as_dicts
+from ..multi_get import chunks
+from ..pagination import decode_cursor, encode_cursor, keyset
 
-def get_inventory(db: Session, prod_id: int):
-    return db.query(models.Inventory).filter(models.Inventory.product_id == prod_id).first()
+KEYSET = (models.Inventory.id,)
 
-def list_inventory(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Inventory).offset(skip).limit(limit).all()
+class InsufficientStockError(ValueError):
+    """A stock change would take a product below zero (or it has no inventory row)."""
 
-def update_inventory(
-    db: Session,
-    prod_id:           int,
-    quantity_on_hand:  int,
-    reorder_threshold: int
-):
-    inv = get_inventory(db, prod_id)
-    if not inv:
-        inv = models.Inventory(
-            product_id=prod_id,
-            quantity_on_hand=quantity_on_hand,
-            reorder_threshold=reorder_threshold
-        )
-        db.add(inv)
-    else:
-        inv.quantity_on_hand  = quantity_on_hand
-        inv.reorder_threshold = reorder_threshold
-    db.commit()
-    db.refresh(inv)
-    return inv
-
-def list_inventory(db: Session, skip: int = 0, limit: int = 100):
+def list_inventory(db: Session, skip: int = 0, limit: int = 100, after: Optional[str] = None):
     return (
-        db.query(models.Inventory)
+        keyset(db.query(models.Inventory), KEYSET, after)
           .offset(skip)
           .limit(limit)
           .all()
     )
 
+def list_inventory_rows(
+    db: Session, skip: int = 0, limit: int = 100, after: Optional[str] = None
+) -> List[dict]:
+    """list_inventory as plain dicts shaped like schemas.Inventory, without the ORM."""
+    inv = models.Inventory.__table__
+    q = select(inv.c.product_id, inv.c.quantity_on_hand, inv.c.reorder_threshold, inv.c.id)
+    q = keyset(q, KEYSET, after).offset(skip).limit(limit)
+    return as_dicts(db.execute(q))
+
 def get_inventory(db: Session, product_id: int):
     return (
         db.query(models.Inventory)
@@ -43,12 +37,322 @@ def get_inventory(db: Session, product_id: int):
           .first()
     )
 
-def update_inventory(db: Session, product_id: int, new_qty: int, new_threshold: int):
-    inv = get_inventory(db, product_id)
+def get_inventories(db: Session, product_ids: Sequence[int]) -> Dict[int, models.Inventory]:
+    """The inventory rows of those of `product_ids` that have one, by product id."""
+    found = {}
+    for chunk in chunks(product_ids):
+        found.update(
+            (inv.product_id, inv) for inv in
+            db.query(models.Inventory).filter(models.Inventory.product_id.in_(chunk))
+        )
+    return found
+
+def update_inventory(
+    db: Session,
+    product_id: int,
+    new_qty: Optional[int],
+    new_threshold: Optional[int],
+    reason: str = "Manual adjustment",
+):
+    """
+    Set a product's stock level and/or reorder threshold (None leaves it as
+    is) and log the quantity change, in one transaction. The row is locked
+    first, so the logged change is measured against the value it replaces.
+    For relative changes use adjust_inventory, which needs no lock.
+    """
+    inv = (
+        db.query(models.Inventory)
+          .filter(models.Inventory.product_id == product_id)
+          .with_for_update()
+          .first()
+    )
     if not inv:
+        db.rollback()
         return None
-    inv.quantity_on_hand   = new_qty
-    inv.reorder_threshold  = new_threshold
+    change = 0 if new_qty is None else new_qty - inv.quantity_on_hand
+    if new_qty is not None:
+        inv.quantity_on_hand = new_qty
+    if new_threshold is not None:
+        inv.reorder_threshold = new_threshold
+    if change:
+        db.add(models.InventoryHistory(
+            inventory_id=inv.id, product_id=product_id, change_qty=change, reason=reason
+        ))
+    db.flush()
+    refresh_low_stock(db, [product_id])
     db.commit()
+    lookup_cache.invalidate("inventory", [product_id])
     db.refresh(inv)
-    return inv
\ No newline at end of file
+    return inv
+
+def adjust_inventory(db: Session, product_id: int, delta: int, reason: str) -> Optional[dict]:
+    """
+    Add `delta` to a product's quantity_on_hand and log it in one
+    transaction, without reading the row first: a single conditional
+    UPDATE ... SET quantity_on_hand = quantity_on_hand + :delta WHERE
+    quantity_on_hand + :delta >= 0, so concurrent adjustments queue on the
+    row lock instead of overwriting each other. Returns the updated row
+    (shaped like schemas.InventoryAdjustment), or None if the product has no
+    inventory row; raises InsufficientStockError if it would go negative.
+    """
+    if not delta:
+        raise ValueError("delta must not be 0")
+    inv = models.Inventory.__table__
+    columns = (inv.c.id, inv.c.product_id, inv.c.quantity_on_hand, inv.c.reorder_threshold)
+    stmt = (
+        update(inv)
+          .where(inv.c.product_id == product_id, inv.c.quantity_on_hand + delta >= 0)
+          .values(quantity_on_hand=inv.c.quantity_on_hand + delta)
+    )
+    if db.get_bind().dialect.update_returning:
+        row = db.execute(stmt.returning(*columns)).first()
+    elif db.execute(stmt).rowcount:
+        # no UPDATE ... RETURNING (MySQL): read back the row this
+        # transaction now holds locked
+        row = db.execute(select(*columns).where(inv.c.product_id == product_id)).first()
+    else:
+        row = None
+    if row is None:
+        exists = db.execute(select(inv.c.id).where(inv.c.product_id == product_id)).first()
+        db.rollback()
+        if exists:
+            raise InsufficientStockError(f"Insufficient stock for product {product_id}")
+        return None
+
+    history_id = db.execute(models.InventoryHistory.__table__.insert().values(
+        inventory_id=row.id, product_id=product_id, change_qty=delta, reason=reason,
+    )).inserted_primary_key[0]
+    refresh_low_stock(db, [product_id])
+    db.commit()
+    lookup_cache.invalidate("inventory", [product_id])
+    return {**row._asdict(), "change_qty": delta, "history_id": history_id}
+
+def apply_stock_changes(db: Session, deltas: Dict[int, int], reason: str):
+    """
+    Add `deltas` ({product_id: change_qty}) to quantity_on_hand and log one
+    inventory_history row per product, inside the caller's transaction (no
+    commit). Rows are locked in product_id order so concurrent orders can't
+    deadlock; the decrement is a single CASE UPDATE and the history a single
+    executemany. Raises InsufficientStockError if a product has no
+    inventory row or would go negative; it writes no stock or history
+    first, but the caller's earlier writes are only undone by its rollback,
+    and nothing is committed either way. The caller drops the products'
+    lookup_cache entries once it has committed.
+    """
+    deltas = {pid: d for pid, d in deltas.items() if d}
+    if not deltas:
+        return
+    inv = models.Inventory.__table__
+    ids = sorted(deltas)
+    locked = {
+        r.product_id: r
+        for r in db.execute(
+            select(inv.c.id, inv.c.product_id, inv.c.quantity_on_hand)
+              .where(inv.c.product_id.in_(ids))
+              .order_by(inv.c.product_id)
+              .with_for_update()
+        )
+    }
+    short = [
+        pid for pid in ids
+        if pid not in locked or locked[pid].quantity_on_hand + deltas[pid] < 0
+    ]
+    if short:
+        raise InsufficientStockError(f"Insufficient stock for product(s) {short}")
+
+    db.execute(
+        update(inv)
+          .where(inv.c.product_id.in_(ids))
+          .values(quantity_on_hand=inv.c.quantity_on_hand + case(deltas, value=inv.c.product_id))
+    )
+    db.execute(models.InventoryHistory.__table__.insert(), [
+        {
+            "inventory_id": locked[pid].id,
+            "product_id":   pid,
+            "change_qty":   deltas[pid],
+            "reason":       reason,
+        }
+        for pid in ids
+    ])
+    refresh_low_stock(db, ids)
+
+def _add_quantities(db: Session, rows: List[dict]):
+    """
+    Add each row's quantity_on_hand to that of the existing inventory row
+    with its id (full rows, every NOT NULL column) in one multi-row
+    statement: an upsert on the primary key in which every row conflicts,
+    i.e. an UPDATE joined against a VALUES list. Its compiled form is
+    cached, unlike a CASE per chunk. Relative, like apply_stock_changes, so
+    a change committed since the rows were read is added to, not overwritten.
+    """
+    inv = models.Inventory.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(inv)
+        stmt = stmt.on_duplicate_key_update(
+            quantity_on_hand=inv.c.quantity_on_hand + stmt.inserted.quantity_on_hand
+        )
+    elif dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(inv)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"quantity_on_hand": inv.c.quantity_on_hand + stmt.excluded.quantity_on_hand},
+        )
+    else:
+        stmt = (
+            update(inv)
+              .where(inv.c.id == bindparam("row_id"))
+              .values(quantity_on_hand=inv.c.quantity_on_hand + bindparam("change"))
+        )
+        rows = [{"row_id": r["id"], "change": r["quantity_on_hand"]} for r in rows]
+    db.execute(stmt, rows)
+
+def apply_adjustments(db: Session, lines: Sequence[schemas.InventoryAdjustmentLine]) -> List[dict]:
+    """
+    Apply a chunk of stock adjustments (a `delta`, or an `absolute_qty` such
+    as a cycle count) in one transaction with a fixed number of statements:
+    the products' rows are read and locked in product_id order, the lines
+    folded over them in order, then one multi-row write of each product's
+    net change (_add_quantities), one history executemany and one
+    low-stock refresh. Returns one result per line (shaped like
+    schemas.InventoryAdjustmentResult); a line that is malformed, has no
+    inventory row or would take stock below zero gets an `error` and is
+    skipped, the others still apply.
+    """
+    inv = models.Inventory.__table__
+    ids = sorted({line.product_id for line in lines})
+    if db.get_bind().dialect.name == "sqlite":
+        # FOR UPDATE is a no-op there: a write opens the transaction and
+        # takes the database's write lock, so no other writer commits
+        # between the read and the write and absolute counts hold
+        db.execute(
+            update(inv).where(inv.c.product_id.in_(ids)).values(quantity_on_hand=inv.c.quantity_on_hand)
+        )
+    rows = {
+        r.product_id: r
+        for r in db.execute(
+            select(inv.c.id, inv.c.product_id, inv.c.quantity_on_hand, inv.c.reorder_threshold)
+              .where(inv.c.product_id.in_(ids))
+              .order_by(inv.c.product_id)
+              .with_for_update()
+        )
+    }
+    on_hand = {pid: r.quantity_on_hand for pid, r in rows.items()}
+    results, history = [], []
+    for line in lines:
+        result = {"product_id": line.product_id, "change_qty": 0,
+                  "quantity_on_hand": None, "error": None}
+        results.append(result)
+        current = on_hand.get(line.product_id)
+        if (line.delta is None) == (line.absolute_qty is None):
+            result["error"] = "exactly one of delta and absolute_qty is required"
+        elif line.delta == 0:
+            result["error"] = "delta must not be 0"
+        elif current is None:
+            result["error"] = "Inventory not found"
+        else:
+            new_qty = current + line.delta if line.delta is not None else line.absolute_qty
+            if new_qty < 0:
+                result["error"] = f"Insufficient stock for product {line.product_id}"
+            else:
+                on_hand[line.product_id] = new_qty
+                result.update(change_qty=new_qty - current, quantity_on_hand=new_qty)
+                if new_qty != current:
+                    history.append({
+                        "inventory_id": rows[line.product_id].id,
+                        "product_id":   line.product_id,
+                        "change_qty":   new_qty - current,
+                        "reason":       line.reason,
+                    })
+        if result["error"]:
+            result["quantity_on_hand"] = current
+
+    changed = sorted(pid for pid, qty in on_hand.items() if qty != rows[pid].quantity_on_hand)
+    if changed:
+        _add_quantities(db, [
+            {**rows[pid]._asdict(), "quantity_on_hand": on_hand[pid] - rows[pid].quantity_on_hand}
+            for pid in changed
+        ])
+        refresh_low_stock(db, changed)
+    if history:
+        db.execute(models.InventoryHistory.__table__.insert(), history)
+    db.commit()
+    lookup_cache.invalidate("inventory", changed)
+    return results
+
+def refresh_low_stock(db: Session, product_ids: Iterable[int]):
+    """
+    Re-derive the inventory_low_stock rows for the given products from their
+    current inventory rows. Set-based, no commit: run it inside the write's
+    transaction after the inventory UPDATE has been flushed.
+    """
+    ids = list(product_ids)
+    if not ids:
+        return
+    inv, low = models.Inventory, models.InventoryLowStock
+    db.execute(delete(low).where(low.product_id.in_(ids)))
+    db.execute(
+        insert(low).from_select(
+            ["product_id", "inventory_id", "shortfall"],
+            select(
+                inv.product_id,
+                inv.id,
+                inv.reorder_threshold - inv.quantity_on_hand,
+            ).where(
+                inv.product_id.in_(ids),
+                inv.quantity_on_hand <= inv.reorder_threshold,
+            ),
+        )
+    )
+
+def rebuild_low_stock(db: Session):
+    """Repopulate inventory_low_stock from scratch (e.g. after a bulk load)."""
+    inv, low = models.Inventory, models.InventoryLowStock
+    db.execute(delete(low))
+    db.execute(
+        insert(low).from_select(
+            ["product_id", "inventory_id", "shortfall"],
+            select(
+                inv.product_id,
+                inv.id,
+                inv.reorder_threshold - inv.quantity_on_hand,
+            ).where(inv.quantity_on_hand <= inv.reorder_threshold),
+        )
+    )
+    db.commit()
+
+def list_low_stock(db: Session, after: Optional[str] = None, limit: int = 100):
+    """
+    Items at or below their reorder threshold, furthest below first.
+    Keyset-paginated on (shortfall, product_id); returns (rows, next_cursor).
+    """
+    inv = models.Inventory
+    if settings.LOW_STOCK_INDEX:
+        low = models.InventoryLowStock
+        shortfall = low.shortfall
+        q = (
+            db.query(inv)
+              .join(low, low.product_id == inv.product_id)
+        )
+        key = low.product_id
+    else:
+        shortfall = inv.reorder_threshold - inv.quantity_on_hand
+        q = db.query(inv).filter(shortfall >= 0)
+        key = inv.product_id
+
+    if after:
+        last_shortfall, last_id = decode_cursor(after, int, int)
+        q = q.filter(or_(
+            shortfall < last_shortfall,
+            and_(shortfall == last_shortfall, key < last_id),
+        ))
+
+    rows = q.order_by(shortfall.desc(), key.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            last.reorder_threshold - last.quantity_on_hand, last.product_id
+        )
+    return rows, next_cursor
@@ -1,27 +1,14 @@
+from datetime import date, datetime, time
+from itertools import islice
+from sqlalchemy import and_, delete, func, select
 from sqlalchemy.orm import Session
-from .. import models, schemas
-from typing import Optional, List
+from .. import history_archive, models, schemas
+from ..config import settings
+from ..pagination import decode_cursor, keyset
+from typing import Iterator, Optional, List, Sequence, Union
 
-def record_inventory_change(
-    db:     Session,
-    record: schemas.InventoryHistoryCreate
-):
-    ih = models.InventoryHistory(**record.dict())
-    db.add(ih)
-    db.commit()
-    db.refresh(ih)
-    return ih
-
-def list_inventory_history(
-    db:        Session,
-    product_id: Optional[int] = None,
-    skip:      int = 0,
-    limit:     int = 100
-):
-    q = db.query(models.InventoryHistory)
-    if product_id:
-        q = q.filter(models.InventoryHistory.product_id == product_id)
-    return q.offset(skip).limit(limit).all()
+# newest first
+KEYSET = (models.InventoryHistory.changed_at, models.InventoryHistory.id)
 
 def record_inventory_change(
     db: Session,
@@ -41,14 +28,170 @@ def record_inventory_change(
     db.refresh(entry)
     return entry
 
+def unarchived(q, horizon: datetime, table=models.InventoryHistory):
+    """Restrict `q` to the rows the archive does not cover."""
+    return q.filter(table.changed_at >= horizon, table.reason != history_archive.OPENING_BALANCE)
+
 def list_inventory_history(
     db: Session,
     inventory_id: Optional[int] = None,
-    product_id:   Optional[int] = None
-) -> List[models.InventoryHistory]:
+    product_id:   Optional[int] = None,
+    skip:         int = 0,
+    limit:        int = 100,
+    after:        Optional[str] = None,
+) -> List[Union[models.InventoryHistory, dict]]:
+    """
+    A newest-first page of history. Once history has been archived, rows
+    from the horizon on come from the table and older ones, as dicts, from
+    the archive segments; a page that runs past the horizon continues there.
+    """
     q = db.query(models.InventoryHistory)
     if inventory_id:
         q = q.filter(models.InventoryHistory.inventory_id == inventory_id)
     if product_id:
         q = q.filter(models.InventoryHistory.product_id == product_id)
-    return q.order_by(models.InventoryHistory.changed_at.desc()).all()
\ No newline at end of file
+    horizon = history_archive.archive.horizon()
+    if horizon is None:
+        q = keyset(q, KEYSET, after, descending=True)
+        return q.offset(skip).limit(limit).all()
+
+    rows = []
+    cursor = decode_cursor(after, datetime.fromisoformat, int) if after else None
+    if cursor is None or cursor[0] >= horizon:
+        hot = keyset(unarchived(q, horizon), KEYSET, after, descending=True)
+        rows = hot.offset(skip).limit(limit).all()
+        if len(rows) == limit:
+            return rows
+        # the page continues into the archive: every archived row is older
+        # than every row in the table
+        skip = 0 if rows else max(skip - hot.order_by(None).count(), 0)
+        cursor = None
+    upper = (history_archive.to_micros(cursor[0]), cursor[1]) if cursor else None
+    cold = history_archive.archive.scan(
+        product_id or None, inventory_id or None, upper=upper, descending=True
+    )
+    rows.extend(
+        dict(zip(history_archive.COLUMNS, row))
+        for row in islice(cold, skip, skip + limit - len(rows))
+    )
+    return rows
+
+def export_inventory_history_query(
+    inventory_id: Optional[int] = None,
+    product_id:   Optional[int] = None,
+    start_date:   Optional[date] = None,
+    end_date:     Optional[date] = None,
+):
+    """
+    Core SELECT of the matching history rows, oldest first, for streaming;
+    (changed_at, id) order is served by ix_inventory_history_changed or,
+    with a product, ix_inventory_history_product_changed.
+    """
+    h = models.InventoryHistory.__table__
+    q = select(h.c.id, h.c.inventory_id, h.c.product_id, h.c.change_qty, h.c.reason, h.c.changed_at)
+    if inventory_id:
+        q = q.where(h.c.inventory_id == inventory_id)
+    if product_id:
+        q = q.where(h.c.product_id == product_id)
+    # bound as datetimes: SQLite compares a DATETIME to a bare date as text
+    if start_date:
+        q = q.where(h.c.changed_at >= datetime.combine(start_date, time()))
+    if end_date:
+        q = q.where(h.c.changed_at <= datetime.combine(end_date, time()))
+    horizon = history_archive.archive.horizon()
+    if horizon is not None:
+        q = unarchived(q, horizon, h.c)
+    return q.order_by(h.c.changed_at, h.c.id)
+
+def archived_history_rows(
+    inventory_id: Optional[int] = None,
+    product_id:   Optional[int] = None,
+    start_date:   Optional[date] = None,
+    end_date:     Optional[date] = None,
+) -> Iterator[tuple]:
+    """
+    The archived rows matching export_inventory_history_query's filters,
+    oldest first and in its column order: streamed before its rows.
+    """
+    horizon = history_archive.archive.horizon()
+    if horizon is None or (start_date and datetime.combine(start_date, time()) >= horizon):
+        return iter(())
+    to_key = lambda d: history_archive.to_micros(datetime.combine(d, time()))
+    return history_archive.archive.scan(
+        product_id or None,
+        inventory_id or None,
+        lower=(to_key(start_date), 0) if start_date else None,
+        upper=(to_key(end_date) + 1, 0) if end_date else None,
+    )
+
+def compact_history(db: Session, horizon: datetime, product_ids: Sequence[int]) -> int:
+    """
+    Replace the given products' rows before `horizon` (archived rows and any
+    earlier opening balance) with one opening-balance row each, dated at the
+    horizon, in one transaction. Idempotent. Returns the rows deleted.
+    """
+    h = models.InventoryHistory.__table__
+    old = and_(h.c.product_id.in_(product_ids), h.c.changed_at < horizon)
+    balances = db.execute(
+        select(h.c.product_id, h.c.inventory_id, func.sum(h.c.change_qty))
+          .where(old)
+          .group_by(h.c.product_id, h.c.inventory_id)
+    ).all()
+    deleted = db.execute(delete(h).where(old)).rowcount
+    openings = [
+        {"inventory_id": inventory_id, "product_id": product_id, "change_qty": total,
+         "reason": history_archive.OPENING_BALANCE, "changed_at": horizon}
+        for product_id, inventory_id, total in balances if total
+    ]
+    if openings:
+        db.execute(h.insert(), openings)
+    db.commit()
+    return deleted
+
+def archive_history(db: Session, horizon: datetime, batch: int = 1000) -> dict:
+    """
+    Move history before `horizon` into a new archive segment and compact
+    the table (see app/history_archive.py). The manifest is the commit
+    point: once it names the new horizon, readers stop reading the archived
+    rows from the table, and deleting them can proceed (or, after a crash,
+    resume on the next run) in product batches.
+    """
+    directory = settings.HISTORY_ARCHIVE_DIR
+    with history_archive.exclusive(directory):
+        manifest = history_archive.archive.manifest()
+        previous = datetime.fromisoformat(manifest["horizon"]) if manifest["horizon"] else None
+        segment = None
+        if previous is None or horizon > previous:
+            h = models.InventoryHistory.__table__
+            q = select(h.c.id, h.c.inventory_id, h.c.product_id, h.c.change_qty,
+                       h.c.reason, h.c.changed_at).where(h.c.changed_at < horizon)
+            if previous:
+                # older rows still in the table are in earlier segments
+                q = unarchived(q, previous, h.c)
+            q = q.order_by(h.c.changed_at, h.c.id)
+            with db.get_bind().connect() as conn:
+                result = conn.execution_options(
+                    stream_results=True, yield_per=settings.EXPORT_BATCH_SIZE
+                ).execute(q)
+                segment = history_archive.write_segment(directory, horizon, result)
+            if segment:
+                manifest["segments"].append(segment)
+            manifest["horizon"] = horizon.isoformat()
+            history_archive.write_manifest(directory, manifest)
+        else:
+            horizon = previous
+
+        h = models.InventoryHistory
+        product_ids = [pid for (pid,) in db.query(h.product_id).filter(
+            h.changed_at < horizon).distinct().order_by(h.product_id)]
+        db.commit()
+        deleted = 0
+        for i in range(0, len(product_ids), batch):
+            deleted += compact_history(db, horizon, product_ids[i:i + batch])
+    return {
+        "horizon": horizon.isoformat(),
+        "archived": segment["rows"] if segment else 0,
+        "deleted": deleted,
+        "products": len(product_ids),
+    }
+
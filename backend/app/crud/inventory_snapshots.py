@@ -0,0 +1,205 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import Integer, cast, delete, func, select, union_all
+from sqlalchemy.orm import Session
+from typing import Dict, Iterable, List, Optional, Tuple
+from .. import history_archive, models
+from ..config import settings
+from .buckets import get_zone
+from .inventory_history import unarchived
+
+# {product_id: quantity}
+Totals = Dict[int, int]
+
+# history is the stock ledger: a product's stock as of `ts` is the
+# SUM(change_qty) of its history up to `ts`, and a snapshot at T holds that
+# sum for the history before T
+AS_OF_COLUMNS = ("product_id", "quantity_on_hand")
+
+def to_db_time(ts: datetime) -> datetime:
+    """`ts` as the naive DB_TIMEZONE datetime history is stored in."""
+    if ts.tzinfo is None:
+        return ts
+    return ts.astimezone(get_zone(settings.DB_TIMEZONE)).replace(tzinfo=None)
+
+def history_totals(
+    db:         Session,
+    start:      Optional[datetime],
+    end:        datetime,
+    inclusive:  bool = True,
+    product_id: Optional[int] = None,
+) -> Totals:
+    """
+    SUM(change_qty) per product of the history with start <= changed_at <=
+    end (< end unless `inclusive`; from the beginning if start is None),
+    archived history included: before the archive horizon it is summed
+    from the segments, from the horizon on from the table.
+    """
+    totals: Totals = defaultdict(int)
+    horizon = history_archive.archive.horizon()
+    if horizon is not None and (start is None or start < horizon):
+        to_key = history_archive.to_micros
+        lower = (to_key(start), 0) if start is not None else None
+        upper = (to_key(end) + (1 if inclusive else 0), 0) if end < horizon else None
+        for pid, total in history_archive.archive.totals(product_id, lower, upper).items():
+            totals[pid] += total
+        if end < horizon:
+            return dict(totals)
+
+    h = models.InventoryHistory.__table__
+    q = select(h.c.product_id, func.sum(h.c.change_qty)).where(
+        h.c.changed_at <= end if inclusive else h.c.changed_at < end
+    )
+    if start is not None:
+        q = q.where(h.c.changed_at >= start)
+    if product_id is not None:
+        q = q.where(h.c.product_id == product_id)
+    if horizon is not None:
+        q = unarchived(q, horizon, h.c)
+    for pid, total in db.execute(q.group_by(h.c.product_id)):
+        totals[pid] += int(total)
+    return dict(totals)
+
+def _snapshot_before(db: Session, ts: Optional[datetime] = None) -> Optional[datetime]:
+    """The latest snapshot instant at or before `ts` (at all if None)."""
+    s = models.InventorySnapshot
+    q = db.query(func.max(s.taken_at))
+    if ts is not None:
+        q = q.filter(s.taken_at <= ts)
+    return q.scalar()
+
+def _snapshot(db: Session, taken_at: datetime) -> Totals:
+    s = models.InventorySnapshot.__table__
+    return dict(db.execute(
+        select(s.c.product_id, s.c.quantity_on_hand).where(s.c.taken_at == taken_at)
+    ).all())
+
+def inventory_as_of(db: Session, product_id: int, ts: datetime) -> Optional[dict]:
+    """
+    One product's stock as of `ts`: its nearest snapshot at or before `ts`
+    plus the history from the snapshot to `ts` (all of its history if there
+    is no snapshot that old). None if the product has no inventory row.
+    """
+    ts = to_db_time(ts)
+    if not db.query(models.Inventory.id).filter(models.Inventory.product_id == product_id).first():
+        return None
+    s = models.InventorySnapshot
+    snapshot = (
+        db.query(s.taken_at, s.quantity_on_hand)
+          .filter(s.product_id == product_id, s.taken_at <= ts)
+          .order_by(s.taken_at.desc())
+          .first()
+    )
+    taken_at, base = snapshot if snapshot else (None, 0)
+    replayed = history_totals(db, taken_at, ts, product_id=product_id)
+    return {
+        "product_id": product_id,
+        "as_of": ts,
+        "quantity_on_hand": base + replayed.get(product_id, 0),
+        "snapshot_at": taken_at,
+    }
+
+def stock_as_of(db: Session, ts: datetime) -> Tuple[Optional[datetime], Optional[object], Iterable[tuple]]:
+    """
+    Every product's stock as of `ts`, in product_id order, for streaming:
+    (snapshot used, Core SELECT or None, rows to send before it). Normally
+    the SELECT adds the history since the nearest snapshot to it in the
+    database; when that history reaches into the archive the sums are
+    merged here instead and returned as rows.
+    """
+    ts = to_db_time(ts)
+    taken_at = _snapshot_before(db, ts)
+    horizon = history_archive.archive.horizon()
+    if horizon is not None and (taken_at is None or taken_at < horizon):
+        stock = _snapshot(db, taken_at) if taken_at else {}
+        for pid, total in history_totals(db, taken_at, ts).items():
+            stock[pid] = stock.get(pid, 0) + total
+        return taken_at, None, sorted(stock.items())
+
+    h = models.InventoryHistory.__table__
+    s = models.InventorySnapshot.__table__
+    delta = select(h.c.product_id, func.sum(h.c.change_qty).label("qty")).where(h.c.changed_at <= ts)
+    if taken_at is not None:
+        delta = delta.where(h.c.changed_at >= taken_at)
+    if horizon is not None:
+        delta = unarchived(delta, horizon, h.c)
+    parts = [delta.group_by(h.c.product_id)]
+    if taken_at is not None:
+        parts.append(
+            select(s.c.product_id, s.c.quantity_on_hand.label("qty")).where(s.c.taken_at == taken_at)
+        )
+    u = union_all(*parts).subquery()
+    stmt = (
+        select(u.c.product_id, cast(func.sum(u.c.qty), Integer).label("quantity_on_hand"))
+          .group_by(u.c.product_id)
+          .order_by(u.c.product_id)
+    )
+    return taken_at, stmt, ()
+
+def _write_snapshot(db: Session, taken_at: datetime, stock: Totals):
+    s = models.InventorySnapshot.__table__
+    db.execute(delete(s).where(s.c.taken_at == taken_at))
+    if stock:
+        db.execute(s.insert(), [
+            {"taken_at": taken_at, "product_id": pid, "quantity_on_hand": qty}
+            for pid, qty in sorted(stock.items())
+        ])
+    db.commit()
+
+def snapshot_inventory(db: Session, until: datetime, since: Optional[datetime] = None) -> List[datetime]:
+    """
+    Write the snapshots due up to `until`: one every
+    INVENTORY_SNAPSHOT_INTERVAL_HOURS after the latest one (the first ever
+    at `since`, default `until`, replays all history), each the previous
+    plus the history in between, one transaction each. Returns the instants
+    written. Run it once the last interval has closed: history committed
+    later with an earlier changed_at is only caught by check_snapshots.
+    """
+    step = timedelta(hours=settings.INVENTORY_SNAPSHOT_INTERVAL_HOURS)
+    latest = _snapshot_before(db)
+    if latest is None:
+        t, stock = since or until, {}
+    else:
+        t, stock = latest + step, _snapshot(db, latest)
+    db.commit()
+    due = []
+    while t <= until:
+        due.append(t)
+        t += step
+    for taken_at in due:
+        for pid, total in history_totals(db, latest, taken_at, inclusive=False).items():
+            stock[pid] = stock.get(pid, 0) + total
+        _write_snapshot(db, taken_at, stock)
+        latest = taken_at
+    return due
+
+def check_snapshots(db: Session, repair: bool = False) -> List[dict]:
+    """
+    Verify every snapshot against a full replay of history -- one pass from
+    the beginning, summing the history between consecutive snapshots --
+    and report those that differ (with a sample of the products). With
+    `repair`, rewrite them from the replay.
+    """
+    s = models.InventorySnapshot
+    instants = [t for (t,) in db.query(s.taken_at).distinct().order_by(s.taken_at)]
+    db.commit()
+    replay: Totals = {}
+    previous = None
+    report = []
+    for taken_at in instants:
+        for pid, total in history_totals(db, previous, taken_at, inclusive=False).items():
+            replay[pid] = replay.get(pid, 0) + total
+        stored = _snapshot(db, taken_at)
+        wrong = sorted(pid for pid in stored.keys() | replay.keys()
+                       if stored.get(pid) != replay.get(pid))
+        if wrong:
+            report.append({
+                "taken_at": taken_at,
+                "mismatched": len(wrong),
+                "sample": [(pid, stored.get(pid), replay.get(pid)) for pid in wrong[:5]],
+            })
+            if repair:
+                _write_snapshot(db, taken_at, replay)
+        db.commit()
+        previous = taken_at
+    return report
@@ -1,15 +1,192 @@
-from sqlalchemy.orm import Session
-from .. import models, schemas
+import threading
+import time
+from collections import deque
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, joinedload
+from typing import Callable, Dict, List, Optional, Sequence
+from .. import lookup_cache, models, product_search, schemas
+from ..config import settings
+from ..fast_read import as_dicts
+from ..multi_get import chunks
+from ..pagination import keyset
+from .categories import category_dicts, children_loader, get_tree
+
+KEYSET = (models.Product.id,)
+
+def product_loader():
+    """schemas.Product embeds its category (and that category's children)."""
+    return children_loader(joinedload(models.Product.category))
 
 def create_product(db: Session, prod: schemas.ProductCreate):
     db_prod = models.Product(**prod.dict())
     db.add(db_prod)
     db.commit()
-    db.refresh(db_prod)
-    return db_prod
+    # both may be cached as unknown
+    lookup_cache.invalidate("product", [db_prod.id])
+    lookup_cache.invalidate("sku", [db_prod.sku])
+    _index_new([(db_prod.id, db_prod.name, db_prod.sku, db_prod.description,
+                 db_prod.category_id)])
+    return get_product(db, db_prod.id)
 
 def get_product(db: Session, prod_id: int):
-    return db.query(models.Product).filter(models.Product.id == prod_id).first()
+    return (
+        db.query(models.Product)
+          .options(product_loader())
+          .filter(models.Product.id == prod_id)
+          .first()
+    )
+
+def get_product_by_sku(db: Session, sku: str):
+    return (
+        db.query(models.Product)
+          .options(product_loader())
+          .filter(models.Product.sku == sku)
+          .first()
+    )
+
+def get_products(db: Session, ids: Sequence[int]) -> Dict[int, models.Product]:
+    """The products among `ids` that exist, by id: one chunked IN query plus eager loads."""
+    found = {}
+    for chunk in chunks(ids):
+        found.update(
+            (p.id, p) for p in
+            db.query(models.Product).options(product_loader()).filter(models.Product.id.in_(chunk))
+        )
+    return found
+
+def list_products(db: Session, skip: int = 0, limit: int = 100, after: Optional[str] = None):
+    q = keyset(db.query(models.Product).options(product_loader()), KEYSET, after)
+    return q.offset(skip).limit(limit).all()
+
+def list_products_rows(
+    db: Session, skip: int = 0, limit: int = 100, after: Optional[str] = None
+) -> List[dict]:
+    """
+    list_products as plain dicts shaped like schemas.Product, straight from
+    Core rows: no identity map, no model instances, nothing to re-validate.
+    """
+    prod = models.Product.__table__
+    q = select(
+        prod.c.name, prod.c.description, prod.c.sku, prod.c.price, prod.c.category_id,
+        prod.c.id, prod.c.created_at, prod.c.updated_at,
+    )
+    q = keyset(q, (prod.c.id,), after).offset(skip).limit(limit)
+    rows = as_dicts(db.execute(q), price=float)
+    categories = category_dicts(db, [r["category_id"] for r in rows])
+    for r in rows:
+        r["category"] = categories[r["category_id"]]
+    return rows
+
+# --- search index ---
+
+_index: Optional[product_search.ProductIndex] = None
+# set: build the index (at startup, or when the first search asks for it)
+_wanted = threading.Event()
+# rows waiting to be added, and the lock that serializes add(); nothing
+# in a request ever waits on it (see _index_new)
+_pending: "deque[tuple]" = deque()
+_add_lock = threading.Lock()
+# ids are allocated at INSERT but become visible at COMMIT, so a product can
+# appear after one with a higher id: catching up re-reads this many ids
+# below the highest indexed one (add() skips those already indexed)
+_ID_SLACK = 1000
+
+def _index_rows(db: Session, above: int = 0):
+    prod = models.Product.__table__
+    q = (
+        select(prod.c.id, prod.c.name, prod.c.sku, prod.c.description, prod.c.category_id)
+          .where(prod.c.id > above)
+          .order_by(prod.c.id)
+    )
+    return db.execute(q.execution_options(stream_results=True,
+                                          yield_per=settings.EXPORT_BATCH_SIZE))
+
+def _index_new(rows):
+    """
+    Queue (id, name, sku, description, category_id) rows for the index and
+    add them if no other thread is adding; one that is picks them up before
+    it lets go of the lock. Before the first build they just wait.
+    """
+    _pending.extend(rows)
+    index = _index
+    while index is not None and _pending and _add_lock.acquire(blocking=False):
+        try:
+            while _pending:
+                index.add(*_pending.popleft())
+        finally:
+            _add_lock.release()
+
+def build_search_index(db: Session) -> product_search.ProductIndex:
+    """(Re)build this process's index from the products table and serve it."""
+    global _index
+    index = product_search.build(_index_rows(db), settings.PRODUCT_SEARCH_MAX_CANDIDATES)
+    _index = index
+    _index_new(())
+    return index
+
+def catch_up_search_index(db: Session):
+    """Add products created by other processes (and any that committed late)."""
+    index = _index
+    if index is not None:
+        _index_new(list(_index_rows(db, max(index.max_id - _ID_SLACK, 0))))
+
+def maintain_search_index(session_factory: Callable[[], Session], preload: bool):
+    """
+    Body of this process's index thread (started by main.py): builds the
+    index right away with `preload`, else once a search asks for it, then
+    catches up every PRODUCT_SEARCH_REFRESH seconds.
+    """
+    if not preload:
+        _wanted.wait()
+    refresh = build_search_index
+    while True:
+        db = session_factory()
+        try:
+            refresh(db)
+            refresh = catch_up_search_index
+        except SQLAlchemyError:
+            pass  # retried next round
+        finally:
+            db.close()
+        time.sleep(settings.PRODUCT_SEARCH_REFRESH)
+
+def get_search_index(db: Session) -> Optional[product_search.ProductIndex]:
+    """
+    This process's product search index, or None while it is first being
+    built in the background. Products created here are added at once,
+    those created by other processes at most PRODUCT_SEARCH_REFRESH
+    seconds late.
+    """
+    _wanted.set()
+    return _index
 
-def list_products(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Product).offset(skip).limit(limit).all()
+def search_products(
+    db:                  Session,
+    q:                   str,
+    category_id:         Optional[int] = None,
+    include_descendants: bool = False,
+    limit:               int = 20,
+):
+    """
+    Products matching every word of `q` in name, sku or description
+    (prefix and typo tolerant; see app/product_search.py), best first,
+    optionally only those in `category_id` (and, with include_descendants,
+    its subcategories). Nothing until the index is first built.
+    """
+    index = get_search_index(db)
+    if index is None:
+        return []
+    categories = None
+    if category_id is not None:
+        categories = set(get_tree(db).subtree_ids(category_id) if include_descendants
+                         else [category_id])
+    hits = index.search(q, limit, categories)
+    if not hits:
+        return []
+    ids = [pid for pid, _ in hits]
+    found = {
+        p.id: p for p in
+        db.query(models.Product).options(product_loader()).filter(models.Product.id.in_(ids))
+    }
+    return [found[pid] for pid in ids if pid in found]
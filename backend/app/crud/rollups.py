@@ -0,0 +1,232 @@
+from collections import defaultdict
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .. import models, schemas
+from ..analytics_cache import cache as analytics_cache
+
+# {sale_day: (revenue, order_count)}
+DayTotals = Dict[date, Tuple[Decimal, int]]
+
+
+def _upsert_add(db: Session, table, keys: Sequence[str], rows: list):
+    """INSERT rows, adding their value columns onto any existing row."""
+    if not rows:
+        return
+    values = [c for c in rows[0] if c not in keys]
+    dialect = db.get_bind().dialect.name
+    if dialect == "mysql":
+        stmt = mysql.insert(table)
+        stmt = stmt.on_duplicate_key_update({c: table.c[c] + stmt.inserted[c] for c in values})
+    elif dialect in ("postgresql", "sqlite"):
+        stmt = (postgresql if dialect == "postgresql" else sqlite).insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={c: table.c[c] + stmt.excluded[c] for c in values},
+        )
+    else:
+        raise NotImplementedError(f"rollup upsert not supported on {dialect}")
+    # sorted so concurrent writers take the row locks in the same order
+    db.execute(stmt, sorted(rows, key=lambda r: tuple(r[k] for k in keys)))
+
+
+def record_sales(db: Session, sales: Sequence[schemas.SaleCreate]):
+    """
+    Add newly inserted sales to the daily and per-category rollups, inside
+    the caller's transaction (no commit).
+    """
+    daily = defaultdict(lambda: [Decimal(0), 0, 0])
+    product_ids = set()
+    for s in sales:
+        d = daily[s.sale_date.date()]
+        d[0] += Decimal(str(s.total_amount))
+        d[1] += 1
+        d[2] += sum(i.quantity for i in s.items)
+        product_ids.update(i.product_id for i in s.items)
+
+    _upsert_add(db, models.SalesDailyRollup.__table__, ("sale_day",), [
+        {"sale_day": day, "revenue": rev, "order_count": n, "units": u}
+        for day, (rev, n, u) in daily.items()
+    ])
+    if not product_ids:
+        return
+
+    prod = models.Product.__table__
+    category_of = dict(db.execute(
+        select(prod.c.id, prod.c.category_id)
+          .where(prod.c.id.in_(product_ids))
+    ).all())
+    by_cat = defaultdict(lambda: [Decimal(0), 0, 0])
+    seen_orders = set()
+    for n, s in enumerate(sales):
+        for i in s.items:
+            cat = category_of.get(i.product_id)
+            if cat is None:
+                continue
+            key = (s.sale_date.date(), cat)
+            c = by_cat[key]
+            c[0] += Decimal(str(i.line_total))
+            c[2] += i.quantity
+            if (n, key) not in seen_orders:
+                seen_orders.add((n, key))
+                c[1] += 1
+    _upsert_add(db, models.SalesCategoryDailyRollup.__table__, ("sale_day", "category_id"), [
+        {"sale_day": day, "category_id": cat, "revenue": rev, "order_count": n, "units": u}
+        for (day, cat), (rev, n, u) in by_cat.items()
+    ])
+
+
+def rebuild_rollups(db: Session, start: Optional[date] = None, end: Optional[date] = None):
+    """
+    Recompute both rollups from raw rows for sale days in [start, end]
+    (everything when unbounded) and commit. Use after bulk loads, manual
+    edits or to repair drift. Clears this process's analytics cache; from
+    `manage.py` that reaches the servers only with the shared sqlite
+    backend, memory caches pick it up within ANALYTICS_CACHE_TTL.
+    """
+    sale, item, prod = models.Sale, models.SaleItem, models.Product
+    daily, by_cat = models.SalesDailyRollup, models.SalesCategoryDailyRollup
+
+    raw_range, daily_range, by_cat_range = [], [], []
+    if start:
+        raw_range.append(sale.sale_date >= datetime.combine(start, time.min))
+        daily_range.append(daily.sale_day >= start)
+        by_cat_range.append(by_cat.sale_day >= start)
+    if end:
+        raw_range.append(sale.sale_date < datetime.combine(end + timedelta(days=1), time.min))
+        daily_range.append(daily.sale_day <= end)
+        by_cat_range.append(by_cat.sale_day <= end)
+
+    day = func.date(sale.sale_date)
+    units = (
+        select(item.sale_id, func.sum(item.quantity).label("units"))
+          .group_by(item.sale_id)
+          .subquery()
+    )
+    db.execute(delete(daily).where(*daily_range))
+    db.execute(delete(by_cat).where(*by_cat_range))
+    db.execute(insert(daily).from_select(
+        ["sale_day", "revenue", "order_count", "units"],
+        select(
+            day,
+            func.sum(sale.total_amount),
+            func.count(sale.id),
+            func.coalesce(func.sum(units.c.units), 0),
+        )
+        .select_from(sale)
+        .outerjoin(units, units.c.sale_id == sale.id)
+        .where(*raw_range)
+        .group_by(day)
+    ))
+    db.execute(insert(by_cat).from_select(
+        ["sale_day", "category_id", "revenue", "order_count", "units"],
+        select(
+            day,
+            prod.category_id,
+            func.sum(item.line_total),
+            func.count(func.distinct(sale.id)),
+            func.sum(item.quantity),
+        )
+        .select_from(sale)
+        .join(item, item.sale_id == sale.id)
+        .join(prod, prod.id == item.product_id)
+        .where(*raw_range)
+        .group_by(day, prod.category_id)
+    ))
+    db.commit()
+    analytics_cache.clear()
+
+
+def _raw_daily(
+    db: Session, lo: Optional[datetime], hi: Optional[datetime], category_ids
+) -> DayTotals:
+    """Day totals straight from sales/sale_items for lo <= sale_date <= hi (either optional)."""
+    sale, item, prod = models.Sale, models.SaleItem, models.Product
+    day = func.date(sale.sale_date)
+    if category_ids is None:
+        q = select(day, func.sum(sale.total_amount), func.count(sale.id))
+    else:
+        q = (
+            select(day, func.sum(item.line_total), func.count(func.distinct(sale.id)))
+              .join(item, item.sale_id == sale.id)
+              .join(prod, prod.id == item.product_id)
+              .where(prod.category_id.in_(category_ids))
+        )
+    if lo is not None:
+        q = q.where(sale.sale_date >= lo)
+    if hi is not None:
+        q = q.where(sale.sale_date <= hi)
+    q = q.group_by(day)
+    return {
+        (d if isinstance(d, date) else date.fromisoformat(d)): (Decimal(rev or 0), n)
+        for d, rev, n in db.execute(q)
+    }
+
+
+def daily_totals(
+    db: Session,
+    start: Optional[datetime] = None,
+    end:   Optional[datetime] = None,
+    category_ids: Optional[Sequence[int]] = None,
+) -> DayTotals:
+    """
+    Revenue and order count per day for start <= sale_date <= end (either
+    bound optional), optionally restricted to lines in `category_ids`
+    (revenue is then SUM(line_total)). Whole days come from the rollups;
+    a day that a bound cuts through is summed from raw rows.
+
+    More than one category (a list, or a SELECT such as a subtree) is read
+    from raw rows throughout: an order with lines in several of them has a
+    rollup row in each, so summing their order_count would count it once
+    per category instead of once.
+    """
+    if start is not None and end is not None and start > end:
+        return {}
+    if category_ids is not None and not (
+        isinstance(category_ids, (list, tuple)) and len(category_ids) <= 1
+    ):
+        return _raw_daily(db, start, end, category_ids)
+
+    first_full = None
+    if start is not None:
+        first_full = start.date() if start.time() == time.min else start.date() + timedelta(days=1)
+    last_full = None
+    if end is not None:
+        last_full = end.date() if end.time() == time.max else end.date() - timedelta(days=1)
+
+    if category_ids is None:
+        r = models.SalesDailyRollup
+        q = select(r.sale_day, r.revenue, r.order_count)
+    else:
+        r = models.SalesCategoryDailyRollup
+        q = (
+            select(r.sale_day, func.sum(r.revenue), func.sum(r.order_count))
+              .where(r.category_id.in_(category_ids))
+              .group_by(r.sale_day)
+        )
+    if first_full is not None:
+        q = q.where(r.sale_day >= first_full)
+    if last_full is not None:
+        q = q.where(r.sale_day <= last_full)
+
+    totals: DayTotals = {}
+    if first_full is None or last_full is None or first_full <= last_full:
+        totals = {d: (Decimal(rev or 0), int(n or 0)) for d, rev, n in db.execute(q)}
+
+    # days a bound cuts through
+    edges = {}
+    if start is not None and start.time() != time.min:
+        day_end = datetime.combine(start.date(), time.max)
+        edges[start.date()] = (start, day_end if end is None else min(end, day_end))
+    if end is not None and end.time() != time.max:
+        day_start = datetime.combine(end.date(), time.min)
+        lo = day_start if start is None else max(start, day_start)
+        edges[end.date()] = (lo, end)
+    for lo, hi in edges.values():
+        totals.update(_raw_daily(db, lo, hi, category_ids))
+    return totals
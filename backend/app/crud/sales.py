@@ -1,141 +1,392 @@
-from sqlalchemy.orm import Session
-from .. import models, schemas
+from collections import defaultdict
+from sqlalchemy import and_, case, func, or_, select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import Session, selectinload
+from .. import lookup_cache, models, schemas
+from ..analytics_cache import cache as analytics_cache
 import datetime
-from sqlalchemy import func
 from datetime import date
-from typing import List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+from ..fast_read import as_dicts
+from ..multi_get import chunks
+from ..pagination import keyset
+from .inventory import apply_stock_changes
+from .buckets import revenue_buckets
+from .categories import subtree_ids
+from .rollups import record_sales
 
-def create_sale(db: Session, sale_in: schemas.SaleCreate):
-    db_sale = models.Sale(
-        sale_date=sale_in.sale_date,
-        customer_name=sale_in.customer_name,
-        total_amount=sale_in.total_amount
-    )
-    db.add(db_sale)
-    db.commit()
-    db.refresh(db_sale)
+KEYSET = (models.Sale.sale_date, models.Sale.id)
 
+def create_sale(db: Session, sale_in: schemas.SaleCreate):
+    """
+    Place an order in a single transaction: insert the sale, bulk-insert its
+    items, decrement stock and log the history rows. Raises
+    InsufficientStockError (and writes nothing) if any line would oversell.
+    """
+    deltas = defaultdict(int)
     for item in sale_in.items:
-        db_item = models.SaleItem(
-            sale_id=db_sale.id,
-            **item.dict()
-        )
-        db.add(db_item)
-    db.commit()
-    db.refresh(db_sale)
-    return db_sale
+        deltas[item.product_id] -= item.quantity
+
+    try:
+        sale_id = db.execute(
+            models.Sale.__table__.insert().values(
+                sale_date=sale_in.sale_date,
+                customer_name=sale_in.customer_name,
+                total_amount=sale_in.total_amount,
+            )
+        ).inserted_primary_key[0]
+        if sale_in.items:
+            db.execute(models.SaleItem.__table__.insert(), [
+                {"sale_id": sale_id, **item.dict()} for item in sale_in.items
+            ])
+        apply_stock_changes(db, deltas, reason=f"Sale #{sale_id}")
+        record_sales(db, [sale_in])
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    analytics_cache.invalidate([sale_in.sale_date])
+    lookup_cache.invalidate("inventory", deltas)
+    return get_sale(db, sale_id)
+
+def _insert_sales(db: Session, sales: Sequence[schemas.SaleCreate]) -> List[int]:
+    sale_t, item_t = models.Sale.__table__, models.SaleItem.__table__
+    rows = [
+        {
+            "sale_date":     s.sale_date,
+            "customer_name": s.customer_name,
+            "total_amount":  s.total_amount,
+        }
+        for s in sales
+    ]
+    dialect = db.get_bind().dialect
+    if dialect.name == "sqlite":
+        # SQLAlchemy would send one INSERT ... RETURNING per row to keep them
+        # in order. A single executemany instead: the transaction holds the
+        # database's only write lock from its first row and a new rowid is
+        # MAX(rowid) + 1, so the batch's ids are the run ending at MAX(id)
+        db.execute(sale_t.insert(), rows)
+        last = db.execute(select(func.max(sale_t.c.id))).scalar_one()
+        ids = list(range(last - len(rows) + 1, last + 1))
+    elif dialect.insert_executemany_returning_sort_by_parameter_order:
+        # multi-row INSERT ... RETURNING (one per 1000 rows), ids in parameter order
+        ids = db.execute(
+            sale_t.insert().returning(sale_t.c.id, sort_by_parameter_order=True), rows
+        ).scalars().all()
+    else:
+        # MySQL has no RETURNING and interleaved auto-increment doesn't promise
+        # consecutive ids for a multi-row INSERT, so take lastrowid per sale
+        ids = [db.execute(sale_t.insert(), row).inserted_primary_key[0] for row in rows]
+    items = [
+        {"sale_id": sale_id, **item.dict()}
+        for sale_id, s in zip(ids, sales)
+        for item in s.items
+    ]
+    if items:
+        db.execute(item_t.insert(), items)
+    record_sales(db, sales)
+    return ids
+
+def create_sales_bulk(db: Session, sales: Sequence[schemas.SaleCreate]) -> List[Optional[str]]:
+    """
+    Insert a batch of sales and their items in one transaction, for historical
+    and marketplace backfills: stock is not touched. Returns one entry per
+    sale, None if inserted or the database error if not. When the batch
+    fails as a whole it is retried sale by sale to isolate the bad rows.
+    """
+    try:
+        _insert_sales(db, sales)
+        db.commit()
+        analytics_cache.invalidate(s.sale_date for s in sales)
+        return [None] * len(sales)
+    except DBAPIError:
+        db.rollback()
+
+    errors = []
+    for s in sales:
+        try:
+            _insert_sales(db, [s])
+            db.commit()
+            errors.append(None)
+        except DBAPIError as e:
+            db.rollback()
+            errors.append(str(e.orig))
+    analytics_cache.invalidate(s.sale_date for s, e in zip(sales, errors) if e is None)
+    return errors
 
 def get_sale(db: Session, sale_id: int):
-    return db.query(models.Sale).filter(models.Sale.id == sale_id).first()
+    return (
+        db.query(models.Sale)
+          .options(selectinload(models.Sale.items))
+          .filter(models.Sale.id == sale_id)
+          .first()
+    )
+
+def get_sales_by_ids(db: Session, ids: Sequence[int]) -> Dict[int, models.Sale]:
+    """The sales among `ids` that exist, by id, items loaded with one IN query per chunk."""
+    found = {}
+    for chunk in chunks(ids):
+        found.update(
+            (s.id, s) for s in
+            db.query(models.Sale).options(selectinload(models.Sale.items))
+              .filter(models.Sale.id.in_(chunk))
+        )
+    return found
 
 def list_sales(
     db: Session,
     start_date: Optional[datetime] = None,
     end_date:   Optional[datetime] = None,
     skip:       int = 0,
-    limit:      int = 100
+    limit:      int = 100,
+    after:      Optional[str] = None,
 ):
-    q = db.query(models.Sale)
+    q = db.query(models.Sale).options(selectinload(models.Sale.items))
     if start_date:
         q = q.filter(models.Sale.sale_date >= start_date)
     if end_date:
         q = q.filter(models.Sale.sale_date <= end_date)
+    q = keyset(q, KEYSET, after)
     return q.offset(skip).limit(limit).all()
 
 
-def get_sales(
-    db: Session,
+def _sale_filters(
     start_date: Optional[date] = None,
     end_date:   Optional[date] = None,
     product_id: Optional[int] = None,
     category_id:Optional[int] = None,
-    skip: int = 0,
-    limit: int = 100,
-) -> List[models.Sale]:
-    q = db.query(models.Sale)
+    include_descendants: bool = False,
+) -> list:
+    criteria = []
     if start_date:
-        q = q.filter(models.Sale.sale_date >= start_date)
+        criteria.append(models.Sale.sale_date >= start_date)
     if end_date:
-        q = q.filter(models.Sale.sale_date <= end_date)
+        criteria.append(models.Sale.sale_date <= end_date)
     if product_id or category_id:
-        q = q.join(models.SaleItem, models.Sale.id == models.SaleItem.sale_id) \
-             .join(models.Product, models.SaleItem.product_id == models.Product.id)
+        # a semi-join, so a sale with several matching lines is listed once
+        lines = select(models.SaleItem.sale_id).where(models.SaleItem.sale_id == models.Sale.id)
         if product_id:
-            q = q.filter(models.SaleItem.product_id == product_id)
+            lines = lines.where(models.SaleItem.product_id == product_id)
         if category_id:
-            q = q.filter(models.Product.category_id == category_id)
+            lines = lines.join(models.Product, models.SaleItem.product_id == models.Product.id)
+            if include_descendants:
+                closure = models.CategoryClosure
+                lines = lines.join(closure, closure.descendant_id == models.Product.category_id) \
+                             .where(closure.ancestor_id == category_id)
+            else:
+                lines = lines.where(models.Product.category_id == category_id)
+        criteria.append(lines.exists())
+    return criteria
+
+def get_sales(
+    db: Session,
+    start_date: Optional[date] = None,
+    end_date:   Optional[date] = None,
+    product_id: Optional[int] = None,
+    category_id:Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    include_descendants: bool = False,
+) -> List[models.Sale]:
+    q = db.query(models.Sale).options(selectinload(models.Sale.items)).filter(
+        *_sale_filters(start_date, end_date, product_id, category_id, include_descendants)
+    )
+    q = keyset(q, KEYSET, after)
     return q.offset(skip).limit(limit).all()
 
+def get_sales_rows(
+    db: Session,
+    start_date: Optional[date] = None,
+    end_date:   Optional[date] = None,
+    product_id: Optional[int] = None,
+    category_id:Optional[int] = None,
+    skip: int = 0,
+    limit: int = 100,
+    after: Optional[str] = None,
+    include_descendants: bool = False,
+) -> List[dict]:
+    """
+    get_sales as plain dicts shaped like schemas.Sale, from two Core
+    SELECTs (sales, then their items) without the ORM.
+    """
+    sale, item = models.Sale.__table__, models.SaleItem.__table__
+    q = select(
+        sale.c.sale_date, sale.c.customer_name, sale.c.total_amount, sale.c.id, sale.c.created_at,
+    ).where(*_sale_filters(start_date, end_date, product_id, category_id, include_descendants))
+    q = keyset(q, KEYSET, after).offset(skip).limit(limit)
+    rows = as_dicts(db.execute(q), total_amount=float)
+    by_id = {}
+    for r in rows:
+        r["items"] = []
+        by_id[r["id"]] = r
+    if rows:
+        lines = as_dicts(db.execute(
+            select(item.c.product_id, item.c.quantity, item.c.unit_price, item.c.line_total,
+                   item.c.id, item.c.sale_id)
+              .where(item.c.sale_id.in_(list(by_id)))
+              .order_by(item.c.sale_id, item.c.id)
+        ), unit_price=float, line_total=float)
+        for line in lines:
+            by_id[line["sale_id"]]["items"].append(line)
+    return rows
+
+def export_sales_query(
+    start_date: Optional[date] = None,
+    end_date:   Optional[date] = None,
+    product_id: Optional[int] = None,
+    category_id:Optional[int] = None,
+    include_descendants: bool = False,
+):
+    """Core SELECT of the matching sales rows in (sale_date, id) order, for streaming."""
+    sale = models.Sale.__table__
+    return (
+        select(sale.c.id, sale.c.sale_date, sale.c.customer_name, sale.c.total_amount)
+          .where(*_sale_filters(start_date, end_date, product_id, category_id, include_descendants))
+          .order_by(sale.c.sale_date, sale.c.id)
+    )
+
+PERIOD_UNITS = {
+    "hourly":    "hour",
+    "daily":     "day",
+    "weekly":    "week",
+    "monthly":   "month",
+    "quarterly": "quarter",
+    "yearly":    "year",
+}
+
 def get_revenue_summary(
     db: Session,
-    period: str,  # "daily"|"weekly"|"monthly"|"yearly"
+    period: str,  # "hourly"|"daily"|"weekly"|"monthly"|"quarterly"|"yearly"
     start_date: Optional[date] = None,
     end_date:   Optional[date] = None,
+    tz:         str = "UTC",
+    category_id: Optional[int] = None,
+    include_descendants: bool = False,
 ) -> List[schemas.RevenueResponse]:
-    sale = models.Sale
-    # pick grouping function
-    if period == "daily":
-        grp = func.date(sale.sale_date)
-    elif period == "weekly":
-        grp = func.week(sale.sale_date)
-    elif period == "monthly":
-        grp = func.month(sale.sale_date)
-    elif period == "yearly":
-        grp = func.year(sale.sale_date)
-    else:
+    unit = PERIOD_UNITS.get(period)
+    if unit is None:
         raise ValueError("Invalid period")
-
-    q = db.query(
-        grp.label("period"),
-        func.sum(sale.total_amount).label("total_amount")
-    )
-    if start_date:
-        q = q.filter(sale.sale_date >= start_date)
-    if end_date:
-        q = q.filter(sale.sale_date <= end_date)
-    q = q.group_by(grp).order_by(grp)
+    category_ids = None
+    if category_id is not None:
+        category_ids = subtree_ids(category_id) if include_descendants else [category_id]
 
     return [
-        schemas.RevenueResponse(period=str(r.period), total_amount=float(r.total_amount))
-        for r in q.all()
+        schemas.RevenueResponse(
+            period=(b.bucket_start.isoformat() if unit == "hour"
+                    else b.bucket_start.date().isoformat()),
+            total_amount=float(b.revenue),
+            bucket_start=b.bucket_start,
+            orders=b.orders,
+        )
+        for b in revenue_buckets(db, unit, start_date, end_date, tz, category_ids)
     ]
 
+MAX_COMPARE_PERIODS = 60
+
+def parse_period(value: str) -> Tuple[date, date]:
+    """'2024-01-01/2024-01-31' -> (start, end), both days inclusive."""
+    try:
+        start, end = (date.fromisoformat(v) for v in value.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid period {value!r}, expected YYYY-MM-DD/YYYY-MM-DD")
+    if end < start:
+        raise ValueError(f"Period {value!r} ends before it starts")
+    return start, end
+
 def compare_periods(
     db: Session,
-    p1_start:   date,
-    p1_end:     date,
-    p2_start:   date,
-    p2_end:     date,
-    category_id: Optional[int] = None,
+    periods:      Sequence[Tuple[date, date]],
+    category_ids: Optional[Sequence[int]] = None,
+    include_descendants: bool = False,
 ) -> schemas.SalesComparison:
-    # helper to sum revenue in a range
-    def sum_range(start: date, end: date) -> float:
-        q = db.query(func.sum(models.Sale.total_amount))
-        q = q.filter(models.Sale.sale_date >= start,
-                     models.Sale.sale_date <= end)
-        if category_id:
-            q = q.join(models.SaleItem)\
-                 .join(models.Product)\
-                 .filter(models.Product.category_id == category_id)
-        total = q.scalar() or 0.0
-        return float(total)
+    """
+    Revenue, order and unit counts for every period -- per category (or
+    category subtree) when `category_ids` is given, else over all sales --
+    with each cell's change against the previous period. Revenue is
+    SUM(total_amount) over all sales, as in /sales/stats, and the sum of the
+    category's line totals per category.
+
+    Every cell is computed by one conditional-aggregation query with a
+    SUM(CASE ...) per period over only the days inside some period, so 52
+    weeks cost one pass rather than 52 and far-apart periods don't scan the
+    time between them. Periods are whole days, so they are read from the
+    daily rollups (crud/rollups.py) -- except subtrees: an order with lines
+    in several subcategories must count once, and the category rollup
+    counts it per category, so those come from the raw lines.
+    """
+    if not periods:
+        raise ValueError("At least one period is required")
+    if len(periods) > MAX_COMPARE_PERIODS:
+        raise ValueError(f"At most {MAX_COMPARE_PERIODS} periods can be compared")
+    category_ids = list(dict.fromkeys(category_ids)) if category_ids else None
+
+    columns = []
+    if category_ids and include_descendants:
+        sale, item, prod = models.Sale, models.SaleItem, models.Product
+        closure = models.CategoryClosure
+        spans = [
+            and_(sale.sale_date >= datetime.datetime.combine(start, datetime.time.min),
+                 sale.sale_date < datetime.datetime.combine(
+                     end + datetime.timedelta(days=1), datetime.time.min))
+            for start, end in periods
+        ]
+        for inside in spans:
+            columns += [
+                func.sum(case((inside, item.line_total))),
+                func.count(func.distinct(case((inside, sale.id)))),
+                func.sum(case((inside, item.quantity))),
+            ]
+        q = (
+            select(*columns, closure.ancestor_id)
+              .select_from(sale)
+              .join(item, item.sale_id == sale.id)
+              .join(prod, prod.id == item.product_id)
+              .join(closure, closure.descendant_id == prod.category_id)
+              .where(or_(*spans), closure.ancestor_id.in_(category_ids))
+              .group_by(closure.ancestor_id)
+        )
+    else:
+        r = models.SalesCategoryDailyRollup if category_ids else models.SalesDailyRollup
+        spans = [r.sale_day.between(start, end) for start, end in periods]
+        for inside in spans:
+            columns += [
+                func.sum(case((inside, r.revenue))),
+                func.sum(case((inside, r.order_count))),
+                func.sum(case((inside, r.units))),
+            ]
+        q = select(*columns).where(or_(*spans))
+        if category_ids:
+            q = (
+                q.add_columns(r.category_id)
+                 .where(r.category_id.in_(category_ids))
+                 .group_by(r.category_id)
+            )
+    if category_ids:
+        found = {row[-1]: row for row in db.execute(q)}
+        raw = [(cid, found.get(cid)) for cid in category_ids]
+    else:
+        raw = [(None, db.execute(q).one())]
 
-    rev1 = sum_range(p1_start, p1_end)
-    rev2 = sum_range(p2_start, p2_end)
-    diff = rev2 - rev1
-    pct  = (diff / rev1 * 100) if rev1 != 0 else None
+    rows = []
+    for category_id, values in raw:
+        cells = []
+        for n in range(len(periods)):
+            revenue, orders, units = values[3 * n:3 * n + 3] if values else (None, 0, None)
+            cell = schemas.PeriodCell(
+                revenue=float(revenue or 0), orders=int(orders or 0), units=int(units or 0)
+            )
+            if cells:
+                prev = cells[-1].revenue
+                cell.difference = cell.revenue - prev
+                cell.percent_change = (cell.difference / prev * 100) if prev != 0 else None
+            cells.append(cell)
+        rows.append(schemas.ComparisonRow(category_id=category_id, cells=cells))
 
     return schemas.SalesComparison(
-        period1=schemas.PeriodRevenue(
-            start=p1_start.isoformat(),
-            end  =p1_end.isoformat(),
-            revenue=rev1
-        ),
-        period2=schemas.PeriodRevenue(
-            start=p2_start.isoformat(),
-            end  =p2_end.isoformat(),
-            revenue=rev2
-        ),
-        difference     = diff,
-        percent_change = pct
-    )
\ No newline at end of file
+        periods=[
+            schemas.ComparePeriod(start=start.isoformat(), end=end.isoformat())
+            for start, end in periods
+        ],
+        rows=rows,
+    )
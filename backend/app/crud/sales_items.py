@@ -1,17 +1,69 @@
+from datetime import date
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from typing import Optional
+from typing import List, Optional
 from .. import models
+from ..fast_read import as_dicts
+from ..pagination import keyset
+
+KEYSET = (models.SaleItem.id,)
 
 def list_sale_items(
     db: Session,
     product_id: Optional[int] = None,
     sale_id:    Optional[int] = None,
     skip:       int = 0,
-    limit:      int = 100
+    limit:      int = 100,
+    after:      Optional[str] = None,
 ):
     q = db.query(models.SaleItem)
     if product_id:
         q = q.filter(models.SaleItem.product_id == product_id)
     if sale_id:
         q = q.filter(models.SaleItem.sale_id == sale_id)
+    q = keyset(q, KEYSET, after)
     return q.offset(skip).limit(limit).all()
+
+def list_sale_items_rows(
+    db: Session,
+    product_id: Optional[int] = None,
+    sale_id:    Optional[int] = None,
+    skip:       int = 0,
+    limit:      int = 100,
+    after:      Optional[str] = None,
+) -> List[dict]:
+    """list_sale_items as plain dicts shaped like schemas.SaleItem, without the ORM."""
+    item = models.SaleItem.__table__
+    q = select(item.c.product_id, item.c.quantity, item.c.unit_price, item.c.line_total,
+               item.c.id, item.c.sale_id)
+    if product_id:
+        q = q.where(item.c.product_id == product_id)
+    if sale_id:
+        q = q.where(item.c.sale_id == sale_id)
+    q = keyset(q, KEYSET, after).offset(skip).limit(limit)
+    return as_dicts(db.execute(q), unit_price=float, line_total=float)
+
+def export_sale_items_query(
+    product_id: Optional[int] = None,
+    sale_id:    Optional[int] = None,
+    start_date: Optional[date] = None,
+    end_date:   Optional[date] = None,
+):
+    """Core SELECT of the matching sale_items rows in id order, for streaming."""
+    item = models.SaleItem.__table__
+    q = select(
+        item.c.id, item.c.sale_id, item.c.product_id,
+        item.c.quantity, item.c.unit_price, item.c.line_total,
+    )
+    if product_id:
+        q = q.where(item.c.product_id == product_id)
+    if sale_id:
+        q = q.where(item.c.sale_id == sale_id)
+    if start_date or end_date:
+        sale = models.Sale.__table__
+        q = q.join(sale, sale.c.id == item.c.sale_id)
+        if start_date:
+            q = q.where(sale.c.sale_date >= start_date)
+        if end_date:
+            q = q.where(sale.c.sale_date <= end_date)
+    return q.order_by(item.c.id)
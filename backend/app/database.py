@@ -1,15 +1,175 @@
-from sqlalchemy import create_engine
+import itertools
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional, Tuple
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from . import metrics, pooling, replication
 from .config import settings
 
-engine = create_engine(settings.DATABASE_URL, pool_pre_ping=True)
+
+def _instrumented(engine, name: str):
+    """Register `engine`'s pool and statements with app.pooling / app.metrics."""
+    sync_engine = getattr(engine, "sync_engine", engine)
+    pooling.configure(sync_engine, name)
+    if settings.REQUEST_METRICS:
+        metrics.instrument(sync_engine)
+    return engine
+
+
+def _engine(url: str, name: str):
+    return _instrumented(create_engine(url, **pooling.engine_options(url, name)), name)
+
+
+def _async_engine(url: str, name: str):
+    return _instrumented(
+        create_async_engine(url, **pooling.engine_options(url, name, is_async=True)), name
+    )
+
+
+engine = _engine(settings.DATABASE_URL, "primary")
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+ASYNC_DRIVERS = {
+    "mysql":      "mysql+aiomysql",
+    "postgresql": "postgresql+asyncpg",
+    "sqlite":     "sqlite+aiosqlite",
+}
+
+def async_url(url: str) -> str:
+    u = make_url(url)
+    return u.set(drivername=ASYNC_DRIVERS.get(u.get_backend_name(), u.drivername)) \
+            .render_as_string(hide_password=False)
+
+async_engine = None
+AsyncSessionLocal = None
+if settings.ASYNC_DB:
+    async_engine = _async_engine(
+        settings.ASYNC_DATABASE_URL or async_url(settings.DATABASE_URL), "primary-async"
+    )
+    # CRUD functions reload what they return, and responses are serialized
+    # after the session closes, so don't expire (and lazily re-fetch) on commit
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False
+    )
+
+# read replicas, taken round robin by get_read_db (GET endpoints)
+REPLICA_URLS = [u.strip() for u in settings.DATABASE_REPLICA_URLS.split(",") if u.strip()]
+replica_engines = [_engine(url, f"replica-{i}") for i, url in enumerate(REPLICA_URLS)]
+ReplicaSessions = [
+    sessionmaker(autocommit=False, autoflush=False, bind=e) for e in replica_engines
+]
+async_replica_engines = []
+AsyncReplicaSessions = []
+if settings.ASYNC_DB:
+    async_replica_engines = [
+        _async_engine(async_url(url), f"replica-{i}-async") for i, url in enumerate(REPLICA_URLS)
+    ]
+    AsyncReplicaSessions = [
+        async_sessionmaker(e, autoflush=False, expire_on_commit=False)
+        for e in async_replica_engines
+    ]
+_next_replica = itertools.count()
+
+
+def _replica_for(request: Request) -> Optional[int]:
+    """Index of the replica to read from, or None to read from the primary."""
+    if not replica_engines or replication.wants_primary(request):
+        return None
+    return next(_next_replica) % len(replica_engines)
+
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+
+class DB:
+    """
+    The request's database handle. CRUD functions are written once against a
+    sync Session; `run` executes one without blocking the event loop, either
+    on the AsyncEngine through AsyncSession.run_sync (ASYNC_DB=true) or on the
+    blocking engine in the threadpool.
+    """
+    def __init__(self, session):
+        self.session = session
+
+    async def run(self, fn, *args, **kwargs):
+        if isinstance(self.session, AsyncSession):
+            return await self.session.run_sync(fn, *args, **kwargs)
+        return await run_in_threadpool(fn, self.session, *args, **kwargs)
+
+
+@asynccontextmanager
+async def _session(sync_factory, async_factory):
+    if async_factory is not None:
+        async with async_factory() as session:
+            yield DB(session)
+    else:
+        db = sync_factory()
+        try:
+            yield DB(db)
+        finally:
+            await run_in_threadpool(db.close)
+
+
+async def get_async_db():
+    async with _session(SessionLocal, AsyncSessionLocal) as db:
+        yield db
+
+
+async def get_read_db(request: Request):
+    """
+    get_async_db for read-only endpoints: a replica session (round robin),
+    or the primary when no replicas are configured or the client wrote
+    within READ_YOUR_WRITES_SECONDS (see app/replication.py).
+    """
+    i = _replica_for(request)
+    if i is None:
+        async with _session(SessionLocal, AsyncSessionLocal) as db:
+            yield db
+    else:
+        async with _session(
+            ReplicaSessions[i], AsyncReplicaSessions[i] if AsyncReplicaSessions else None
+        ) as db:
+            yield db
+
+
+def read_engines(request: Request) -> Tuple[Engine, Optional[AsyncEngine]]:
+    """(sync engine, async engine or None) that a streamed read should use."""
+    i = _replica_for(request)
+    if i is None:
+        return engine, async_engine
+    return replica_engines[i], async_replica_engines[i] if async_replica_engines else None
+
+
+@contextmanager
+def count_statements(bind=None):
+    """
+    Count the SQL statements executed on `bind` (default: the engine serving
+    requests) inside the block:
+
+        with count_statements() as stmts:
+            ...
+        assert len(stmts) <= 3, stmts
+    """
+    if bind is None:
+        bind = async_engine.sync_engine if async_engine is not None else engine
+    statements = []
+
+    def _record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(bind, "before_cursor_execute", _record)
+    try:
+        yield statements
+    finally:
+        event.remove(bind, "before_cursor_execute", _record)
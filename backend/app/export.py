@@ -0,0 +1,126 @@
+"""
+Streaming table exports.
+
+An export runs one Core SELECT on its own connection with a server-side
+cursor (`stream_results` + `yield_per`), so rows arrive EXPORT_BATCH_SIZE
+at a time and each batch is encoded and sent before the next is fetched:
+memory stays flat whatever the row count. The request's session is not
+used -- it is closed before a streamed body finishes -- so routes pass the
+engines to read from (database.read_engines: a replica or the primary).
+"""
+import csv
+import io
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from itertools import islice
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional, Sequence, Tuple
+
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import iterate_in_threadpool
+
+from . import database
+from .config import settings
+
+MEDIA_TYPES = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+
+def _json_value(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if isinstance(v, Decimal):
+        return float(v)
+    return v
+
+
+def _encoder(fmt: str, columns: Sequence[str]) -> Callable[[Sequence], bytes]:
+    if fmt == "ndjson":
+        def encode(rows):
+            return "".join(
+                json.dumps(dict(zip(columns, map(_json_value, row))), separators=(",", ":")) + "\n"
+                for row in rows
+            ).encode()
+        return encode
+
+    def encode(rows):
+        buf = io.StringIO()
+        csv.writer(buf, lineterminator="\n").writerows(
+            [v.isoformat() if isinstance(v, (datetime, date)) else v for v in row] for row in rows
+        )
+        return buf.getvalue().encode()
+    return encode
+
+
+def _header(fmt: str, columns: Sequence[str]) -> bytes:
+    return (",".join(columns) + "\n").encode() if fmt == "csv" else b""
+
+
+def _batches(rows: Iterable[Sequence]) -> Iterator[list]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, settings.EXPORT_BATCH_SIZE))
+        if not batch:
+            return
+        yield batch
+
+
+def _iter_sync(engine, stmt, encode) -> Iterator[bytes]:
+    with engine.connect() as conn:
+        result = conn.execution_options(
+            stream_results=True, yield_per=settings.EXPORT_BATCH_SIZE
+        ).execute(stmt)
+        for rows in result.partitions():
+            yield encode(rows)
+
+
+async def _iter_async(engine, stmt, encode) -> AsyncIterator[bytes]:
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            stmt.execution_options(yield_per=settings.EXPORT_BATCH_SIZE)
+        )
+        async for rows in result.partitions():
+            yield encode(rows)
+
+
+def stream_export(stmt, fmt: str, filename: str, engines: Optional[Tuple] = None,
+                  before: Iterable[Sequence] = (),
+                  columns: Optional[Sequence[str]] = None) -> StreamingResponse:
+    """
+    Stream the rows of a Core `stmt` as CSV (with a header line) or NDJSON,
+    served as an attachment named `filename`.<fmt>. `engines` is the (sync,
+    async or None) pair to read from; default the primary's. Rows of
+    `before` (in the statement's column order, e.g. from an archive) are
+    sent first. With `stmt` None only `before` is sent, as `columns`.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unknown export format: {fmt}")
+    if columns is None:
+        columns = [c.key for c in stmt.selected_columns]
+    encode = _encoder(fmt, columns)
+    header = _header(fmt, columns)
+
+    sync_engine, async_engine = engines or (database.engine, database.async_engine)
+
+    if async_engine is not None:
+        async def body():
+            if header:
+                yield header
+            async for rows in iterate_in_threadpool(_batches(before)):
+                yield encode(rows)
+            if stmt is not None:
+                async for chunk in _iter_async(async_engine, stmt, encode):
+                    yield chunk
+    else:
+        def body():
+            if header:
+                yield header
+            for rows in _batches(before):
+                yield encode(rows)
+            if stmt is not None:
+                yield from _iter_sync(sync_engine, stmt, encode)
+
+    return StreamingResponse(
+        body(),
+        media_type=MEDIA_TYPES[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{fmt}"'},
+    )
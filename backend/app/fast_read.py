@@ -0,0 +1,44 @@
+"""
+Opt-in ORM-free read path for the big list endpoints.
+
+For an endpoint named in FAST_READ_ENDPOINTS the CRUD layer returns plain
+dicts built from Core rows (`*_rows` functions), already shaped like the
+endpoint's response_model, and they are encoded straight to JSON bytes by
+pydantic-core's serializer. Rows come from our own database, so they skip
+the ORM identity map and the response_model validation pass.
+`python -m benchmarks.fast_read` checks both paths give identical responses.
+"""
+from typing import List, Optional
+
+from pydantic_core import to_json
+from starlette.responses import Response
+
+from .config import settings
+from .pagination import next_cursor
+
+def as_dicts(result, **convert) -> List[dict]:
+    """
+    Rows of a Core result as plain dicts, fetched in one go; `convert` maps
+    column name -> callable (e.g. price=float for DECIMAL columns).
+    """
+    keys = list(result.keys())
+    rows = [dict(zip(keys, r)) for r in result.all()]
+    for col, fn in convert.items():
+        for r in rows:
+            if r[col] is not None:
+                r[col] = fn(r[col])
+    return rows
+
+
+def enabled(endpoint: str) -> bool:
+    return endpoint in {e.strip() for e in settings.FAST_READ_ENDPOINTS.split(",")}
+
+
+def json_response(rows: list, limit: Optional[int] = None, keys=None) -> Response:
+    """`rows` as a JSON response, with X-Next-Cursor when `keys` are given."""
+    headers = {}
+    if keys is not None:
+        cursor = next_cursor(rows, limit, keys)
+        if cursor:
+            headers["X-Next-Cursor"] = cursor
+    return Response(to_json(rows), media_type="application/json", headers=headers)
@@ -0,0 +1,404 @@
+"""
+Cold storage for old inventory history.
+
+`python manage.py archive-history` moves the inventory_history rows older
+than a horizon (default HISTORY_RETENTION_DAYS ago) out of the database
+into an append-only segment file under HISTORY_ARCHIVE_DIR and replaces
+each product's archived rows with one opening-balance row, dated at the
+horizon, holding their sum: SUM(change_qty) per product still equals its
+stock on hand, and the table keeps only recent rows.
+
+A segment holds the rows of one run in (changed_at, id) order:
+
+    MAGIC | block 0 | block 1 | ... | index | footer
+
+Each block is up to BLOCK_ROWS rows, stored column-wise and zlib-compressed. The index (also
+compressed) holds every block's offset, length and key range, plus postings
+lists of the blocks that hold each product's and each inventory row's
+history. The footer is the index's offset and length followed by MAGIC.
+Readers memory-map segments and decompress only the blocks a query needs.
+
+manifest.json lists the segments and the horizon. Replacing it (atomically)
+commits a run: from then on readers take history before the horizon from
+the segments only and from the horizon on from the database only, so rows
+that the run has not deleted yet are never read twice. The history
+endpoints merge the two and hide the opening-balance rows
+(crud.inventory_history). Segments are local files, so every host serving
+those endpoints needs the same archive directory (shared storage).
+"""
+import fcntl
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import zlib
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import settings
+
+MAGIC = b"IHSEG01\n"
+FOOTER = struct.Struct("<QQ")
+# a block is stored column by column: these int64 columns (changed_at in
+# microseconds), then the rows+1 offsets of each reason in the UTF-8 reasons
+# that follow, so a filter scans fixed-width arrays and only matching rows
+# are materialized
+BLOCK_COLUMNS = ("id", "inventory_id", "product_id", "change_qty", "changed_at")
+BLOCK_ROWS = 4096
+# per block in the index: offset, length, rows, first/last (changed_at, id)
+BLOCK_FIELDS = 7
+MANIFEST = "manifest.json"
+
+# reason of the per-product rows that stand in for archived history
+OPENING_BALANCE = "Opening balance (archived history)"
+
+# rows are (id, inventory_id, product_id, change_qty, reason, changed_at),
+# the column order of crud.inventory_history.export_inventory_history_query
+COLUMNS = ("id", "inventory_id", "product_id", "change_qty", "reason", "changed_at")
+Row = Tuple[int, int, int, int, str, datetime]
+# (changed_at in microseconds, id)
+Key = Tuple[int, int]
+
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def to_micros(dt: datetime) -> int:
+    """A (naive, DB-time) changed_at as microseconds since the epoch."""
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return (dt - _EPOCH) // _MICROSECOND
+
+
+def from_micros(us: int) -> datetime:
+    return _EPOCH + us * _MICROSECOND
+
+
+def _postings(blocks_by_id: Dict[int, List[int]]) -> Tuple[array, array, array]:
+    """{id: [block numbers]} as sorted ids, start offsets and one flat block array."""
+    ids, starts, flat = array("q"), array("q"), array("i")
+    for key in sorted(blocks_by_id):
+        ids.append(key)
+        starts.append(len(flat))
+        flat.extend(blocks_by_id[key])
+    starts.append(len(flat))
+    return ids, starts, flat
+
+
+class SegmentWriter:
+    """Writes rows, given in (changed_at, id) order, to a new segment file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path + ".tmp", "wb")
+        self._file.write(MAGIC)
+        self._columns = [array("q") for _ in BLOCK_COLUMNS]
+        self._reasons = bytearray()
+        self._offsets = array("q", [0])
+        self._blocks = array("q")
+        self._products: Dict[int, List[int]] = defaultdict(list)
+        self._inventories: Dict[int, List[int]] = defaultdict(list)
+        self.rows = 0
+
+    def add(self, row: Sequence):
+        row_id, inventory_id, product_id, change_qty, reason, changed_at = row
+        for column, value in zip(self._columns, (row_id, inventory_id, product_id, change_qty,
+                                                 to_micros(changed_at))):
+            column.append(value)
+        self._reasons += reason.encode()
+        self._offsets.append(len(self._reasons))
+        self.rows += 1
+        if len(self._offsets) > BLOCK_ROWS:
+            self._flush()
+
+    def _flush(self):
+        ids, inventories, products, _, stamps = self._columns
+        if not ids:
+            return
+        block = len(self._blocks) // BLOCK_FIELDS
+        data = zlib.compress(
+            b"".join(c.tobytes() for c in self._columns) + self._offsets.tobytes() + self._reasons, 6
+        )
+        self._blocks.extend((self._file.tell(), len(data), len(ids),
+                             stamps[0], ids[0], stamps[-1], ids[-1]))
+        self._file.write(data)
+        for product_id in set(products):
+            self._products[product_id].append(block)
+        for inventory_id in set(inventories):
+            self._inventories[inventory_id].append(block)
+        self._columns = [array("q") for _ in BLOCK_COLUMNS]
+        self._reasons = bytearray()
+        self._offsets = array("q", [0])
+
+    def close(self) -> dict:
+        """Finish the file (fsynced, then renamed into place); returns its manifest entry."""
+        self._flush()
+        arrays = [self._blocks, *_postings(self._products), *_postings(self._inventories)]
+        header = json.dumps({
+            "rows": self.rows,
+            "byteorder": sys.byteorder,
+            "arrays": [[a.typecode, a.itemsize, len(a)] for a in arrays],
+        }).encode()
+        index = zlib.compress(
+            struct.pack("<I", len(header)) + header + b"".join(a.tobytes() for a in arrays)
+        )
+        offset = self._file.tell()
+        self._file.write(index)
+        self._file.write(FOOTER.pack(offset, len(index)) + MAGIC)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self.path + ".tmp", self.path)
+        blocks = self._blocks
+        return {
+            "file": os.path.basename(self.path),
+            "rows": self.rows,
+            "first": from_micros(blocks[3]).isoformat() if self.rows else None,
+            "last": from_micros(blocks[-2]).isoformat() if self.rows else None,
+        }
+
+    def abort(self):
+        self._file.close()
+        os.remove(self.path + ".tmp")
+
+
+class Segment:
+    """A memory-mapped segment file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        tail = len(self._mm) - FOOTER.size - len(MAGIC)
+        if self._mm[:len(MAGIC)] != MAGIC or self._mm[tail + FOOTER.size:] != MAGIC:
+            raise ValueError(f"{path} is not an inventory history segment")
+        offset, length = FOOTER.unpack_from(self._mm, tail)
+        index = zlib.decompress(memoryview(self._mm)[offset:offset + length])
+        (header_len,) = struct.unpack_from("<I", index)
+        header = json.loads(index[4:4 + header_len])
+        if header["byteorder"] != sys.byteorder:
+            raise ValueError(f"{path}: written on a {header['byteorder']}-endian platform")
+        arrays, pos = [], 4 + header_len
+        for typecode, itemsize, n in header["arrays"]:
+            a = array(typecode)
+            if a.itemsize != itemsize:
+                raise ValueError(f"{path}: index written on an incompatible platform")
+            a.frombytes(index[pos:pos + itemsize * n])
+            arrays.append(a)
+            pos += itemsize * n
+        self.rows = header["rows"]
+        self._blocks = arrays[0]
+        self._postings = {"product": arrays[1:4], "inventory": arrays[4:7]}
+
+    @property
+    def block_count(self) -> int:
+        return len(self._blocks) // BLOCK_FIELDS
+
+    def _block_range(self, block: int) -> Tuple[Key, Key]:
+        b = self._blocks[block * BLOCK_FIELDS:(block + 1) * BLOCK_FIELDS]
+        return (b[3], b[4]), (b[5], b[6])
+
+    def _candidates(self, kind: str, key: Optional[int]) -> Sequence[int]:
+        if key is None:
+            return range(self.block_count)
+        ids, starts, flat = self._postings[kind]
+        i = bisect_left(ids, key)
+        if i == len(ids) or ids[i] != key:
+            return ()
+        return flat[starts[i]:starts[i + 1]]
+
+    def _decode(self, block: int) -> list:
+        """The block's columns (see BLOCK_COLUMNS), reason offsets and reasons."""
+        offset, length, n = self._blocks[block * BLOCK_FIELDS:block * BLOCK_FIELDS + 3]
+        data = memoryview(zlib.decompress(memoryview(self._mm)[offset:offset + length]))
+        columns, pos = [], 0
+        for size in [n] * len(BLOCK_COLUMNS) + [n + 1]:
+            column = array("q")
+            column.frombytes(data[pos:pos + size * column.itemsize])
+            columns.append(column)
+            pos += size * column.itemsize
+        columns.append(data[pos:])
+        return columns
+
+    def _matches(self, product_id: Optional[int], inventory_id: Optional[int],
+                 lower: Optional[Key], upper: Optional[Key],
+                 descending: bool) -> Iterator[Tuple[list, Sequence[int]]]:
+        """(decoded block, positions of its matching rows in key order) per block."""
+        if product_id is not None:
+            blocks = self._candidates("product", product_id)
+        else:
+            blocks = self._candidates("inventory", inventory_id)
+        for block in (reversed(blocks) if descending else blocks):
+            first, last = self._block_range(block)
+            if (lower is not None and last < lower) or (upper is not None and first >= upper):
+                continue
+            columns = self._decode(block)
+            ids, inventories, products, _, stamps = columns[:len(BLOCK_COLUMNS)]
+            # stamps are sorted: narrow to the time range, then check whole keys
+            lo = 0 if lower is None else bisect_left(stamps, lower[0])
+            hi = len(ids) if upper is None else bisect_right(stamps, upper[0])
+            if lower is not None:
+                while lo < hi and (stamps[lo], ids[lo]) < lower:
+                    lo += 1
+            if upper is not None:
+                while hi > lo and (stamps[hi - 1], ids[hi - 1]) >= upper:
+                    hi -= 1
+            picked = range(lo, hi)
+            if product_id is not None:
+                picked = [i for i in picked if products[i] == product_id]
+            if inventory_id is not None:
+                picked = [i for i in picked if inventories[i] == inventory_id]
+            yield columns, (picked[::-1] if descending else picked)
+
+    def scan(self, product_id: Optional[int] = None, inventory_id: Optional[int] = None,
+             lower: Optional[Key] = None, upper: Optional[Key] = None,
+             descending: bool = False) -> Iterator[Row]:
+        """Matching rows with lower <= (changed_at, id) < upper, in key order."""
+        for columns, picked in self._matches(product_id, inventory_id, lower, upper, descending):
+            ids, inventories, products, quantities, stamps, offsets, reasons = columns
+            for i in picked:
+                yield (ids[i], inventories[i], products[i], quantities[i],
+                       bytes(reasons[offsets[i]:offsets[i + 1]]).decode(), from_micros(stamps[i]))
+
+    def totals(self, product_id: Optional[int] = None, lower: Optional[Key] = None,
+               upper: Optional[Key] = None) -> Dict[int, int]:
+        """{product_id: SUM(change_qty)} of the rows scan() would return, without building them."""
+        out: Dict[int, int] = defaultdict(int)
+        for columns, picked in self._matches(product_id, None, lower, upper, False):
+            products, quantities = columns[2], columns[3]
+            if len(picked) == len(products):
+                # a whole block: let zip walk the arrays
+                for pid, qty in zip(products, quantities):
+                    out[pid] += qty
+            else:
+                for i in picked:
+                    out[products[i]] += quantities[i]
+        return out
+
+    def close(self):
+        self._mm.close()
+
+
+class Archive:
+    """
+    The segments named by `directory`/manifest.json, memory-mapped. The
+    manifest is re-read when it changes, so every worker picks up a new
+    archival run on its next query.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._horizon: Optional[datetime] = None
+        self._segments: List[Segment] = []
+        self._open: Dict[str, Segment] = {}
+
+    def manifest(self) -> dict:
+        try:
+            with open(os.path.join(self.directory, MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"horizon": None, "segments": []}
+
+    def _refresh(self):
+        try:
+            st = os.stat(os.path.join(self.directory, MANIFEST))
+            stamp = (st.st_mtime_ns, st.st_size, st.st_ino)
+        except FileNotFoundError:
+            stamp = None
+        if stamp == self._stamp:
+            return
+        with self._lock:
+            if stamp == self._stamp:
+                return
+            manifest = self.manifest()
+            segments = []
+            for entry in manifest["segments"]:
+                name = entry["file"]
+                if name not in self._open:
+                    self._open[name] = Segment(os.path.join(self.directory, name))
+                segments.append(self._open[name])
+            self._segments = segments
+            self._horizon = (datetime.fromisoformat(manifest["horizon"])
+                             if manifest["horizon"] else None)
+            self._stamp = stamp
+
+    def horizon(self) -> Optional[datetime]:
+        """History before this instant lives in the segments; None if nothing is archived."""
+        self._refresh()
+        return self._horizon
+
+    def scan(self, product_id: Optional[int] = None, inventory_id: Optional[int] = None,
+             lower: Optional[Key] = None, upper: Optional[Key] = None,
+             descending: bool = False) -> Iterator[Row]:
+        """Archived rows across all segments, in (changed_at, id) order (see Segment.scan)."""
+        self._refresh()
+        segments = self._segments
+        for segment in (reversed(segments) if descending else segments):
+            yield from segment.scan(product_id, inventory_id, lower, upper, descending)
+
+    def totals(self, product_id: Optional[int] = None, lower: Optional[Key] = None,
+               upper: Optional[Key] = None) -> Dict[int, int]:
+        """{product_id: SUM(change_qty)} of the archived rows in [lower, upper)."""
+        self._refresh()
+        out: Dict[int, int] = defaultdict(int)
+        for segment in list(self._segments):
+            for pid, total in segment.totals(product_id, lower, upper).items():
+                out[pid] += total
+        return dict(out)
+
+    def close(self):
+        with self._lock:
+            for segment in self._open.values():
+                segment.close()
+            self._open.clear()
+            self._segments = []
+            self._stamp = None
+
+
+archive = Archive(settings.HISTORY_ARCHIVE_DIR)
+
+
+@contextmanager
+def exclusive(directory: str):
+    """Hold the archive directory's lock file: one archival run at a time."""
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, ".lock"), "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def write_manifest(directory: str, manifest: dict):
+    path = os.path.join(directory, MANIFEST)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+def write_segment(directory: str, horizon: datetime, rows: Iterable[Sequence]) -> Optional[dict]:
+    """Write `rows` to a new segment named after `horizon`; None (no file) if there are none."""
+    writer = SegmentWriter(
+        os.path.join(directory, f"history-{horizon:%Y%m%dT%H%M%S}.seg")
+    )
+    try:
+        for row in rows:
+            writer.add(row)
+    except BaseException:
+        writer.abort()
+        raise
+    if not writer.rows:
+        writer.abort()
+        return None
+    return writer.close()
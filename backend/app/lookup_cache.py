@@ -0,0 +1,319 @@
+"""
+Hot-key cache for the single-row lookups: GET /products/{id},
+GET /products/by-sku/{sku} and GET /inventory/{product_id}, and the
+product and inventory id-list reads (app/multi_get.py), which share their
+entries.
+
+Entries are serialized JSON response bodies keyed by (kind, key), each with
+its own expiry (LOOKUP_CACHE_TTL); an unknown id or SKU is cached as a miss
+for LOOKUP_CACHE_NEGATIVE_TTL. The cache is per process and holds at most
+LOOKUP_CACHE_SIZE entries under W-TinyLFU:
+
+  window     a small LRU (1% of the entries) that every new key enters
+  main       a segmented LRU of probation (20%) and protected (80%)
+             entries: a hit in probation promotes the entry, protected
+             overflow is demoted back to probation
+  admission  a key pushed out of the window replaces main's LRU victim
+             only if a count-min sketch estimates it was asked for more
+             often; the sketch's counters are halved every
+             10 x LOOKUP_CACHE_SIZE lookups, so it follows recent traffic
+
+A scan of one-off keys (a crawler walking product ids) only churns the
+window, never the hot entries in main.
+
+Writes through this process invalidate the keys they touch once they have
+committed, and a lookup that read the database before such an
+invalidation does not store what it read. Writes by other workers show up
+within LOOKUP_CACHE_TTL, except to the client that made them: while it
+reads from the primary (app/replication.py) it skips the cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from starlette.requests import Request
+from starlette.responses import Response
+
+from . import metrics, replication
+from .config import settings
+
+# (kind, key), e.g. ("product", 17), ("sku", "ABC-1"), ("inventory", 17)
+Key = Tuple[str, Hashable]
+KINDS = ("product", "sku", "inventory")
+
+# bytearray.translate table that halves every counter
+_HALVE = bytes(v >> 1 for v in range(256))
+# seconds an invalidation is remembered for lookups still in flight
+_INVALIDATION_MEMORY = 60
+
+
+class FrequencySketch:
+    """
+    Count-min sketch: 4 rows of 4-bit counters (one byte each) indexed by
+    double hashing of hash(key), halved every `sample_size` increments.
+    """
+
+    def __init__(self, capacity: int):
+        width = 16
+        while width < capacity * 2:
+            width *= 2
+        self._mask = width - 1
+        self._rows = [bytearray(width) for _ in range(4)]
+        self.sample_size = 10 * max(capacity, 1)
+        self.additions = 0
+
+    def _slots(self, key: Hashable):
+        h = hash(key)
+        step = (h >> 24) | 1
+        mask = self._mask
+        return h & mask, (h + step) & mask, (h + 2 * step) & mask, (h + 3 * step) & mask
+
+    def increment(self, key: Hashable):
+        for row, i in zip(self._rows, self._slots(key)):
+            if row[i] < 15:
+                row[i] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            for row in self._rows:
+                row[:] = row.translate(_HALVE)
+            self.additions //= 2
+
+    def estimate(self, key: Hashable) -> int:
+        return min(row[i] for row, i in zip(self._rows, self._slots(key)))
+
+
+class LookupCache:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.window_size = max(1, capacity // 100)
+        self.protected_size = max(1, (capacity - self.window_size) * 4 // 5)
+        self._window: "OrderedDict[Key, Tuple[Optional[bytes], float]]" = OrderedDict()
+        self._probation: "OrderedDict[Key, Tuple[Optional[bytes], float]]" = OrderedDict()
+        self._protected: "OrderedDict[Key, Tuple[Optional[bytes], float]]" = OrderedDict()
+        self._sketch = FrequencySketch(capacity)
+        self._lock = threading.Lock()
+        # bumped on every invalidation; key -> (version, monotonic time) of
+        # its latest one, and the version of the latest clear()
+        self.version = 0
+        self._invalidated: Dict[Key, Tuple[int, float]] = {}
+        self._cleared = 0
+        self._cleared_at = float("-inf")
+
+    # --- lookups ---
+
+    def get(self, key: Key) -> Tuple[bool, Optional[bytes]]:
+        """(found, body); a found None body is a cached miss."""
+        now = time.monotonic()
+        with self._lock:
+            self._sketch.increment(key)
+            for segment in (self._window, self._probation, self._protected):
+                entry = segment.get(key)
+                if entry is None:
+                    continue
+                if entry[1] <= now:
+                    del segment[key]
+                    break
+                if segment is self._probation:
+                    del segment[key]
+                    self._protect(key, entry)
+                else:
+                    segment.move_to_end(key)
+                lookups.inc((key[0], "hit"))
+                return True, entry[0]
+            lookups.inc((key[0], "miss"))
+            return False, None
+
+    def _protect(self, key: Key, entry):
+        self._protected[key] = entry
+        while len(self._protected) > self.protected_size:
+            demoted, value = self._protected.popitem(last=False)
+            self._probation[demoted] = value
+
+    def put(self, key: Key, body: Optional[bytes], version: int):
+        """
+        Cache `body` (None: the key does not exist) read at `version` --
+        unless the key was invalidated since, or recently enough that a
+        read replica may not have caught up yet.
+        """
+        now = time.monotonic()
+        ttl = settings.LOOKUP_CACHE_TTL if body is not None else settings.LOOKUP_CACHE_NEGATIVE_TTL
+        with self._lock:
+            invalidated, at = self._invalidated.get(key, (0, float("-inf")))
+            if max(invalidated, self._cleared) > version or (
+                settings.DATABASE_REPLICA_URLS
+                and now - max(at, self._cleared_at) < settings.READ_YOUR_WRITES_SECONDS
+            ):
+                return
+            entry = (body, now + ttl)
+            for segment in (self._probation, self._protected):
+                if key in segment:
+                    segment[key] = entry
+                    return
+            self._window[key] = entry
+            self._window.move_to_end(key)
+            if len(self._window) > self.window_size:
+                self._admit(*self._window.popitem(last=False))
+
+    def _admit(self, candidate: Key, entry):
+        """Move a key pushed out of the window into main, if it beats main's victim."""
+        if len(self._probation) + len(self._protected) < self.capacity - self.window_size:
+            self._probation[candidate] = entry
+            return
+        segment = self._probation or self._protected
+        victim = next(iter(segment))
+        if self._sketch.estimate(candidate) > self._sketch.estimate(victim):
+            del segment[victim]
+            self._probation[candidate] = entry
+        else:
+            victim = candidate
+        evictions.inc((victim[0],))
+
+    # --- invalidation ---
+
+    def invalidate(self, keys: Iterable[Key]):
+        now = time.monotonic()
+        with self._lock:
+            self.version += 1
+            for key in keys:
+                for segment in (self._window, self._probation, self._protected):
+                    segment.pop(key, None)
+                self._invalidated[key] = (self.version, now)
+            if len(self._invalidated) > self.capacity:
+                self._invalidated = {
+                    k: v for k, v in self._invalidated.items()
+                    if now - v[1] < _INVALIDATION_MEMORY
+                }
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._cleared, self._cleared_at = self.version, time.monotonic()
+            self._invalidated.clear()
+            for segment in (self._window, self._probation, self._protected):
+                segment.clear()
+
+    def __len__(self) -> int:
+        return len(self._window) + len(self._probation) + len(self._protected)
+
+    def segments(self) -> Dict[str, int]:
+        return {"window": len(self._window), "probation": len(self._probation),
+                "protected": len(self._protected)}
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "entries": len(self),
+            **self.segments(),
+            "kinds": {
+                kind: {
+                    "hits": lookups.value((kind, "hit")),
+                    "misses": lookups.value((kind, "miss")),
+                    "evictions": evictions.value((kind,)),
+                    "hit_ratio": hit_ratio(kind),
+                }
+                for kind in KINDS
+            },
+        }
+
+
+def hit_ratio(kind: str) -> float:
+    """Hits over lookups of `kind` since the process started."""
+    hits, misses = lookups.value((kind, "hit")), lookups.value((kind, "miss"))
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+async def cached_lookup(
+    request: Request,
+    key:     Key,
+    compute: Callable[[], Awaitable[object]],
+    encode:  Callable[[object], bytes],
+) -> Optional[Response]:
+    """
+    The JSON response for `key` from the cache, or from `compute()` (stored
+    encoded); None if the row does not exist. Responses carry
+    `X-Cache: HIT | MISS | BYPASS` (a client reading its own writes).
+    """
+    if cache is None:
+        found = await compute()
+        return None if found is None else Response(encode(found), media_type="application/json")
+    outcome = "BYPASS" if replication.wants_primary(request) else "MISS"
+    if outcome == "MISS":
+        hit, body = cache.get(key)
+        if hit:
+            if body is None:
+                return None
+            return Response(body, media_type="application/json", headers={"X-Cache": "HIT"})
+    version = cache.version
+    found = await compute()
+    body = None if found is None else encode(found)
+    cache.put(key, body, version)
+    if body is None:
+        return None
+    return Response(body, media_type="application/json", headers={"X-Cache": outcome})
+
+
+async def cached_lookups(
+    request: Request,
+    kind:    str,
+    ids:     List[Hashable],
+    compute: Callable[[List[Hashable]], Awaitable[Dict[Hashable, object]]],
+    encode:  Callable[[object], bytes],
+) -> Response:
+    """
+    cached_lookup for a list: a JSON array of the bodies for `ids` in order,
+    `null` where the row does not exist. Ids not in the cache are read with
+    one `compute(missing)` call returning the rows found by id, and stored.
+    """
+    bodies: Dict[Hashable, Optional[bytes]] = {}
+    bypass = cache is not None and replication.wants_primary(request)
+    if cache is not None and not bypass:
+        for i in dict.fromkeys(ids):
+            hit, body = cache.get((kind, i))
+            if hit:
+                bodies[i] = body
+    missing = [i for i in dict.fromkeys(ids) if i not in bodies]
+    if missing:
+        version = cache.version if cache is not None else 0
+        found = await compute(missing)
+        for i in missing:
+            bodies[i] = encode(found[i]) if i in found else None
+            if cache is not None:
+                cache.put((kind, i), bodies[i], version)
+    body = b"[" + b",".join(b"null" if bodies[i] is None else bodies[i] for i in ids) + b"]"
+    headers = {}
+    if cache is not None:
+        headers["X-Cache"] = "BYPASS" if bypass else "MISS" if missing else "HIT"
+    return Response(body, media_type="application/json", headers=headers)
+
+
+def _segments():
+    return cache.segments().items() if cache is not None else ()
+
+
+def invalidate(kind: str, keys: Iterable[Hashable]):
+    if cache is not None:
+        cache.invalidate((kind, k) for k in keys)
+
+
+def clear():
+    if cache is not None:
+        cache.clear()
+
+
+lookups = metrics.Counter(
+    "lookup_cache_lookups_total", "Single-row lookups by cache outcome.", ("kind", "result"))
+evictions = metrics.Counter(
+    "lookup_cache_evictions_total", "Entries evicted, or refused admission, to stay in size.",
+    ("kind",))
+
+cache = LookupCache(settings.LOOKUP_CACHE_SIZE) if settings.LOOKUP_CACHE_SIZE > 0 else None
+
+metrics.REGISTRY.extend([
+    lookups,
+    evictions,
+    metrics.Gauge("lookup_cache_hit_ratio", "Hits over lookups since the process started.",
+                  ("kind",), lambda: [((kind,), hit_ratio(kind)) for kind in KINDS]),
+    metrics.Gauge("lookup_cache_entries", "Entries in the lookup cache.", ("segment",),
+                  lambda: [((name,), n) for name, n in _segments()]),
+])
@@ -1,13 +1,39 @@
+import threading
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 
+from app import crud, database, metrics, replication
+from app.config import settings
+from app.database import SessionLocal
+
 # import the router objects from each module
 from app.routers.categories   import router as categories_router
 from app.routers.products     import router as products_router
 from app.routers.sales        import router as sales_router
 from app.routers.sale_items   import router as sale_items_router
 from app.routers.inventory    import router as inventory_router
+from app.routers.metrics      import router as metrics_router
+from app.routers.admin        import router as admin_router
+
 
-app = FastAPI(title="E-commerce Admin API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # builds the search index in the background (searches find nothing
+    # until it is done) and keeps it caught up
+    threading.Thread(
+        target=crud.products.maintain_search_index,
+        args=(SessionLocal, settings.PRODUCT_SEARCH_PRELOAD),
+        daemon=True,
+    ).start()
+    yield
+    # aiosqlite runs a non-daemon thread per open connection: without this
+    # the process outlives uvicorn's shutdown with ASYNC_DB=true
+    for engine in filter(None, [database.async_engine, *database.async_replica_engines]):
+        await engine.dispose()
+
+
+app = FastAPI(title="E-commerce Admin API", lifespan=lifespan)
 
 # wire up each router
 app.include_router(categories_router)
@@ -15,6 +41,13 @@ app.include_router(products_router)
 app.include_router(sales_router)
 app.include_router(sale_items_router)
 app.include_router(inventory_router)
+app.include_router(admin_router)
+
+if settings.DATABASE_REPLICA_URLS:
+    app.add_middleware(replication.ReadYourWritesMiddleware)
+if settings.REQUEST_METRICS:
+    app.add_middleware(metrics.MetricsMiddleware)
+    app.include_router(metrics_router)
 
 
 @app.get("/")
@@ -0,0 +1,230 @@
+"""
+Per-request SQL instrumentation and Prometheus metrics.
+
+Cursor events on every engine (see `instrument`) and the timed connection
+pool (app.pooling) add each statement's count, duration and rowcount, and
+each pool checkout's wait, to the RequestStats of the request being served;
+the stats live in a ContextVar, which Starlette's threadpool and
+AsyncSession.run_sync both carry into the CRUD code. MetricsMiddleware
+reports them in a `Server-Timing` response header and folds them into the
+per-route histograms served as Prometheus text at /metrics.
+
+Metrics are per process: scrape every worker. Rows are the driver's
+rowcount -- rows written, and rows returned where the driver buffers
+results (PyMySQL) -- SQLite reports none for SELECTs. For streamed
+responses the header is sent before the body, so it covers the work done
+up to the first byte; the histograms cover the whole response.
+"""
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+TIME_BUCKETS  = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100, 500)
+ROW_BUCKETS   = (0, 1, 10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+UNMATCHED = "<unmatched>"
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "rows", "pool_wait")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.pool_wait = 0.0
+
+    def server_timing(self, total: float) -> str:
+        return (
+            f'db;dur={self.db_time * 1000:.2f};desc="{self.statements} statements, {self.rows} rows", '
+            f"pool;dur={self.pool_wait * 1000:.2f}, "
+            f"app;dur={total * 1000:.2f}"
+        )
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.statements += 1
+    stats.db_time += time.perf_counter() - context._metrics_start
+    if cursor.rowcount > 0:
+        stats.rows += cursor.rowcount
+
+
+_LISTENERS = (
+    ("before_cursor_execute", _before_cursor_execute),
+    ("after_cursor_execute",  _after_cursor_execute),
+)
+
+
+def instrument(engine):
+    """Attribute `engine`'s statements to the current request (sync Engine)."""
+    for name, fn in _LISTENERS:
+        if not event.contains(engine, name, fn):
+            event.listen(engine, name, fn)
+
+
+def uninstrument(engine):
+    for name, fn in _LISTENERS:
+        if event.contains(engine, name, fn):
+            event.remove(engine, name, fn)
+
+
+def record_pool_wait(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, labels: Tuple[str, ...], value: float):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for values, (counts, total, n) in sorted(self._series.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+            sep = "," if labels else ""
+            running = 0
+            for bound, c in zip(self.buckets + ("+Inf",), counts):
+                running += c
+                out.append(f'{self.name}_bucket{{{labels}{sep}le="{bound}"}} {running}')
+            out.append(f"{self.name}_sum{{{labels}}} {total}")
+            out.append(f"{self.name}_count{{{labels}}} {n}")
+        return out
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, labels: Tuple[str, ...], amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, labels: Tuple[str, ...]) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for values, total in sorted(self._values.items()):
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+            out.append(f"{self.name}{{{labels}}} {total}")
+        return out
+
+
+class Gauge:
+    """Sampled at scrape time: `collect()` returns [(label values, value)]."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str],
+                 collect: Callable[[], Iterable[Tuple[Tuple[str, ...], float]]]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        out = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for values, value in self.collect():
+            labels = ",".join(f'{k}="{_escape(v)}"' for k, v in zip(self.labels, values))
+            out.append(f"{self.name}{{{labels}}} {value}")
+        return out
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+ROUTE = ("method", "route")
+requests_total = Counter(
+    "http_requests_total", "Requests served.", ROUTE + ("status",))
+request_seconds = Histogram(
+    "http_request_duration_seconds", "Time to serve a request.", ROUTE, TIME_BUCKETS)
+db_seconds = Histogram(
+    "db_time_seconds", "Time spent executing SQL per request.", ROUTE, TIME_BUCKETS)
+db_statements = Histogram(
+    "db_statements", "SQL statements executed per request.", ROUTE, COUNT_BUCKETS)
+db_rows = Histogram(
+    "db_rows", "Rows reported by the driver per request.", ROUTE, ROW_BUCKETS)
+pool_wait_seconds = Histogram(
+    "db_pool_wait_seconds", "Time spent waiting for pooled connections per request.",
+    ROUTE, TIME_BUCKETS)
+
+REGISTRY = [requests_total, request_seconds, db_seconds, db_statements, db_rows, pool_wait_seconds]
+
+
+def render() -> str:
+    return "\n".join(line for metric in REGISTRY for line in metric.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no extra task per request): opens a RequestStats
+    for each HTTP request, adds the Server-Timing header as the response
+    starts, and records the request under its route template once done.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                timing = stats.server_timing(time.perf_counter() - started)
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", ()), (b"server-timing", timing.encode())],
+                }
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            route = scope.get("route")
+            labels = (scope["method"], getattr(route, "path_format", None) or UNMATCHED)
+            requests_total.inc(labels + (str(status),))
+            request_seconds.observe(labels, time.perf_counter() - started)
+            db_seconds.observe(labels, stats.db_time)
+            db_statements.observe(labels, stats.statements)
+            db_rows.observe(labels, stats.rows)
+            pool_wait_seconds.observe(labels, stats.pool_wait)
@@ -1,8 +1,8 @@
 from sqlalchemy import (
-    Column, Integer, String, DECIMAL, DateTime,
+    Column, Integer, String, DECIMAL, Date, DateTime,
     ForeignKey, func, UniqueConstraint, Index
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import backref, relationship
 from .database import Base
 
 class Category(Base):
@@ -17,9 +17,27 @@ class Category(Base):
         onupdate=func.now()
     )
 
-    parent   = relationship("Category", remote_side=[id], backref="children")
+    # children never lazy-load: endpoints selectinload them to a bounded
+    # depth (see crud.categories.children_loader) and deeper levels read as []
+    parent   = relationship(
+        "Category", remote_side=[id], backref=backref("children", lazy="noload")
+    )
     products = relationship("Product", back_populates="category")
 
+class CategoryClosure(Base):
+    """
+    One row per (ancestor, descendant) pair, including each category with
+    itself at depth 0, so a whole subtree is one indexed lookup on
+    ancestor_id. Kept in step by crud.categories on every category write.
+    """
+    __tablename__ = "category_closure"
+    __table_args__ = (
+        Index("ix_category_closure_descendant", "descendant_id", "depth"),
+    )
+    ancestor_id   = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    depth         = Column(Integer, nullable=False)
+
 class Product(Base):
     __tablename__ = "products"
     __table_args__ = (
@@ -71,6 +89,27 @@ class SaleItem(Base):
 
     sale    = relationship("Sale",    back_populates="items")
     product = relationship("Product", back_populates="sale_items")
+
+class SalesDailyRollup(Base):
+    """Per-day sales totals, maintained by the sale write paths."""
+    __tablename__ = "sales_daily_rollup"
+    sale_day    = Column(Date, primary_key=True)
+    revenue     = Column(DECIMAL(14,2), nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+    units       = Column(Integer, nullable=False, default=0)
+
+class SalesCategoryDailyRollup(Base):
+    """Per-day, per-category line totals (revenue is SUM(line_total))."""
+    __tablename__ = "sales_category_daily_rollup"
+    __table_args__ = (
+        Index("ix_sales_category_daily_rollup_category", "category_id", "sale_day"),
+    )
+    sale_day    = Column(Date, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    revenue     = Column(DECIMAL(14,2), nullable=False, default=0)
+    order_count = Column(Integer, nullable=False, default=0)
+    units       = Column(Integer, nullable=False, default=0)
+
 class Inventory(Base):
     __tablename__ = "inventory"
 
@@ -86,8 +125,33 @@ class Inventory(Base):
         cascade="all, delete-orphan"
     )
 
+# Expression index so the "at or below threshold" predicate and the
+# shortfall ordering are answered from the index instead of a table scan.
+Index(
+    "ix_inventory_shortfall",
+    Inventory.reorder_threshold - Inventory.quantity_on_hand,
+    Inventory.product_id,
+)
+
+class InventoryLowStock(Base):
+    """
+    Products currently at or below their reorder threshold, kept in sync by
+    every inventory write. `shortfall` is reorder_threshold - quantity_on_hand.
+    """
+    __tablename__ = "inventory_low_stock"
+    __table_args__ = (
+        Index("ix_inventory_low_stock_shortfall", "shortfall", "product_id"),
+    )
+    product_id   = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    inventory_id = Column(Integer, ForeignKey("inventory.id"), nullable=False)
+    shortfall    = Column(Integer, nullable=False)
+
 class InventoryHistory(Base):
     __tablename__ = "inventory_history"
+    __table_args__ = (
+        Index("ix_inventory_history_changed", "changed_at", "id"),
+        Index("ix_inventory_history_product_changed", "product_id", "changed_at", "id"),
+    )
 
     id           = Column(Integer, primary_key=True, index=True)
     inventory_id = Column(Integer, ForeignKey("inventory.id"), nullable=False)
@@ -97,4 +161,18 @@ class InventoryHistory(Base):
     changed_at   = Column(DateTime(timezone=True), server_default=func.now())
 
     inventory = relationship("Inventory", back_populates="logs")
-    product   = relationship("Product",   back_populates="inventory_history")
\ No newline at end of file
+    product   = relationship("Product",   back_populates="inventory_history")
+
+class InventorySnapshot(Base):
+    """
+    Stock per product at `taken_at`: the SUM(change_qty) of its history
+    before then. Written by `manage.py snapshot-inventory`; point-in-time
+    reads replay history forward from the nearest one.
+    """
+    __tablename__ = "inventory_snapshots"
+    __table_args__ = (
+        Index("ix_inventory_snapshots_product", "product_id", "taken_at"),
+    )
+    taken_at         = Column(DateTime(timezone=True), primary_key=True)
+    product_id       = Column(Integer, ForeignKey("products.id"), primary_key=True)
+    quantity_on_hand = Column(Integer, nullable=False)
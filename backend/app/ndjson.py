@@ -0,0 +1,53 @@
+import zlib
+from typing import AsyncIterable, AsyncIterator, Tuple
+
+GZIP_MAGIC = b"\x1f\x8b"
+
+
+async def iter_lines(
+    chunks: AsyncIterable[bytes], gzip: bool = False
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Yield (line_number, line) from a streamed NDJSON body without buffering
+    more than one partial line. Gzip input is inflated on the fly -- either
+    when `gzip` is set (Content-Encoding) or when the stream starts with the
+    gzip magic bytes. Blank lines are skipped but still counted. Raises
+    ValueError if the gzip stream is corrupt or truncated.
+    """
+    inflater = None
+    pending = b""
+    lineno = 0
+    first = True
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if first:
+            first = False
+            if gzip or chunk.startswith(GZIP_MAGIC):
+                inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if inflater is not None:
+            try:
+                data = inflater.decompress(chunk)
+                # concatenated gzip members: start a fresh inflater on the rest
+                while inflater.eof and inflater.unused_data:
+                    rest = inflater.unused_data
+                    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                    data += inflater.decompress(rest)
+            except zlib.error as e:
+                raise ValueError(f"corrupt gzip body after line {lineno}: {e}") from None
+        else:
+            data = chunk
+        pending += data
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            lineno += 1
+            if line.strip():
+                yield lineno, line
+    if inflater is not None:
+        if not inflater.eof:
+            raise ValueError(f"truncated gzip body after line {lineno}")
+        pending += inflater.flush()
+    for line in pending.split(b"\n"):
+        lineno += 1
+        if line.strip():
+            yield lineno, line
@@ -0,0 +1,74 @@
+import base64
+import json
+import operator
+from datetime import datetime
+from typing import Any, Callable, Optional, Sequence, Tuple
+
+from sqlalchemy import DateTime, and_, or_
+
+# Opaque keyset cursors: the sort-key values of the last row on a page,
+# JSON-encoded and base64'd so clients treat them as a token.
+
+
+def encode_cursor(*values: Any) -> str:
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, *types: Callable[[Any], Any]) -> Tuple[Any, ...]:
+    """
+    Decode a cursor produced by `encode_cursor`, coercing each value with
+    the matching callable (e.g. `int`, `datetime.fromisoformat`).
+    Raises ValueError on anything malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("Invalid cursor")
+    try:
+        return tuple(t(v) for t, v in zip(types, values))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def _column_type(col) -> Callable[[Any], Any]:
+    return datetime.fromisoformat if isinstance(col.type, DateTime) else int
+
+
+def keyset(query, keys: Sequence, after: Optional[str] = None,
+           descending: bool = False):
+    """
+    Order `query` by the `keys` columns and, when `after` is given, restrict it
+    to rows strictly past that cursor. The WHERE clause is the expanded
+    lexicographic form plus a redundant range on the leading key, which is
+    what lets MySQL and SQLite turn it into an index range scan.
+    """
+    if after:
+        values = decode_cursor(after, *(_column_type(k) for k in keys))
+        cmp, bound = (operator.lt, operator.le) if descending else (operator.gt, operator.ge)
+        query = query.filter(bound(keys[0], values[0]), or_(*(
+            and_(*(keys[j] == values[j] for j in range(i)), cmp(keys[i], values[i]))
+            for i in range(len(keys))
+        )))
+    return query.order_by(*(k.desc() if descending else k for k in keys))
+
+
+def next_cursor(rows: list, limit: int, keys: Sequence) -> Optional[str]:
+    """Cursor for the page after `rows`, or None if this was the last page."""
+    if not rows or len(rows) < limit:
+        return None
+    last = rows[-1]
+    if isinstance(last, dict):
+        return encode_cursor(*(last[k.key] for k in keys))
+    return encode_cursor(*(getattr(last, k.key) for k in keys))
+
+
+def set_next_cursor(response, rows: list, limit: int, keys: Sequence):
+    """Expose the next-page cursor to the client as an X-Next-Cursor header."""
+    cursor = next_cursor(rows, limit, keys)
+    if cursor:
+        response.headers["X-Next-Cursor"] = cursor
@@ -0,0 +1,155 @@
+"""
+Connection pool configuration and observability.
+
+Every engine is built from `engine_options` and registered with `configure`,
+which gives it:
+
+- the DB_POOL_* sizing on the dialect's default pool class, subclassed so
+  each checkout's wait is timed (into the request's Server-Timing and the
+  db_pool_checkout_wait_seconds histogram) and timeouts are counted;
+- a pre-ping strategy: "always" (SQLAlchemy's pool_pre_ping, one round trip
+  per checkout), "idle" (ping only connections that sat in the pool for at
+  least DB_POOL_PING_IDLE seconds) or "never";
+- DB_SESSION_SETTINGS run on every new connection.
+
+`status()` reports each pool's occupancy for GET /admin/pool, and gauges of
+the same numbers are served at /metrics.
+"""
+import os
+import time
+from typing import Dict, List
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+
+from . import metrics
+from .config import settings
+
+PRE_PING_STRATEGIES = ("always", "idle", "never")
+
+# name -> Engine (sync side), in registration order
+_engines: Dict[str, object] = {}
+
+checkout_wait_seconds = metrics.Histogram(
+    "db_pool_checkout_wait_seconds", "Time to obtain a pooled connection.",
+    ("engine",), metrics.TIME_BUCKETS)
+checkout_timeouts = metrics.Counter(
+    "db_pool_checkout_timeouts_total", "Checkouts that gave up after DB_POOL_TIMEOUT.",
+    ("engine",))
+
+
+def _timed_pool(base, name: str):
+    """Subclass of pool class `base` that times every checkout."""
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return base._do_get(self)
+        except exc.TimeoutError:
+            checkout_timeouts.inc((name,))
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            checkout_wait_seconds.observe((name,), waited)
+            metrics.record_pool_wait(waited)
+
+    return type(f"Timed{base.__name__}", (base,), {"_do_get": _do_get})
+
+
+def engine_options(url: str, name: str, is_async: bool = False) -> dict:
+    """Keyword arguments for create_engine / create_async_engine."""
+    if settings.DB_POOL_PRE_PING not in PRE_PING_STRATEGIES:
+        raise ValueError(f"DB_POOL_PRE_PING must be one of {PRE_PING_STRATEGIES}")
+    u = make_url(url)
+    poolclass = _timed_pool(u.get_dialect(_is_async=is_async).get_pool_class(u), name)
+    options = {"poolclass": poolclass, "pool_pre_ping": settings.DB_POOL_PRE_PING == "always"}
+    if issubclass(poolclass, QueuePool):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+        )
+    return options
+
+
+def _session_settings() -> List[str]:
+    return [s.strip() for s in settings.DB_SESSION_SETTINGS.split(";") if s.strip()]
+
+
+def configure(engine, name: str):
+    """Attach session settings and idle pings to `engine` and register its pool."""
+    statements = _session_settings()
+    if statements:
+        @event.listens_for(engine, "connect")
+        def _apply_session_settings(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            try:
+                for statement in statements:
+                    cursor.execute(statement)
+            finally:
+                cursor.close()
+
+    if settings.DB_POOL_PRE_PING == "idle":
+        @event.listens_for(engine, "checkin")
+        def _stamp_checkin(dbapi_connection, connection_record):
+            connection_record.info["checked_in_at"] = time.monotonic()
+
+        @event.listens_for(engine, "checkout")
+        def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+            checked_in = connection_record.info.get("checked_in_at")
+            if checked_in is None or time.monotonic() - checked_in < settings.DB_POOL_PING_IDLE:
+                return
+            try:
+                cursor = dbapi_connection.cursor()
+                cursor.execute("SELECT 1")
+                cursor.close()
+            except Exception:
+                # the pool discards this connection and retries with a new one
+                raise exc.DisconnectionError("idle connection failed its ping")
+
+    _engines[name] = engine
+
+
+def status() -> dict:
+    """Occupancy and limits of every registered pool, for this process."""
+    pools = {}
+    for name, engine in _engines.items():
+        pool = engine.pool
+        entry = {"pool_class": type(pool).__bases__[0].__name__}
+        if isinstance(pool, QueuePool):
+            entry.update(
+                size=pool.size(),
+                checked_out=pool.checkedout(),
+                idle=pool.checkedin(),
+                # negative until the base size has been opened once
+                overflow=max(pool.overflow(), 0),
+                max_overflow=pool._max_overflow,
+                timeout=pool.timeout(),
+            )
+        entry["checkout_timeouts"] = checkout_timeouts.value((name,))
+        pools[name] = entry
+    return {
+        "pid": os.getpid(),
+        "pre_ping": settings.DB_POOL_PRE_PING,
+        "recycle": settings.DB_POOL_RECYCLE,
+        "pools": pools,
+    }
+
+
+def _gauge(key: str):
+    def collect():
+        return [((name,), entry[key]) for name, entry in status()["pools"].items() if key in entry]
+    return collect
+
+
+metrics.REGISTRY.extend([
+    checkout_wait_seconds,
+    checkout_timeouts,
+    metrics.Gauge("db_pool_size", "Configured base pool size.", ("engine",), _gauge("size")),
+    metrics.Gauge("db_pool_checked_out", "Connections currently checked out.",
+                  ("engine",), _gauge("checked_out")),
+    metrics.Gauge("db_pool_idle", "Connections idle in the pool.", ("engine",), _gauge("idle")),
+    metrics.Gauge("db_pool_overflow", "Connections open beyond the base size.",
+                  ("engine",), _gauge("overflow")),
+])
@@ -0,0 +1,396 @@
+"""
+In-memory search index over product name, sku and description.
+
+Text is lowercased and split into alphanumeric words. Every distinct word
+(term) gets an id and a postings array('i') of the products it occurs in,
+grouped by field -- sku, then name, then description, best-weighted first
+-- with each group's product ids ascending; its first two slots hold where
+the name and description groups begin. A term that occurs once (most SKU
+and model-number terms) keeps a bare `field << 29 | product_id` int
+instead. A forward index holds each product's `term_id << 2 | field`
+entries, for scoring a candidate against the other query words. Product
+ids double as document numbers.
+
+A query word matches terms as:
+
+  exact    the word is a term
+  prefix   the last query word (search-as-you-type), or any word with no
+           exact match, expands to the terms it begins: a bisect range of
+           the sorted vocabulary, i.e. the subtree of a prefix trie
+  fuzzy    a word with neither expands to the terms within edit distance
+           1 (2 for 8+ letters), found through a trigram index of the
+           alphabetic terms and verified with a bounded Levenshtein
+
+Every query word must match (AND). A product's score is the sum over the
+query words of its best match: idf x field weight x match quality.
+Candidates come from the rarest word's postings, highest-scoring (term,
+field) groups first, filtered through sets of the other words' products
+where those are at most SET_LIMIT (and SET_RATIO times the rarest word's)
+long, then scored through the forward index. The scan stops once the top
+`limit` cannot be beaten by the rest (or after `max_candidates` products,
+for very unselective queries).
+
+The index is built once and then only grows (see crud.products); searches
+run against it concurrently with add(), which records a product's
+category -- its "indexed" mark -- last. A search racing an add() into a
+middle field group may score one neighbouring product by the next field.
+"""
+import heapq
+import math
+import re
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from typing import Collection, Dict, Iterable, List, Optional, Tuple, Union
+
+# fields in postings order; an exact sku hit beats a name hit beats a
+# description hit
+SKU, NAME, DESCRIPTION = 0, 1, 2
+FIELD_WEIGHTS = (4.0, 3.0, 1.0)
+EXACT, PREFIX, FUZZY = 1.0, 0.6, 0.4
+# prefix matches expanded per query word (the most frequent terms among
+# the first PREFIX_SCAN in the range)
+PREFIX_TERMS = 64
+PREFIX_SCAN = 4096
+FUZZY_TERMS = 16
+# a query word matching at most this many postings is turned into a set
+# that filters the candidates before they are scored
+SET_LIMIT = 16384
+SET_RATIO = 32
+
+_SHIFT = 29
+# candidates are copied out of a postings array this many at a time
+_CHUNK = 1024
+_PRODUCT = (1 << _SHIFT) - 1
+_WORD = re.compile(r"[0-9a-z]+")
+Postings = Union[int, array]
+Weights = Tuple[float, float, float]
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    return _WORD.findall(text.lower()) if text else []
+
+
+def _fields(name: str, sku: str, description: Optional[str]) -> List[Tuple[int, set]]:
+    return [(SKU, set(tokenize(sku))), (NAME, set(tokenize(name))),
+            (DESCRIPTION, set(tokenize(description)))]
+
+
+def _trigrams(term: str) -> List[str]:
+    padded = f"${term}$"
+    return [padded[i:i + 3] for i in range(len(padded) - 2)]
+
+
+def _within(a: str, b: str, k: int) -> int:
+    """Levenshtein distance of a and b if it is at most k, else k + 1."""
+    if abs(len(a) - len(b)) > k:
+        return k + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > k:
+            return k + 1
+        previous = current
+    return previous[-1]
+
+
+def _groups(postings: Postings) -> List[Tuple[int, Union[array, tuple], int, int]]:
+    """(field, product ids, start, end) of each non-empty field group of `postings`."""
+    if isinstance(postings, int):
+        return [(postings >> _SHIFT, (postings & _PRODUCT,), 0, 1)]
+    bounds = (2, postings[0], postings[1], len(postings))
+    return [(field, postings, bounds[field], bounds[field + 1])
+            for field in range(3) if bounds[field] < bounds[field + 1]]
+
+
+class ProductIndex:
+    def __init__(self, max_candidates: int = 20000):
+        self.max_candidates = max_candidates
+        self.products = 0
+        self.max_id = 0
+        self._ids: Dict[str, int] = {}          # term -> term id
+        self._terms: List[str] = []             # term id -> term
+        self._postings: List[Postings] = []     # term id -> postings
+        self._forward = array("i")              # all products' term_id << 2 | field
+        self._starts = array("q")               # product id -> offset in _forward
+        self._lengths = array("H")              # product id -> entries in _forward
+        self._categories = array("i")           # product id -> category id (0: not indexed)
+        self._sorted: List[str] = []
+        self._grams: Dict[str, array] = {}
+
+    def __len__(self) -> int:
+        return self.products
+
+    # --- building ---
+
+    def _grow(self, product_id: int):
+        missing = product_id + 1 - len(self._categories)
+        if missing > 0:
+            self._starts.extend([0] * missing)
+            self._lengths.extend([0] * missing)
+            self._categories.extend([0] * missing)
+
+    def _term(self, term: str) -> int:
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            self._terms.append(term)
+            self._postings.append(None)
+            self._ids[term] = term_id
+        return term_id
+
+    def _post(self, term_id: int, field: int, product_id: int):
+        postings = self._postings[term_id]
+        if postings is None:
+            self._postings[term_id] = field << _SHIFT | product_id
+            return
+        if isinstance(postings, int):
+            single = postings
+            postings = array("i", [2, 2])
+            self._insert(postings, single >> _SHIFT, single & _PRODUCT)
+            self._insert(postings, field, product_id)
+            self._postings[term_id] = postings
+            return
+        self._insert(postings, field, product_id)
+
+    @staticmethod
+    def _insert(postings: array, field: int, product_id: int):
+        lo, hi = ((2, postings[0]), (postings[0], postings[1]), (postings[1], len(postings)))[field]
+        if hi == len(postings) and (lo == hi or postings[-1] < product_id):
+            postings.append(product_id)
+        else:
+            postings.insert(bisect_left(postings, product_id, lo, hi), product_id)
+        if field == SKU:
+            postings[0] += 1
+        if field != DESCRIPTION:
+            postings[1] += 1
+
+    def add(self, product_id: int, name: str, sku: str, description: Optional[str],
+            category_id: int) -> bool:
+        """Index one more product; False if it already is."""
+        self._grow(product_id)
+        if self._categories[product_id]:
+            return False
+        entries = []
+        for field, terms in _fields(name, sku, description):
+            for term in terms:
+                new = term not in self._ids
+                term_id = self._term(term)
+                if new:
+                    insort(self._sorted, term)
+                    self._index_trigrams(term_id, term)
+                entries.append((term_id, field))
+        self._starts[product_id] = len(self._forward)
+        self._forward.extend(t << 2 | f for t, f in entries)
+        self._lengths[product_id] = len(entries)
+        for term_id, field in entries:
+            self._post(term_id, field, product_id)
+        self._categories[product_id] = category_id
+        self.products += 1
+        self.max_id = max(self.max_id, product_id)
+        return True
+
+    def _index_trigrams(self, term_id: int, term: str):
+        if term.isalpha():
+            for gram in _trigrams(term):
+                self._grams.setdefault(gram, array("i")).append(term_id)
+
+    # --- searching ---
+
+    def _df(self, term_id: int) -> int:
+        postings = self._postings[term_id]
+        return len(postings) - 2 if isinstance(postings, array) else 1
+
+    def _first_field(self, term_id: int) -> int:
+        postings = self._postings[term_id]
+        if isinstance(postings, int):
+            return postings >> _SHIFT
+        return SKU if postings[0] > 2 else NAME if postings[1] > postings[0] else DESCRIPTION
+
+    def _prefixed(self, word: str) -> List[int]:
+        start = bisect_left(self._sorted, word)
+        found = []
+        for term in self._sorted[start:start + PREFIX_SCAN]:
+            if not term.startswith(word):
+                break
+            if term != word:
+                found.append(self._ids[term])
+        return heapq.nlargest(PREFIX_TERMS, found, key=self._df)
+
+    def _fuzzy(self, word: str) -> List[Tuple[int, int]]:
+        if len(word) < 4 or not word.isalpha():
+            return []
+        k = 1 if len(word) < 8 else 2
+        grams = _trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._grams.get(gram, ()))
+        # an edit changes at most 3 trigrams
+        need = len(grams) - 3 * k
+        found = []
+        for term_id, n in shared.items():
+            if n >= need:
+                d = _within(word, self._terms[term_id], k)
+                if d <= k:
+                    found.append((d, -self._df(term_id), term_id))
+        return [(term_id, d) for d, _, term_id in sorted(found)[:FUZZY_TERMS]]
+
+    def _weights(self, word: str, last: bool) -> Dict[int, Weights]:
+        """{term id: score per field} of the terms the query word matches."""
+        exact = self._ids.get(word)
+        variants = [(exact, EXACT)] if exact is not None else []
+        if last or not variants:
+            variants += [(t, PREFIX) for t in self._prefixed(word)]
+        if not variants:
+            variants = [(t, FUZZY / d) for t, d in self._fuzzy(word)]
+        n = max(self.products, 1)
+        return {
+            t: tuple(math.log(1 + n / self._df(t)) * q * w for w in FIELD_WEIGHTS)
+            for t, q in variants
+        }
+
+    def _members(self, weights: Dict[int, Weights]) -> set:
+        """The products any of the word's terms occur in."""
+        members = set()
+        for term_id in weights:
+            postings = self._postings[term_id]
+            if isinstance(postings, int):
+                members.add(postings & _PRODUCT)
+            else:
+                members.update(postings[2:])
+        return members
+
+    def _rest(self, product_id: int, others: Dict[int, list], words: int) -> Optional[float]:
+        """
+        The product's score for the other query words ({term id: [(word,
+        scores)]}); None unless it matches all `words` of them.
+        """
+        best = [0.0] * words
+        start = self._starts[product_id]
+        for entry in self._forward[start:start + self._lengths[product_id]]:
+            for j, scores in others.get(entry >> 2, ()):
+                if scores[entry & 3] > best[j]:
+                    best[j] = scores[entry & 3]
+        return None if 0.0 in best else sum(best)
+
+    def search(self, query: str, limit: int = 20,
+               categories: Optional[Collection[int]] = None) -> List[Tuple[int, float]]:
+        """
+        Up to `limit` (product_id, score), best first (ties by id), for the
+        products matching every word of `query` -- and, if given, in one of
+        `categories`.
+        """
+        words = list(dict.fromkeys(tokenize(query)))
+        per_word = []
+        for i, word in enumerate(words):
+            weights = self._weights(word, i == len(words) - 1)
+            if not weights:
+                return []
+            per_word.append((sum(self._df(t) for t in weights), weights))
+        if not per_word:
+            return []
+        per_word.sort(key=lambda w: w[0])
+        others: Dict[int, list] = {}
+        for j, (_, weights) in enumerate(per_word[1:]):
+            for term_id, scores in weights.items():
+                others.setdefault(term_id, []).append((j, scores))
+        # a set pays for itself when the rarest word is not much rarer
+        filters = [self._members(weights).__contains__
+                   for size, weights in per_word[1:]
+                   if size <= min(SET_LIMIT, per_word[0][0] * SET_RATIO)]
+        # the most any product can add through the other words: a term's
+        # best field is the first it occurs in
+        ceiling = sum(
+            max(scores[self._first_field(t)] for t, scores in weights.items())
+            for _, weights in per_word[1:]
+        )
+
+        groups = sorted(
+            ((scores[field], postings, start, end) for term_id, scores in per_word[0][1].items()
+             for field, postings, start, end in _groups(self._postings[term_id])),
+            key=lambda g: -g[0],
+        )
+        top: List[Tuple[float, int]] = []     # min-heap of (score, -product_id)
+        seen = set()
+        cats = self._categories
+        scanned = 0
+        for score, postings, start, end in groups:
+            for at in range(start, end, _CHUNK):
+                if len(top) == limit and top[0][0] >= score + ceiling:
+                    break
+                if scanned >= self.max_candidates:
+                    break
+                pids = postings[at:min(at + _CHUNK, end)]
+                scanned += len(pids)
+                candidates = iter(pids)
+                for keep in filters:
+                    candidates = filter(keep, candidates)
+                for pid in candidates:
+                    if pid in seen or not cats[pid]:
+                        continue
+                    seen.add(pid)
+                    if categories is not None and cats[pid] not in categories:
+                        continue
+                    total = score
+                    if others:
+                        rest = self._rest(pid, others, len(per_word) - 1)
+                        if rest is None:
+                            continue
+                        total += rest
+                    if len(top) < limit:
+                        heapq.heappush(top, (total, -pid))
+                    elif (total, -pid) > top[0]:
+                        heapq.heapreplace(top, (total, -pid))
+                    if len(top) == limit and top[0][0] >= score + ceiling:
+                        break
+        return [(-neg, total) for total, neg in sorted(top, reverse=True)]
+
+
+def build(rows: Iterable[Tuple[int, str, str, Optional[str], int]],
+          max_candidates: int = 20000) -> ProductIndex:
+    """
+    An index of (id, name, sku, description, category_id) rows. Postings
+    are collected in per-field lists and turned into arrays once at the
+    end, rather than through add().
+    """
+    index = ProductIndex(max_candidates)
+    lists: List[Tuple[list, list, list]] = []
+    term = index._term
+    forward = index._forward
+    for product_id, name, sku, description, category_id in rows:
+        index._grow(product_id)
+        if index._categories[product_id]:
+            continue
+        index._starts[product_id] = len(forward)
+        n = 0
+        for field, terms in _fields(name, sku, description):
+            for word in terms:
+                term_id = term(word)
+                if term_id == len(lists):
+                    lists.append(([], [], []))
+                lists[term_id][field].append(product_id)
+                forward.append(term_id << 2 | field)
+                n += 1
+        index._lengths[product_id] = n
+        index._categories[product_id] = category_id
+        index.products += 1
+        index.max_id = max(index.max_id, product_id)
+
+    postings = index._postings
+    for term_id, (sku, name, description) in enumerate(lists):
+        if len(sku) + len(name) + len(description) == 1:
+            field = SKU if sku else NAME if name else DESCRIPTION
+            postings[term_id] = field << _SHIFT | (sku or name or description)[0]
+            continue
+        name_at = 2 + len(sku)
+        p = array("i", [name_at, name_at + len(name)])
+        for pids in (sku, name, description):
+            pids.sort()
+            p.extend(pids)
+        postings[term_id] = p
+    index._sorted = sorted(index._ids)
+    for term_id, word in enumerate(index._terms):
+        index._index_trigrams(term_id, word)
+    return index
@@ -0,0 +1,64 @@
+"""
+Read-your-writes for replica routing.
+
+With DATABASE_REPLICA_URLS set, GET endpoints read from the replicas
+(app.database.get_read_db), which trail the primary by their replication
+lag. So that a client always sees its own writes, every successful write
+request is answered with a `primary_until` cookie holding the epoch second
+READ_YOUR_WRITES_SECONDS from now; until then that client's reads go to the
+primary. Other clients may see the write up to one lag later.
+"""
+import time
+from http.cookies import SimpleCookie
+
+from starlette.requests import Request
+
+from .config import settings
+
+COOKIE = "primary_until"
+
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+# POST endpoints that only read (an id list too long for a query string)
+READ_ONLY_PATHS = {"/products/lookup", "/inventory/lookup", "/sales/lookup"}
+
+
+def wants_primary(request: Request) -> bool:
+    """Whether `request` comes from a client that wrote within the window."""
+    try:
+        return float(request.cookies.get(COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _cookie() -> bytes:
+    ttl = settings.READ_YOUR_WRITES_SECONDS
+    morsel = SimpleCookie()
+    morsel[COOKIE] = str(int(time.time()) + ttl)
+    morsel[COOKIE].update({"max-age": ttl, "path": "/", "httponly": True, "samesite": "Lax"})
+    return morsel.output(header="").strip().encode("latin-1")
+
+
+class ReadYourWritesMiddleware:
+    """
+    Pure ASGI middleware: adds the `primary_until` cookie to the response of
+    every write request (not GET/HEAD/OPTIONS, nor a POST in READ_ONLY_PATHS)
+    that did not fail.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["method"] in READ_METHODS
+                or scope["path"] in READ_ONLY_PATHS):
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                message = {
+                    **message,
+                    "headers": [*message.get("headers", ()), (b"set-cookie", _cookie())],
+                }
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
@@ -3,4 +3,6 @@ from .categories   import router as categories
 from .products     import router as products
 from .sales        import router as sales
 from .sale_items   import router as sale_items
-from .inventory    import router as inventory
\ No newline at end of file
+from .inventory    import router as inventory
+from .metrics      import router as metrics
+from .admin        import router as admin
@@ -0,0 +1,19 @@
+from fastapi import APIRouter
+
+from app import lookup_cache, pooling
+
+router = APIRouter(prefix="/admin", tags=["admin"])
+
+
+@router.get("/pool")
+async def pool_status():
+    """Connection pool occupancy and limits for the worker serving the request."""
+    return pooling.status()
+
+
+@router.get("/lookup-cache")
+async def lookup_cache_status():
+    """Size, segment occupancy and per-kind hit ratios of this worker's lookup cache."""
+    if lookup_cache.cache is None:
+        return {"capacity": 0}
+    return lookup_cache.cache.stats()
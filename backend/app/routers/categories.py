@@ -1,20 +1,39 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import schemas, crud, database
+from fastapi import APIRouter, Depends, HTTPException, Response
+from typing import Optional
+from .. import schemas, crud, database, pagination
 
 router = APIRouter(prefix="/categories", tags=["Categories"])
 
 @router.post("/", response_model=schemas.Category)
-def create(cat: schemas.CategoryCreate, db: Session = Depends(database.get_db)):
-    return crud.categories.create_category(db, cat)
+async def create(cat: schemas.CategoryCreate, db: database.DB = Depends(database.get_async_db)):
+    try:
+        return await db.run(crud.categories.create_category, cat)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+@router.get("/tree", response_model=list[schemas.CategoryTreeNode])
+async def tree(root_id: Optional[int] = None, db: database.DB = Depends(database.get_async_db)):
+    """The whole hierarchy (or the subtree under `root_id`), served from memory."""
+    # not get_read_db: the snapshot is shared by every client until its TTL
+    # runs out, so it is loaded from the primary
+    t = await db.run(crud.categories.get_tree)
+    if root_id is not None and root_id not in t.nodes:
+        raise HTTPException(404, "Category not found")
+    return Response(t.to_json(root_id), media_type="application/json")
 
 @router.get("/", response_model=list[schemas.Category])
-def list_all(skip: int=0, limit: int=100, db: Session = Depends(database.get_db)):
-    return crud.categories.list_categories(db, skip, limit)
+async def list_all(response: Response, skip: int=0, limit: int=100, after: Optional[str]=None,
+                   db: database.DB = Depends(database.get_read_db)):
+    try:
+        rows = await db.run(crud.categories.list_categories, skip, limit, after)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    pagination.set_next_cursor(response, rows, limit, crud.categories.KEYSET)
+    return rows
 
 @router.get("/{cat_id}", response_model=schemas.Category)
-def get_one(cat_id: int, db: Session = Depends(database.get_db)):
-    c = crud.categories.get_category(db, cat_id)
+async def get_one(cat_id: int, db: database.DB = Depends(database.get_read_db)):
+    c = await db.run(crud.categories.get_category, cat_id)
     if not c:
         raise HTTPException(404, "Category not found")
     return c
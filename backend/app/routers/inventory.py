@@ -1,105 +1,282 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from datetime import date, datetime
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
 from typing import List, Optional
 
-from app import crud, schemas
-from app.database import get_db
+from app import crud, export, fast_read, lookup_cache, multi_get, pagination, schemas
+from app.config import settings
+from app.database import DB, get_async_db, get_read_db, read_engines
 
 router = APIRouter(prefix="/inventory", tags=["inventory"])
 
+_inventory_json = TypeAdapter(schemas.Inventory)
+
+
+def _encode(inv) -> bytes:
+    return _inventory_json.dump_json(_inventory_json.validate_python(inv, from_attributes=True))
+
+
+async def _by_product_ids(request: Request, product_ids: List[int], db: DB) -> Response:
+    return await lookup_cache.cached_lookups(
+        request, "inventory", product_ids,
+        lambda missing: db.run(crud.inventory.get_inventories, missing), _encode,
+    )
+
 
 @router.get("/", response_model=List[schemas.Inventory])
-def list_inventory(
-    skip:  int     = Query(0, ge=0),
-    limit: int     = Query(100, ge=1),
-    db:    Session = Depends(get_db),
+async def list_inventory(
+    response: Response,
+    skip:     int           = Query(0, ge=0),
+    limit:    int           = Query(100, ge=1),
+    after:    Optional[str] = Query(None),
+    db:       DB            = Depends(get_read_db),
 ):
     """
-    List inventory with pagination.
+    List inventory with pagination (offset via `skip`, or keyset via `after`).
     """
-    return crud.inventory.list_inventory(db, skip, limit)
+    fast = fast_read.enabled("inventory")
+    try:
+        rows = await db.run(
+            crud.inventory.list_inventory_rows if fast else crud.inventory.list_inventory,
+            skip, limit, after,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fast:
+        return fast_read.json_response(rows, limit, crud.inventory.KEYSET)
+    pagination.set_next_cursor(response, rows, limit, crud.inventory.KEYSET)
+    return rows
 
 
 @router.get("/low-stock", response_model=List[schemas.Inventory])
-def low_stock(
-    db: Session = Depends(get_db),
+async def low_stock(
+    response: Response,
+    after:    Optional[str] = Query(None),
+    limit:    int           = Query(100, ge=1, le=1000),
+    db:       DB            = Depends(get_read_db),
 ):
     """
-    Show only items at or below their reorder threshold.
+    Show only items at or below their reorder threshold, furthest below
+    first. Pass the X-Next-Cursor response header back as `after` to page.
     """
-    all_inv = crud.inventory.list_inventory(db)
-    return [
-        inv for inv in all_inv
-        if inv.quantity_on_hand <= inv.reorder_threshold
-    ]
+    try:
+        rows, next_cursor = await db.run(crud.inventory.list_low_stock, after, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return rows
 
 
 @router.get("/history", response_model=List[schemas.InventoryHistory])
-def full_history(
+async def full_history(
+    response:   Response,
     skip:       int           = Query(0, ge=0),
     limit:      int           = Query(100, ge=1),
+    after:      Optional[str] = Query(None),
     product_id: Optional[int] = Query(None),
-    db:          Session      = Depends(get_db),
+    db:          DB           = Depends(get_read_db),
 ):
     """
-    List all inventory-history entries, optionally filtered by product_id.
+    List all inventory-history entries, newest first, optionally filtered by
+    product_id. Pages reaching past the archive horizon continue into the
+    archived history.
     """
-    return crud.inventory_history.list_inventory_history(
-        db, product_id=product_id, skip=skip, limit=limit
+    try:
+        rows = await db.run(
+            crud.inventory_history.list_inventory_history,
+            product_id=product_id, skip=skip, limit=limit, after=after,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    pagination.set_next_cursor(response, rows, limit, crud.inventory_history.KEYSET)
+    return rows
+
+
+@router.get("/history/export")
+async def export_history(
+    request:      Request,
+    format:       str            = Query("csv", pattern="^(csv|ndjson)$"),
+    product_id:   Optional[int]  = Query(None),
+    inventory_id: Optional[int]  = Query(None),
+    start_date:   Optional[date] = Query(None),
+    end_date:     Optional[date] = Query(None),
+):
+    """
+    Every matching inventory-history entry, oldest first, streamed as CSV
+    or NDJSON through a server-side cursor -- memory stays flat however
+    many rows there are.
+    """
+    stmt = crud.inventory_history.export_inventory_history_query(
+        inventory_id, product_id, start_date, end_date
+    )
+    archived = crud.inventory_history.archived_history_rows(
+        inventory_id, product_id, start_date, end_date
     )
+    return export.stream_export(
+        stmt, format, "inventory_history", read_engines(request), before=archived
+    )
+
+
+@router.get("/as-of")
+async def stock_as_of(
+    request: Request,
+    ts:      datetime = Query(..., description="point in time (naive: DB_TIMEZONE)"),
+    format:  str      = Query("csv", pattern="^(csv|ndjson)$"),
+    db:      DB       = Depends(get_read_db),
+):
+    """
+    Every product's stock on hand as of `ts`, in product_id order, streamed
+    as CSV or NDJSON: the nearest inventory snapshot at or before `ts` plus
+    the history logged since. The snapshot used is in X-Snapshot-At.
+    """
+    taken_at, stmt, rows = await db.run(crud.inventory_snapshots.stock_as_of, ts)
+    response = export.stream_export(
+        stmt, format, "inventory_as_of", read_engines(request),
+        before=rows, columns=crud.inventory_snapshots.AS_OF_COLUMNS,
+    )
+    if taken_at is not None:
+        response.headers["X-Snapshot-At"] = taken_at.isoformat()
+    return response
+
+
+@router.get("/lookup", response_model=List[Optional[schemas.Inventory]])
+async def read_inventories(
+    request:     Request,
+    product_ids: List[str] = Query(...),
+    db:          DB        = Depends(get_read_db),
+):
+    """
+    The inventory of `product_ids` (repeated or comma-separated) in that
+    order, null where a product has none.
+    """
+    try:
+        wanted = multi_get.parse_ids(product_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _by_product_ids(request, wanted, db)
+
+
+@router.post("/lookup", response_model=List[Optional[schemas.Inventory]])
+async def lookup_inventory(
+    request:     Request,
+    product_ids: List[int] = Body(...),
+    db:          DB        = Depends(get_read_db),
+):
+    """GET /inventory/lookup for lists too long for a URL: a JSON array of product ids."""
+    try:
+        multi_get.check_ids(product_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _by_product_ids(request, product_ids, db)
+
+
+@router.post("/adjustments", response_model=schemas.InventoryAdjustmentReport)
+async def apply_adjustments(
+    lines:      List[schemas.InventoryAdjustmentLine],
+    batch_size: Optional[int] = Query(None, ge=1, le=10_000),
+    db:         DB            = Depends(get_async_db),
+):
+    """
+    Apply a receipt or cycle count: a list of `{product_id, delta |
+    absolute_qty, reason}` lines, in order, `batch_size` (default
+    INVENTORY_ADJUST_BATCH_SIZE) lines per transaction with set-based
+    statements; each batch commits on its own. Returns a result per line:
+    invalid lines are reported and skipped, the rest still apply.
+    """
+    size = batch_size or settings.INVENTORY_ADJUST_BATCH_SIZE
+    report = schemas.InventoryAdjustmentReport(received=len(lines), applied=0, failed=0)
+    for start in range(0, len(lines), size):
+        results = await db.run(crud.inventory.apply_adjustments, lines[start:start + size])
+        for i, result in enumerate(results, start):
+            report.results.append(schemas.InventoryAdjustmentResult(line=i, **result))
+    report.failed = sum(r.error is not None for r in report.results)
+    report.applied = report.received - report.failed
+    return report
 
 
 @router.get("/{product_id}", response_model=schemas.Inventory)
-def get_inventory_item(
+async def get_inventory_item(
+    request:    Request,
+    product_id: int,
+    db:          DB = Depends(get_read_db),
+):
+    """
+    Fetch the inventory row for a given product_id (from the hot-key lookup
+    cache when it can be).
+    """
+    resp = await lookup_cache.cached_lookup(
+        request, ("inventory", product_id),
+        lambda: db.run(crud.inventory.get_inventory, product_id), _encode,
+    )
+    if resp is None:
+        raise HTTPException(status_code=404, detail="Inventory not found")
+    return resp
+
+
+@router.get("/{product_id}/as-of", response_model=schemas.InventoryAsOf)
+async def inventory_item_as_of(
     product_id: int,
-    db:          Session = Depends(get_db),
+    ts:         datetime = Query(..., description="point in time (naive: DB_TIMEZONE)"),
+    db:         DB       = Depends(get_read_db),
 ):
     """
-    Fetch the inventory row for a given product_id.
+    A product's stock on hand as of `ts`, from the nearest inventory
+    snapshot at or before it plus the history logged since.
     """
-    inv = crud.inventory.get_inventory(db, product_id)
+    inv = await db.run(crud.inventory_snapshots.inventory_as_of, product_id, ts)
     if not inv:
         raise HTTPException(status_code=404, detail="Inventory not found")
     return inv
 
 
 @router.patch("/{product_id}", response_model=schemas.Inventory)
-def update_inventory_item(
+async def update_inventory_item(
     product_id: int,
     upd:        schemas.InventoryUpdate,
-    db:          Session = Depends(get_db),
+    db:          DB = Depends(get_async_db),
 ):
     """
-    Update stock levels (and automatically log the change).
+    Set stock levels (and automatically log the change). Omitted fields are
+    left unchanged; prefer `POST /{product_id}/adjust` for relative changes.
     """
-    new_qty = upd.quantity_on_hand or 0
-    new_rt  = upd.reorder_threshold or 0
-
-    inv = crud.inventory.update_inventory(db, product_id, new_qty, new_rt)
+    inv = await db.run(
+        crud.inventory.update_inventory, product_id, upd.quantity_on_hand, upd.reorder_threshold
+    )
     if not inv:
         raise HTTPException(status_code=404, detail="Inventory not found")
+    return inv
 
-    # Log the adjustment
-    change = new_qty - inv.quantity_on_hand
-    if change:
-        crud.inventory_history.record_inventory_change(
-            db,
-            inventory_id=inv.id,
-            product_id=product_id,
-            change_qty=change,
-            reason="Manual adjustment"
-        )
+
+@router.post("/{product_id}/adjust", response_model=schemas.InventoryAdjustment)
+async def adjust_inventory_item(
+    product_id: int,
+    adj:        schemas.InventoryAdjust,
+    db:          DB = Depends(get_async_db),
+):
+    """
+    Add `delta` to the stock on hand and log it, atomically: concurrent
+    adjustments all apply. 409 if the stock would go below zero.
+    """
+    try:
+        inv = await db.run(crud.inventory.adjust_inventory, product_id, adj.delta, adj.reason)
+    except crud.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not inv:
+        raise HTTPException(status_code=404, detail="Inventory not found")
     return inv
 
 
 @router.post("/{product_id}/history", response_model=schemas.InventoryHistory)
-def record_inventory_change(
+async def record_inventory_change(
     product_id: int,
     rec_in:     schemas.InventoryHistoryCreate,
-    db:          Session = Depends(get_db),
+    db:          DB = Depends(get_async_db),
 ):
     """
     Record a new inventory-history entry for this product.
     """
     rec = rec_in.copy(update={"product_id": product_id})
-    return crud.inventory_history.record_inventory_change(db, rec)
+    return await db.run(crud.inventory_history.record_inventory_change, **rec.dict())
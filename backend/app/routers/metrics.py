@@ -0,0 +1,11 @@
+from fastapi import APIRouter
+from starlette.responses import Response
+
+from app import metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
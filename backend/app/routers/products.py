@@ -1,20 +1,90 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from .. import schemas, crud, database
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter
+from typing import List, Optional
+from .. import schemas, crud, database, fast_read, lookup_cache, multi_get, pagination
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
+_product_json = TypeAdapter(schemas.Product)
+
+def _encode(product) -> bytes:
+    return _product_json.dump_json(_product_json.validate_python(product, from_attributes=True))
+
+async def _by_ids(request: Request, ids: List[int], db: database.DB) -> Response:
+    return await lookup_cache.cached_lookups(
+        request, "product", ids, lambda missing: db.run(crud.products.get_products, missing), _encode
+    )
+
 @router.post("/", response_model=schemas.Product)
-def create(prod: schemas.ProductCreate, db: Session = Depends(database.get_db)):
-    return crud.products.create_product(db, prod)
+async def create(prod: schemas.ProductCreate, db: database.DB = Depends(database.get_async_db)):
+    return await db.run(crud.products.create_product, prod)
 
 @router.get("/", response_model=list[schemas.Product])
-def list_all(skip: int=0, limit: int=100, db: Session = Depends(database.get_db)):
-    return crud.products.list_products(db, skip, limit)
+async def list_all(response: Response, skip: int=0, limit: int=100, after: Optional[str]=None,
+                   db: database.DB = Depends(database.get_read_db)):
+    fast = fast_read.enabled("products")
+    try:
+        rows = await db.run(
+            crud.products.list_products_rows if fast else crud.products.list_products,
+            skip, limit, after,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if fast:
+        return fast_read.json_response(rows, limit, crud.products.KEYSET)
+    pagination.set_next_cursor(response, rows, limit, crud.products.KEYSET)
+    return rows
+
+@router.get("/lookup", response_model=list[Optional[schemas.Product]])
+async def lookup_by_ids(request: Request, ids: List[str] = Query(...),
+                        db: database.DB = Depends(database.get_read_db)):
+    """
+    The products with `ids` (repeated or comma-separated) in that order,
+    null for unknown ids.
+    """
+    try:
+        wanted = multi_get.parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return await _by_ids(request, wanted, db)
+
+@router.post("/lookup", response_model=list[Optional[schemas.Product]])
+async def lookup(request: Request, ids: List[int] = Body(...),
+                 db: database.DB = Depends(database.get_read_db)):
+    """GET /products/lookup for lists too long for a URL: a JSON array of ids."""
+    try:
+        multi_get.check_ids(ids)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    return await _by_ids(request, ids, db)
+
+@router.get("/search", response_model=list[schemas.Product])
+async def search(q: str = Query(..., min_length=1, max_length=200),
+                 category_id: Optional[int] = None, include_descendants: bool = False,
+                 limit: int = Query(20, ge=1, le=100),
+                 db: database.DB = Depends(database.get_read_db)):
+    """
+    Products whose name, sku or description match every word of `q` (the
+    last word as a prefix, misspelt words approximately), best match first.
+    """
+    return await db.run(crud.products.search_products, q, category_id, include_descendants, limit)
+
+@router.get("/by-sku/{sku}", response_model=schemas.Product)
+async def get_by_sku(request: Request, sku: str, db: database.DB = Depends(database.get_read_db)):
+    """The product with this SKU, served from the hot-key lookup cache when it can be."""
+    resp = await lookup_cache.cached_lookup(
+        request, ("sku", sku), lambda: db.run(crud.products.get_product_by_sku, sku), _encode
+    )
+    if resp is None:
+        raise HTTPException(404, "Product not found")
+    return resp
 
 @router.get("/{prod_id}", response_model=schemas.Product)
-def get_one(prod_id: int, db: Session = Depends(database.get_db)):
-    p = crud.products.get_product(db, prod_id)
-    if not p:
+async def get_one(request: Request, prod_id: int,
+                  db: database.DB = Depends(database.get_read_db)):
+    resp = await lookup_cache.cached_lookup(
+        request, ("product", prod_id), lambda: db.run(crud.products.get_product, prod_id), _encode
+    )
+    if resp is None:
         raise HTTPException(404, "Product not found")
-    return p
+    return resp
@@ -1,16 +1,42 @@
-from fastapi import APIRouter, Depends
-from sqlalchemy.orm import Session
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from typing import Optional
-from .. import schemas, crud, database
+from .. import schemas, crud, database, export, fast_read, pagination
 
 router = APIRouter(prefix="/sale-items", tags=["SaleItems"])
 
 @router.get("/", response_model=list[schemas.SaleItem])
-def list_all(
+async def list_all(
+    response:   Response,
     product_id: Optional[int] = None,
     sale_id:    Optional[int] = None,
     skip:       int = 0,
     limit:      int = 100,
-    db:         Session = Depends(database.get_db)
+    after:      Optional[str] = None,
+    db:         database.DB = Depends(database.get_read_db)
 ):
-    return crud.sales_items.list_sale_items(db, product_id, sale_id, skip, limit)
+    fast = fast_read.enabled("sale_items")
+    try:
+        rows = await db.run(
+            crud.sales_items.list_sale_items_rows if fast else crud.sales_items.list_sale_items,
+            product_id, sale_id, skip, limit, after,
+        )
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    if fast:
+        return fast_read.json_response(rows, limit, crud.sales_items.KEYSET)
+    pagination.set_next_cursor(response, rows, limit, crud.sales_items.KEYSET)
+    return rows
+
+@router.get("/export")
+async def export_all(
+    request:    Request,
+    format:     str            = Query("csv", pattern="^(csv|ndjson)$"),
+    product_id: Optional[int]  = None,
+    sale_id:    Optional[int]  = None,
+    start_date: Optional[date] = None,
+    end_date:   Optional[date] = None,
+):
+    """Every matching sale item in id order, streamed as CSV or NDJSON."""
+    stmt = crud.sales_items.export_sale_items_query(product_id, sale_id, start_date, end_date)
+    return export.stream_export(stmt, format, "sale_items", database.read_engines(request))
@@ -1,50 +1,197 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, Request, Response
+from pydantic import TypeAdapter, ValidationError
 from datetime import date
 from typing import List, Optional
 
-from app import crud, schemas
-from app.database import get_db
+from app import analytics_cache, crud, export, fast_read, multi_get, ndjson, pagination, schemas
+from app.config import settings
+from app.database import DB, get_async_db, get_read_db, read_engines
 
 router = APIRouter(prefix="/sales", tags=["sales"])
 
+# analytics responses are cached as encoded JSON
+_revenue_json    = TypeAdapter(List[schemas.RevenueResponse])
+_comparison_json = TypeAdapter(schemas.SalesComparison)
+
+
+async def _sales_page(response: Response, limit: int, db: DB, **filters):
+    fast = fast_read.enabled("sales")
+    try:
+        rows = await db.run(
+            crud.sales.get_sales_rows if fast else crud.sales.get_sales, limit=limit, **filters
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if fast:
+        return fast_read.json_response(rows, limit, crud.sales.KEYSET)
+    pagination.set_next_cursor(response, rows, limit, crud.sales.KEYSET)
+    return rows
+
+
+async def _sales_by_ids(ids: List[int], db: DB):
+    found = await db.run(crud.sales.get_sales_by_ids, ids)
+    return [found.get(i) for i in ids]
+
 
 # 1. Create a new sale (with items)
 @router.post("/", response_model=schemas.Sale)
-def create_sale(
+async def create_sale(
     sale_in: schemas.SaleCreate,
-    db: Session = Depends(get_db),
+    db: DB = Depends(get_async_db),
 ):
-    return crud.sales.create_sale(db, sale_in)
+    try:
+        return await db.run(crud.sales.create_sale, sale_in)
+    except crud.InsufficientStockError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+# 1b. Bulk-ingest sales from a streamed NDJSON body
+@router.post("/bulk", response_model=schemas.BulkSaleReport)
+async def bulk_create_sales(
+    request:    Request,
+    batch_size: Optional[int] = Query(None, ge=1, le=50_000),
+    db:         DB            = Depends(get_async_db),
+):
+    """
+    Import sales from an NDJSON body (one `SaleCreate` object per line,
+    optionally gzip-compressed), inserting them in batches as the body
+    streams in. Stock is not touched. Returns a per-line error report.
+    """
+    size = batch_size or settings.BULK_SALES_BATCH_SIZE
+    report = schemas.BulkSaleReport(received=0, inserted=0, failed=0)
+    batch, batch_lines = [], []
+
+    async def flush():
+        results = await db.run(crud.sales.create_sales_bulk, batch)
+        for lineno, error in zip(batch_lines, results):
+            if error is None:
+                report.inserted += 1
+            else:
+                report.errors.append(schemas.BulkLineError(line=lineno, error=error))
+        batch.clear()
+        batch_lines.clear()
+
+    gzipped = request.headers.get("content-encoding", "").lower() == "gzip"
+    try:
+        async for lineno, raw in ndjson.iter_lines(request.stream(), gzip=gzipped):
+            report.received += 1
+            try:
+                batch.append(schemas.SaleCreate.model_validate_json(raw))
+                batch_lines.append(lineno)
+            except ValidationError as e:
+                report.errors.append(schemas.BulkLineError(line=lineno, error="; ".join(
+                    f"{'.'.join(map(str, err['loc'])) or 'line'}: {err['msg']}"
+                    for err in e.errors()
+                )))
+            if len(batch) >= size:
+                await flush()
+    except ValueError as e:
+        # an unreadable body; batches before it stay committed
+        raise HTTPException(
+            status_code=400, detail=f"{e} ({report.inserted} sales before it were inserted)"
+        )
+    if batch:
+        await flush()
+
+    report.failed = len(report.errors)
+    return report
 
 
 # 2. Revenue summary over a period
 @router.get("/stats", response_model=List[schemas.RevenueResponse])
-def read_revenue_stats(
-    period:     str            = Query(..., regex="^(daily|weekly|monthly|yearly)$"),
+async def read_revenue_stats(
+    request:    Request,
+    period:     str            = Query(..., pattern="^(hourly|daily|weekly|monthly|quarterly|yearly)$"),
     start_date: Optional[date] = Query(None),
     end_date:   Optional[date] = Query(None),
-    db:         Session        = Depends(get_db),
+    tz:         str            = Query("UTC", description="IANA zone the buckets and dates are in"),
+    category_id: Optional[int] = Query(None),
+    include_descendants: bool  = Query(False, description="With category_id, include its subcategories"),
+    db:         DB             = Depends(get_read_db),
 ):
+    """
+    Revenue and order count per period, in `tz`, for local days
+    start_date..end_date inclusive. Empty periods are returned as zeros.
+    With `category_id`, revenue is the sum of that category's line totals.
+    """
+    key = analytics_cache.cache_key(
+        "stats", period=period, start_date=start_date, end_date=end_date, tz=tz,
+        category_id=category_id, include_descendants=include_descendants,
+    )
     try:
-        return crud.sales.get_revenue_summary(db, period, start_date, end_date)
+        return await analytics_cache.cached_json(
+            request, key,
+            compute=lambda: db.run(
+                crud.sales.get_revenue_summary, period, start_date, end_date, tz,
+                category_id, include_descendants,
+            ),
+            encode=_revenue_json.dump_json,
+            ranges=lambda: [crud.buckets.db_range(start_date, end_date, tz)],
+        )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-# 3. Compare two date-ranges
+# 3. Compare any number of date-ranges
 @router.get("/compare", response_model=schemas.SalesComparison)
-def compare_sales(
-    p1_start:    date           = Query(..., alias="p1_start"),
-    p1_end:      date           = Query(..., alias="p1_end"),
-    p2_start:    date           = Query(..., alias="p2_start"),
-    p2_end:      date           = Query(..., alias="p2_end"),
+async def compare_sales(
+    request:     Request,
+    period:      List[str]      = Query(..., description="Repeatable START/END, e.g. 2024-01-01/2024-01-07 (inclusive)"),
+    category_id: List[int]      = Query([], description="Repeatable; one matrix row per category"),
+    include_descendants: bool   = Query(False, description="Each row covers the category's whole subtree"),
+    db:           DB            = Depends(get_read_db),
+):
+    """
+    Revenue (line totals), orders and units for each period, per category
+    when category ids are given, with the change from the previous period.
+    """
+    try:
+        periods = [crud.sales.parse_period(p) for p in period]
+        key = analytics_cache.cache_key(
+            "compare", periods=periods, category_ids=category_id,
+            include_descendants=include_descendants,
+        )
+        return await analytics_cache.cached_json(
+            request, key,
+            compute=lambda: db.run(
+                crud.sales.compare_periods, periods, category_id, include_descendants
+            ),
+            encode=_comparison_json.dump_json,
+            ranges=lambda: [
+                crud.buckets.db_range(start, end, settings.DB_TIMEZONE) for start, end in periods
+            ],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# 3b. Analytics cache counters
+@router.get("/cache")
+async def analytics_cache_stats():
+    """Backend, entry count and this process's hit/miss/eviction counters."""
+    return analytics_cache.cache.stats()
+
+
+# 3c. Stream every matching sale as CSV / NDJSON
+@router.get("/export")
+async def export_sales(
+    request:     Request,
+    format:      str            = Query("csv", pattern="^(csv|ndjson)$"),
+    start_date:  Optional[date] = Query(None),
+    end_date:    Optional[date] = Query(None),
+    product_id:  Optional[int]  = Query(None),
     category_id: Optional[int]  = Query(None),
-    db:           Session       = Depends(get_db),
+    include_descendants: bool   = Query(False),
 ):
-    return crud.sales.compare_periods(
-        db, p1_start, p1_end, p2_start, p2_end, category_id
+    """
+    All sales matching the same filters as `GET /sales/`, oldest first,
+    streamed through a server-side cursor. Line items are exported by
+    `/sale-items/export`.
+    """
+    stmt = crud.sales.export_sales_query(
+        start_date, end_date, product_id, category_id, include_descendants
     )
+    return export.stream_export(stmt, format, "sales", read_engines(request))
 
 
 # 4. Sales by product
@@ -53,22 +200,26 @@ def compare_sales(
     response_model=List[schemas.Sale],
     summary="List all sales containing a given product",
 )
-def sales_by_product(
+async def sales_by_product(
+    response:    Response,
     product_id:  int,
     start_date:  Optional[date] = Query(None),
     end_date:    Optional[date] = Query(None),
     skip:        int            = Query(0, ge=0),
     limit:       int            = Query(100, ge=1),
-    db:           Session       = Depends(get_db),
+    after:       Optional[str]  = Query(None),
+    db:           DB            = Depends(get_read_db),
 ):
-    return crud.sales.get_sales(
+    return await _sales_page(
+        response,
+        limit,
         db,
         start_date=start_date,
         end_date=end_date,
         product_id=product_id,
         category_id=None,
         skip=skip,
-        limit=limit,
+        after=after,
     )
 
 
@@ -78,54 +229,90 @@ def sales_by_product(
     response_model=List[schemas.Sale],
     summary="List all sales for a given category",
 )
-def sales_by_category(
+async def sales_by_category(
+    response:    Response,
     category_id: int,
     start_date:  Optional[date] = Query(None),
     end_date:    Optional[date] = Query(None),
+    include_descendants: bool   = Query(False, description="Also match products in subcategories"),
     skip:        int            = Query(0, ge=0),
     limit:       int            = Query(100, ge=1),
-    db:           Session       = Depends(get_db),
+    after:       Optional[str]  = Query(None),
+    db:           DB            = Depends(get_read_db),
 ):
-    return crud.sales.get_sales(
+    return await _sales_page(
+        response,
+        limit,
         db,
         start_date=start_date,
         end_date=end_date,
         product_id=None,
         category_id=category_id,
+        include_descendants=include_descendants,
         skip=skip,
-        limit=limit,
+        after=after,
     )
 
 
 # 6. List & filter raw sales
 @router.get("/", response_model=List[schemas.Sale])
-def list_sales(
+async def list_sales(
+    response:    Response,
     start_date:  Optional[date] = Query(None),
     end_date:    Optional[date] = Query(None),
     product_id:  Optional[int]  = Query(None),
     category_id: Optional[int]  = Query(None),
     skip:        int            = Query(0, ge=0),
     limit:       int            = Query(100, ge=1),
-    db:           Session       = Depends(get_db),
+    after:       Optional[str]  = Query(None),
+    db:           DB            = Depends(get_read_db),
 ):
-    return crud.sales.get_sales(
+    return await _sales_page(
+        response,
+        limit,
         db,
         start_date=start_date,
         end_date=end_date,
         product_id=product_id,
         category_id=category_id,
         skip=skip,
-        limit=limit,
+        after=after,
     )
 
 
+# 6b. Fetch many sales by id, in request order (null for unknown ids)
+@router.get("/lookup", response_model=List[Optional[schemas.Sale]])
+async def read_sales_by_ids(
+    ids: List[str] = Query(..., description="Repeated and/or comma-separated"),
+    db:  DB        = Depends(get_read_db),
+):
+    try:
+        wanted = multi_get.parse_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _sales_by_ids(wanted, db)
+
+
+# 6c. The same for lists too long for a URL
+@router.post("/lookup", response_model=List[Optional[schemas.Sale]])
+async def lookup_sales(
+    ids: List[int] = Body(...),
+    db:  DB        = Depends(get_read_db),
+):
+    try:
+        multi_get.check_ids(ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return await _sales_by_ids(ids, db)
+
+
 # 7. Fetch one sale by ID (must come last)
 @router.get("/{sale_id}", response_model=schemas.Sale)
-def get_one_sale(
+async def get_one_sale(
     sale_id: int,
-    db:      Session = Depends(get_db),
+    db:      DB = Depends(get_read_db),
 ):
-    s = crud.sales.get_sale(db, sale_id)
+    s = await db.run(crud.sales.get_sale, sale_id)
     if not s:
         raise HTTPException(status_code=404, detail="Sale not found")
     return s
@@ -23,6 +23,14 @@ class Category(CategoryBase):
 
 Category.update_forward_refs()
 
+class CategoryTreeNode(BaseModel):
+    id: int
+    name: str
+    parent_id: Optional[int] = None
+    children: List["CategoryTreeNode"] = []
+
+CategoryTreeNode.update_forward_refs()
+
 # --- Products ---
 class ProductBase(BaseModel):
     name: str
@@ -110,10 +118,24 @@ class Config:
     model_config = ConfigDict(from_attributes=True)
 
 
+# -- for /sales/bulk --
+class BulkLineError(BaseModel):
+    line:  int
+    error: str
+
+class BulkSaleReport(BaseModel):
+    received: int
+    inserted: int
+    failed:   int
+    errors:   List[BulkLineError] = []
+
+
 # ——— Sales analytics response ———
 class RevenueResponse(BaseModel):
-    period: str
+    period: str                  # bucket start: date, or ISO datetime for hourly
     total_amount: float
+    bucket_start: Optional[datetime] = None
+    orders: int = 0
 
     class Config:
         model_config = ConfigDict(from_attributes=True)
@@ -126,20 +148,71 @@ class InventoryUpdate(BaseModel):
     class Config:
         model_config = ConfigDict(from_attributes=True)
 
+class InventoryAdjust(BaseModel):
+    delta:  int                  # added to quantity_on_hand; negative to remove stock
+    reason: str = "Manual adjustment"
+
+class InventoryAdjustment(Inventory):
+    change_qty: int
+    history_id: int
+
+# -- for POST /inventory/adjustments --
+class InventoryAdjustmentLine(BaseModel):
+    product_id:   int
+    # exactly one of: a change to add, or the counted quantity to set
+    delta:        Optional[int] = None
+    absolute_qty: Optional[int] = None
+    reason:       str = "Manual adjustment"
+
+class InventoryAdjustmentResult(BaseModel):
+    line:             int
+    product_id:       int
+    change_qty:       int
+    quantity_on_hand: Optional[int] = None   # after this line; None if no inventory row
+    error:            Optional[str] = None
+
+class InventoryAdjustmentReport(BaseModel):
+    received: int
+    applied:  int
+    failed:   int
+    results:  List[InventoryAdjustmentResult] = []
+
+# -- for GET /inventory/{product_id}/as-of --
+class InventoryAsOf(BaseModel):
+    product_id:       int
+    as_of:            datetime
+    quantity_on_hand: int
+    snapshot_at:      Optional[datetime] = None   # snapshot replayed from; None: all history
+
 # -- for /sales/compare --
-class PeriodRevenue(BaseModel):
+class ComparePeriod(BaseModel):
     start:   str
     end:     str
-    revenue: float
+
+    class Config:
+        model_config = ConfigDict(from_attributes=True)
+
+class PeriodCell(BaseModel):
+    revenue:        float
+    orders:         int
+    units:          int
+    # against the previous period in the request; None for the first
+    difference:     Optional[float] = None
+    percent_change: Optional[float] = None
+
+    class Config:
+        model_config = ConfigDict(from_attributes=True)
+
+class ComparisonRow(BaseModel):
+    category_id: Optional[int]          # None: all categories
+    cells:       List[PeriodCell]       # one per period, in request order
 
     class Config:
         model_config = ConfigDict(from_attributes=True)
 
 class SalesComparison(BaseModel):
-    period1:        PeriodRevenue
-    period2:        PeriodRevenue
-    difference:     float
-    percent_change: Optional[float]
+    periods: List[ComparePeriod]
+    rows:    List[ComparisonRow]
 
     class Config:
-        model_config = ConfigDict(from_attributes=True)
\ No newline at end of file
+        model_config = ConfigDict(from_attributes=True)
@@ -0,0 +1,139 @@
+"""
+Shared setup for the benchmark scripts. Import this before anything from
+`app`: it points DATABASE_URL at a throwaway SQLite file so the app's
+engines bind to it.
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+from typing import Sequence
+
+DB_PATH = os.path.join(tempfile.mkdtemp(prefix="ecom-bench-"), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+
+from app import crud, models                         # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+
+
+def _category_tree(db):
+    """5 departments x 4 x 3: returns the 60 leaf categories."""
+    parents = [models.Category(name=f"Dept {i}") for i in range(5)]
+    db.add_all(parents)
+    db.flush()
+    leaves = []
+    for p in parents:
+        mids = [models.Category(name=f"{p.name}/{j}", parent_id=p.id) for j in range(4)]
+        db.add_all(mids)
+        db.flush()
+        for m in mids:
+            kids = [models.Category(name=f"{m.name}/{k}", parent_id=m.id) for k in range(3)]
+            db.add_all(kids)
+            db.flush()
+            leaves.extend(kids)
+    return leaves
+
+
+def _rebuild_derived(db):
+    crud.inventory.rebuild_low_stock(db)
+    crud.rollups.rebuild_rollups(db)
+    crud.categories.rebuild_closure(db)
+
+
+def seed_catalog(products: int = 300, sales: int = 200, items_per_sale: int = 3):
+    """Three-level category tree, products with inventory and history, sales."""
+    Base.metadata.create_all(engine)
+    db = SessionLocal()
+    leaves = _category_tree(db)
+    prods = [
+        models.Product(name=f"Product {i}", sku=f"SKU-{i}", price=10,
+                       category_id=leaves[i % len(leaves)].id)
+        for i in range(products)
+    ]
+    db.add_all(prods)
+    db.flush()
+    db.add_all([
+        models.Inventory(product_id=p.id, quantity_on_hand=i % 20, reorder_threshold=10)
+        for i, p in enumerate(prods)
+    ])
+    db.flush()
+    start = datetime(2025, 1, 1)
+    for i in range(sales):
+        sale = models.Sale(sale_date=start + timedelta(hours=i),
+                           total_amount=10 * items_per_sale)
+        db.add(sale)
+        db.flush()
+        db.add_all([
+            models.SaleItem(sale_id=sale.id, product_id=prods[(i + j) % products].id,
+                            quantity=1, unit_price=10, line_total=10)
+            for j in range(items_per_sale)
+        ])
+    for p in prods:
+        db.add(models.InventoryHistory(inventory_id=p.id, product_id=p.id,
+                                       change_qty=1, reason="seed"))
+    db.commit()
+    _rebuild_derived(db)
+    db.close()
+
+
+SEED_START = datetime(2024, 1, 1)
+SEED_SPAN = timedelta(days=730)
+
+
+def seed_scale(sales: int, items_per_sale: int = 2, batch: int = 50_000):
+    """
+    A catalog sized for `sales` rows, bulk-loaded with Core executemany:
+    max(200, sales / 200) products (every 50th with effectively unlimited
+    stock, the rest cycling through low levels), `sales` sales spread evenly
+    over SEED_SPAN from SEED_START with `items_per_sale` lines each, and one
+    inventory-history row per sale.
+    """
+    Base.metadata.create_all(engine)
+    with engine.begin() as conn:
+        # InnoDB indexes every foreign key implicitly; SQLite does not, and
+        # without it each sale -> items lookup is a full scan
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_bench_sale_items_sale_id ON sale_items (sale_id)"
+        )
+    db = SessionLocal()
+    leaves = [c.id for c in _category_tree(db)]
+    db.commit()  # release SQLite's write lock before the bulk load
+    n_products = max(200, sales // 200)
+    step = SEED_SPAN / max(sales, 1)
+    prod_t, inv_t = models.Product.__table__, models.Inventory.__table__
+    sale_t, item_t = models.Sale.__table__, models.SaleItem.__table__
+    hist_t = models.InventoryHistory.__table__
+    with engine.begin() as conn:
+        conn.execute(prod_t.insert(), [
+            {"id": i, "name": f"Product {i}", "sku": f"SKU-{i}", "price": 10,
+             "category_id": leaves[i % len(leaves)]}
+            for i in range(1, n_products + 1)
+        ])
+        conn.execute(inv_t.insert(), [
+            {"id": i, "product_id": i, "reorder_threshold": 10,
+             "quantity_on_hand": 10**9 if i % 50 == 1 else i % 20}
+            for i in range(1, n_products + 1)
+        ])
+        for lo in range(1, sales + 1, batch):
+            ids = range(lo, min(lo + batch, sales + 1))
+            conn.execute(sale_t.insert(), [
+                {"id": i, "sale_date": SEED_START + step * i, "total_amount": 10 * items_per_sale}
+                for i in ids
+            ])
+            conn.execute(item_t.insert(), [
+                {"sale_id": i, "product_id": (i * 7 + j) % n_products + 1,
+                 "quantity": 1, "unit_price": 10, "line_total": 10}
+                for i in ids for j in range(items_per_sale)
+            ])
+            conn.execute(hist_t.insert(), [
+                {"inventory_id": i % n_products + 1, "product_id": i % n_products + 1,
+                 "change_qty": -1, "reason": f"Sale #{i}", "changed_at": SEED_START + step * i}
+                for i in ids
+            ])
+    _rebuild_derived(db)
+    db.close()
+    return n_products
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
@@ -0,0 +1,63 @@
+"""
+Compare two `benchmarks.suite` result files and flag regressions.
+
+A case regresses when its p95 latency grows, or its throughput drops, by
+more than --threshold (a fraction, default 0.10), or when it issues more SQL
+statements per call than before. Exits 1 if anything regressed.
+
+    python -m benchmarks.compare bench-old.json bench-new.json [--threshold 0.10]
+"""
+import argparse
+import json
+import sys
+
+
+def load(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def regressions(old: dict, new: dict, threshold: float):
+    """Yield (case, reasons) for every case present in both runs."""
+    for name, before in old["cases"].items():
+        after = new["cases"].get(name)
+        if after is None:
+            continue
+        reasons = []
+        if after["p95_ms"] > before["p95_ms"] * (1 + threshold):
+            reasons.append(f"p95 {before['p95_ms']:.2f} -> {after['p95_ms']:.2f} ms")
+        if after["throughput"] < before["throughput"] * (1 - threshold):
+            reasons.append(f"throughput {before['throughput']:.1f} -> {after['throughput']:.1f}/s")
+        if after["statements"] > before["statements"]:
+            reasons.append(f"statements {before['statements']:.1f} -> {after['statements']:.1f}")
+        yield name, reasons
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.10)
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    for key in ("scale", "async_db"):
+        if old["meta"].get(key) != new["meta"].get(key):
+            print(f"warning: {key} differs ({old['meta'].get(key)} vs {new['meta'].get(key)})")
+    print(f"{old['meta'].get('git')} -> {new['meta'].get('git')}, threshold {args.threshold:.0%}")
+
+    failed = 0
+    for name, reasons in regressions(old, new, args.threshold):
+        if reasons:
+            failed += 1
+            print(f"REGRESSED {name}: {'; '.join(reasons)}")
+    for label, a, b in (("old", old, new), ("new", new, old)):
+        missing = set(a["cases"]) - set(b["cases"])
+        if missing:
+            print(f"{len(missing)} case(s) only in {label} run, not compared")
+    print(f"{failed} regression(s)" if failed else "no regressions")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+ORM-free read path: equivalence check and CPU per row.
+
+Calls each list endpoint through the ASGI test client with and without
+FAST_READ_ENDPOINTS, fails (exit 1) unless both give the same JSON body and
+X-Next-Cursor header -- following the cursor for a few pages -- then
+reports CPU time per row for each path.
+
+    python -m benchmarks.fast_read [--repeat 20]
+"""
+import argparse
+import sys
+import time
+
+from benchmarks.common import seed_catalog  # first: points DATABASE_URL at a temp file
+
+from fastapi.testclient import TestClient   # noqa: E402
+
+from app import models                      # noqa: E402
+from app.config import settings             # noqa: E402
+from app.database import SessionLocal       # noqa: E402
+from app.main import app                    # noqa: E402
+
+# (endpoint name in FAST_READ_ENDPOINTS, path, time it); the filtered sales
+# lists are only compared -- on SQLite their cost is the EXISTS scan, not rows
+PATHS = [
+    ("products",   "/products/?limit=1000",                                  True),
+    ("sales",      "/sales/?limit=1000",                                     True),
+    ("sales",      "/sales/by-category/1?include_descendants=true&limit=500", False),
+    ("sales",      "/sales/by-product/7?limit=100",                          False),
+    ("sale_items", "/sale-items/?limit=1000",                                True),
+    ("inventory",  "/inventory/?limit=1000",                                 True),
+]
+PAGES = 3
+
+
+def fetch(client, endpoint, path, fast):
+    settings.FAST_READ_ENDPOINTS = endpoint if fast else ""
+    return client.get(path)
+
+
+def pages(client, endpoint, path, fast):
+    out, url = [], path
+    for _ in range(PAGES):
+        r = fetch(client, endpoint, url, fast)
+        cursor = r.headers.get("x-next-cursor")
+        out.append((r.status_code, r.json(), cursor))
+        if not cursor:
+            break
+        url = f"{path}&after={cursor}"
+    return out
+
+
+def cpu_per_row(client, endpoint, path, fast, repeat):
+    rows = len(fetch(client, endpoint, path, fast).json())
+    start = time.process_time()
+    for _ in range(repeat):
+        fetch(client, endpoint, path, fast)
+    return (time.process_time() - start) / repeat / max(rows, 1) * 1e6, rows
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    seed_catalog(products=3000, sales=3000)
+    # a few products on non-leaf categories, so embedded children trees vary
+    db = SessionLocal()
+    db.add_all([
+        models.Product(name=f"Bundle {c}", sku=f"BUNDLE-{c}", price=99.5, category_id=c)
+        for c in (1, 2, 6)
+    ])
+    db.commit()
+    db.close()
+
+    client = TestClient(app)
+    failed = False
+    for endpoint, path, timed in PATHS:
+        same = pages(client, endpoint, path, False) == pages(client, endpoint, path, True)
+        failed |= not same
+        line = f"{'ok  ' if same else 'DIFF'} {path:<58}"
+        if timed:
+            orm, rows = cpu_per_row(client, endpoint, path, False, args.repeat)
+            core, _ = cpu_per_row(client, endpoint, path, True, args.repeat)
+            line += (f" {rows:>5} rows  orm {orm:6.1f} us/row  "
+                     f"core {core:6.1f} us/row  {orm / core:4.1f}x")
+        print(line)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
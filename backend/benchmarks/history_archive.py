@@ -0,0 +1,128 @@
+"""
+Check and measure inventory-history archival (app/history_archive.py).
+
+Seeds a `benchmarks.suite` scale, records what the history endpoints
+return -- keyset-paged lists (unfiltered and per product), offset pages
+around the horizon, CSV exports -- and every product's SUM(change_qty),
+then archives history in two runs (horizons at 1/2 and 3/4 of the seeded
+span) and checks after each that all of it is unchanged. Reports the table
+size, the segment size on disk and list latency for pages served from the
+table and from the segments. Exits 1 on any difference.
+
+    python -m benchmarks.history_archive [--scale 100k]
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# before anything from `app` is imported: segments go to a throwaway directory
+os.environ["HISTORY_ARCHIVE_DIR"] = tempfile.mkdtemp(prefix="ecom-archive-")
+
+from benchmarks.common import SEED_SPAN, SEED_START, seed_scale  # noqa: E402
+
+from fastapi.testclient import TestClient                      # noqa: E402
+from sqlalchemy import func, select                            # noqa: E402
+
+from app import crud, history_archive, models                  # noqa: E402
+from app.pagination import encode_cursor                       # noqa: E402
+from app.config import settings                                # noqa: E402
+from app.database import SessionLocal                          # noqa: E402
+from app.main import app                                       # noqa: E402
+from benchmarks.suite import SCALES                            # noqa: E402
+
+PRODUCTS = (1, 2, 17, 51)
+
+
+def walk(client, query: str, limit: int = 100) -> list:
+    rows, after = [], None
+    while True:
+        resp = client.get(f"/inventory/history?limit={limit}{query}"
+                          + (f"&after={after}" if after else ""))
+        resp.raise_for_status()
+        rows.extend(resp.json())
+        after = resp.headers.get("x-next-cursor")
+        if not after:
+            return rows
+
+
+def snapshot(client, n_rows: int) -> dict:
+    out = {"all": walk(client, "", limit=500)}
+    for pid in PRODUCTS:
+        out[f"product {pid}"] = walk(client, f"&product_id={pid}", limit=37)
+    for skip in (0, n_rows // 3, n_rows // 2 - 50, n_rows - 10, n_rows + 10):
+        out[f"skip {skip}"] = client.get(f"/inventory/history?skip={skip}&limit=100").json()
+    mid = (SEED_START + SEED_SPAN * 0.4).date()
+    late = (SEED_START + SEED_SPAN * 0.9).date()
+    for query in ("", f"?product_id=2&start_date={mid}&end_date={late}", f"?end_date={mid}",
+                  f"?format=ndjson&start_date={late}"):
+        out[f"export {query}"] = client.get(f"/inventory/history/export{query}").text
+    db = SessionLocal()
+    h = models.InventoryHistory
+    out["balances"] = dict(db.execute(
+        select(h.product_id, func.sum(h.change_qty)).group_by(h.product_id)).all())
+    db.close()
+    return out
+
+
+def table_rows() -> int:
+    db = SessionLocal()
+    n = db.query(models.InventoryHistory).count()
+    db.close()
+    return n
+
+
+def page_ms(client, query: str, calls: int = 30) -> float:
+    samples = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        client.get(f"/inventory/history?limit=100{query}").raise_for_status()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="100k")
+    args = parser.parse_args()
+
+    seed_scale(SCALES[args.scale])
+    client = TestClient(app)
+    n_rows = table_rows()
+    before = snapshot(client, n_rows)
+    print(f"{n_rows} history rows; archive in {settings.HISTORY_ARCHIVE_DIR}")
+
+    failed = 0
+    for fraction in (0.5, 0.75):
+        horizon = (SEED_START + SEED_SPAN * fraction).replace(hour=0, minute=0, second=0,
+                                                              microsecond=0)
+        db = SessionLocal()
+        t0 = time.perf_counter()
+        result = crud.inventory_history.archive_history(db, horizon)
+        elapsed = time.perf_counter() - t0
+        db.close()
+        on_disk = sum(
+            os.path.getsize(os.path.join(settings.HISTORY_ARCHIVE_DIR, s["file"]))
+            for s in history_archive.archive.manifest()["segments"]
+        )
+        print(f"archive before {horizon:%Y-%m-%d}: {result['archived']} rows in {elapsed:.1f}s, "
+              f"table {table_rows()} rows, segments {on_disk / 1e6:.1f} MB")
+        after = snapshot(client, n_rows)
+        for name, value in before.items():
+            if after[name] != value:
+                failed += 1
+                print(f"MISMATCH {name}")
+
+    old = (SEED_START + SEED_SPAN * 0.1).isoformat()
+    cursor = encode_cursor(old, 10**9)
+    print(f"first page (table):         {page_ms(client, ''):.2f} ms")
+    print(f"page at 10% of span (cold): {page_ms(client, f'&after={cursor}'):.2f} ms")
+    print(f"product page at 10% (cold): {page_ms(client, f'&after={cursor}&product_id=17'):.2f} ms")
+    print(f"{failed} mismatch(es)" if failed else "archived history reads back identically")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
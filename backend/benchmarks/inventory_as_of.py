@@ -0,0 +1,178 @@
+"""
+Check and time point-in-time stock reads (crud/inventory_snapshots.py).
+
+Seeds a `benchmarks.suite` scale, writes daily snapshots over the seeded
+span, then compares GET /inventory/as-of and GET /inventory/{id}/as-of at
+a spread of instants (midnights, exact history timestamps, before the
+first snapshot, after the last) against SUM(change_qty) over all history
+up to that instant. Then logs a late history row dated in the past, checks
+that check_snapshots reports the snapshots after it and that --repair
+fixes them, archives half the history and compares everything again.
+Reports the snapshot job's time and as-of latency against a full replay.
+Exits 1 on any difference.
+
+    python -m benchmarks.inventory_as_of [--scale 100k]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import timedelta
+
+# before anything from `app` is imported: segments go to a throwaway directory
+os.environ["HISTORY_ARCHIVE_DIR"] = tempfile.mkdtemp(prefix="ecom-archive-")
+
+from benchmarks.common import SEED_SPAN, SEED_START, seed_scale  # noqa: E402
+
+from fastapi.testclient import TestClient                      # noqa: E402
+from sqlalchemy import func, select                            # noqa: E402
+
+from app import crud, models                                   # noqa: E402
+from app.database import SessionLocal                          # noqa: E402
+from app.main import app                                       # noqa: E402
+from benchmarks.suite import SCALES                            # noqa: E402
+
+PRODUCTS = (1, 2, 17, 51)
+
+
+def instants(rng: random.Random) -> list:
+    db = SessionLocal()
+    h = models.InventoryHistory
+    stamps = [t for (t,) in db.query(h.changed_at).order_by(h.id).limit(2000)]
+    db.close()
+    out = [SEED_START - timedelta(days=1), SEED_START + timedelta(hours=12),
+           SEED_START + SEED_SPAN + timedelta(days=3)]
+    out += [SEED_START + timedelta(days=rng.randrange(1, SEED_SPAN.days)) for _ in range(4)]
+    out += [SEED_START + SEED_SPAN * rng.random() for _ in range(6)]
+    out += rng.sample(stamps, 4)
+    return out
+
+
+def truth(ts) -> dict:
+    db = SessionLocal()
+    h = models.InventoryHistory
+    totals = dict(db.execute(
+        select(h.product_id, func.sum(h.change_qty)).where(h.changed_at <= ts).group_by(h.product_id)
+    ).all())
+    db.close()
+    return {pid: int(total) for pid, total in totals.items()}
+
+
+def compare(client, expected: dict) -> list:
+    problems = []
+    for ts, want in expected.items():
+        for fmt in ("ndjson", "csv"):
+            resp = client.get("/inventory/as-of", params={"ts": ts.isoformat(), "format": fmt})
+            resp.raise_for_status()
+            if fmt == "ndjson":
+                got = [json.loads(line) for line in resp.text.splitlines()]
+                got = {r["product_id"]: r["quantity_on_hand"] for r in got}
+            else:
+                got = dict(tuple(map(int, line.split(","))) for line in resp.text.splitlines()[1:])
+            if got != want:
+                problems.append(f"all products as of {ts} ({fmt})")
+        for pid in PRODUCTS:
+            resp = client.get(f"/inventory/{pid}/as-of", params={"ts": ts.isoformat()})
+            resp.raise_for_status()
+            if resp.json()["quantity_on_hand"] != want.get(pid, 0):
+                problems.append(f"product {pid} as of {ts}")
+    return problems
+
+
+def ms(fn, calls: int = 20) -> float:
+    samples = []
+    for _ in range(calls):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="100k")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    n_products = seed_scale(SCALES[args.scale])
+    client = TestClient(app)
+    rng = random.Random(args.seed)
+    first = SEED_START + timedelta(days=1)
+    last = SEED_START + SEED_SPAN
+
+    db = SessionLocal()
+    t0 = time.perf_counter()
+    written = crud.snapshot_inventory(db, last, first)
+    elapsed = time.perf_counter() - t0
+    db.close()
+    print(f"{n_products} products; {len(written)} daily snapshots written in {elapsed:.1f}s")
+
+    points = instants(rng)
+    expected = {ts: truth(ts) for ts in points}
+    problems = compare(client, expected)
+
+    db = SessionLocal()
+    report = crud.check_snapshots(db)
+    if report:
+        problems.append(f"check_snapshots flagged {len(report)} snapshots of a clean run")
+    # a change logged late, dated inside an interval that is already snapshotted
+    late = SEED_START + SEED_SPAN * 0.3
+    db.add(models.InventoryHistory(inventory_id=3, product_id=3, change_qty=5,
+                                   reason="late count", changed_at=late))
+    db.commit()
+    stale = sum(t > late for t in written)
+    report = crud.check_snapshots(db)
+    if len(report) != stale:
+        problems.append(f"check_snapshots flagged {len(report)} snapshots, expected {stale}")
+    crud.check_snapshots(db, repair=True)
+    if crud.check_snapshots(db):
+        problems.append("snapshots still differ after repair")
+    db.close()
+    print(f"late row: {stale} stale snapshots found and repaired")
+
+    expected = {ts: truth(ts) for ts in points}
+    problems += compare(client, expected)
+
+    db = SessionLocal()
+
+    def all_as_of(ts):
+        _, stmt, rows = crud.stock_as_of(db, ts)
+        return list(rows) + (db.execute(stmt).all() if stmt is not None else [])
+
+    mid = SEED_START + SEED_SPAN * 0.6
+    old = SEED_START + SEED_SPAN * 0.3
+    timings = {
+        "product, snapshot + replay": ms(lambda: crud.inventory_as_of(db, 17, mid)),
+        "product, full replay": ms(
+            lambda: crud.inventory_snapshots.history_totals(db, None, mid, product_id=17)),
+        "all products, snapshot + replay": ms(lambda: all_as_of(mid), 5),
+        "all products, full replay": ms(lambda: truth(mid), 5),
+    }
+
+    horizon = (SEED_START + SEED_SPAN * 0.5).replace(hour=0, minute=0, second=0, microsecond=0)
+    result = crud.inventory_history.archive_history(db, horizon)
+    if crud.check_snapshots(db):
+        problems.append("snapshots differ from the replay after archiving")
+    db.close()
+    print(f"archived {result['archived']} history rows before {horizon:%Y-%m-%d}")
+    problems += compare(client, expected)
+    db = SessionLocal()
+    timings["product, in the archive"] = ms(lambda: crud.inventory_as_of(db, 17, old))
+    timings["all products, in the archive"] = ms(lambda: all_as_of(old), 5)
+    db.close()
+
+    for name, value in timings.items():
+        print(f"{name:<34} {value:8.2f} ms")
+    for p in problems:
+        print(f"MISMATCH {p}")
+    if not problems:
+        print(f"as-of stock matches a full replay at {len(points)} instants")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
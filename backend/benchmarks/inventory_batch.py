@@ -0,0 +1,135 @@
+"""
+Time a large receipt / cycle count through POST /inventory/adjustments.
+
+Seeds --products products, then posts --lines adjustment lines (mostly
+receiving deltas, every --count-every'th an absolute cycle count, a few
+that would oversell) through the ASGI client, and checks the result
+against the same lines folded in Python: every product's final quantity,
+every line's outcome, and the history rows logged. For scale it also times
+--sample single-line PATCH round trips (read, then set the new quantity)
+and extrapolates them to the full receipt. Exits 1 on a mismatch or if the
+batch takes longer than --budget seconds.
+
+    python -m benchmarks.inventory_batch [--lines 50000] [--products 50000]
+"""
+import argparse
+import asyncio
+import random
+import sys
+import time
+
+from benchmarks.common import seed_catalog  # first: temp DATABASE_URL
+
+import httpx                                # noqa: E402
+from sqlalchemy import func, select         # noqa: E402
+
+from app import models                      # noqa: E402
+from app.database import SessionLocal       # noqa: E402
+from app.main import app                    # noqa: E402
+
+REASON = "bench-receipt"
+
+
+def make_lines(args):
+    rng = random.Random(args.seed)
+    lines = []
+    for i in range(args.lines):
+        pid = rng.randint(1, args.products)
+        if i % args.count_every == 0:
+            lines.append({"product_id": pid, "absolute_qty": rng.randint(0, 500), "reason": REASON})
+        elif i % 97 == 0:
+            lines.append({"product_id": pid, "delta": -10_000, "reason": REASON})
+        else:
+            lines.append({"product_id": pid, "delta": rng.randint(1, 48), "reason": REASON})
+    return lines
+
+
+def expected(lines, on_hand):
+    """Fold `lines` over {product_id: quantity}: (final quantities, per-line ok, history sum)."""
+    on_hand = dict(on_hand)
+    ok, logged = [], 0
+    for line in lines:
+        current = on_hand[line["product_id"]]
+        new = current + line["delta"] if "delta" in line else line["absolute_qty"]
+        ok.append(new >= 0)
+        if new >= 0:
+            on_hand[line["product_id"]] = new
+            logged += new - current
+    return on_hand, ok, logged
+
+
+def quantities():
+    db = SessionLocal()
+    inv = models.Inventory
+    rows = dict(db.execute(select(inv.product_id, inv.quantity_on_hand)).all())
+    logged = db.execute(
+        select(func.coalesce(func.sum(models.InventoryHistory.change_qty), 0))
+          .where(models.InventoryHistory.reason == REASON)
+    ).scalar()
+    db.close()
+    return rows, logged
+
+
+async def run(args, lines):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+        t0 = time.perf_counter()
+        resp = await client.post("/inventory/adjustments", json=lines)
+        batch = time.perf_counter() - t0
+        resp.raise_for_status()
+
+        t0 = time.perf_counter()
+        for line in lines[:args.sample]:
+            pid = line["product_id"]
+            inv = (await client.get(f"/inventory/{pid}")).json()
+            await client.patch(f"/inventory/{pid}", json={"quantity_on_hand": inv["quantity_on_hand"]})
+        per_patch = (time.perf_counter() - t0) / args.sample
+    return resp.json(), batch, per_patch
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--lines", type=int, default=50_000)
+    parser.add_argument("--products", type=int, default=50_000)
+    parser.add_argument("--count-every", type=int, default=10,
+                        help="every Nth line is an absolute cycle count")
+    parser.add_argument("--sample", type=int, default=200, help="PATCH round trips to time")
+    parser.add_argument("--budget", type=float, default=10.0, help="seconds")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    seed_catalog(products=args.products, sales=0)
+    print(f"seeded {args.products} products in {time.perf_counter() - t0:.1f}s")
+    lines = make_lines(args)
+    before, _ = quantities()
+    want, want_ok, want_logged = expected(lines, before)
+
+    report, batch, per_patch = asyncio.run(run(args, lines))
+    after, logged = quantities()
+
+    problems = []
+    got_ok = [r["error"] is None for r in report["results"]]
+    if got_ok != want_ok:
+        problems.append(f"{sum(a != b for a, b in zip(got_ok, want_ok))} line outcome(s) differ")
+    if report["applied"] != sum(want_ok):
+        problems.append(f"applied {report['applied']}, expected {sum(want_ok)}")
+    wrong = [pid for pid in want if after[pid] != want[pid]]
+    if wrong:
+        problems.append(f"{len(wrong)} product quantities differ, e.g. product {wrong[0]}")
+    if logged != want_logged:
+        problems.append(f"history sums to {logged}, expected {want_logged}")
+
+    print(f"{args.lines} lines: {report['applied']} applied, {report['failed']} rejected "
+          f"in {batch:.2f}s ({args.lines / batch:,.0f} lines/s)")
+    print(f"GET + PATCH per line: {per_patch * 1000:.2f} ms "
+          f"-> {per_patch * args.lines:.0f}s for the same receipt")
+    for p in problems:
+        print(f"MISMATCH {p}")
+    if batch > args.budget:
+        print(f"over budget ({args.budget:.0f}s)")
+    return 1 if problems or batch > args.budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,159 @@
+"""
+Lost updates under concurrent stock changes.
+
+Starts `uvicorn app.main:app` (as benchmarks.load does) and has N concurrent
+clients (default 64) change the stock of a few hot products, twice:
+
+  patch   the read-modify-write pattern: GET the row, then PATCH the new
+          absolute quantity_on_hand
+  adjust  POST /inventory/{product_id}/adjust with the delta
+  mixed   each change, at random, either through /adjust or as a one-line
+          POST /inventory/adjustments batch
+
+After each phase it checks every product's final quantity against its
+starting quantity plus the deltas that were acknowledged (failed requests,
+listed by status, must not have applied), and the history logged under the
+phase's reason against the same deltas. Exits 1 if the adjust or mixed
+phase lost an update or a history row; the patch phase is reported for
+contrast.
+
+    python -m benchmarks.inventory_contention [--writers 64] [--ops 50] [--async-db]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.common import seed_catalog  # first: points DATABASE_URL at a temp file
+
+import httpx                                 # noqa: E402
+from sqlalchemy import create_engine, text   # noqa: E402
+
+from benchmarks.load import start_server     # noqa: E402
+
+START_QTY = 1_000_000
+
+
+async def patch_change(client, pid: int, delta: int, reason: str):
+    resp = await client.get(f"/inventory/{pid}")
+    if resp.status_code != 200:
+        return resp
+    inv = resp.json()
+    return await client.patch(
+        f"/inventory/{pid}", json={"quantity_on_hand": inv["quantity_on_hand"] + delta}
+    )
+
+
+async def adjust_change(client, pid: int, delta: int, reason: str):
+    return await client.post(f"/inventory/{pid}/adjust", json={"delta": delta, "reason": reason})
+
+
+async def mixed_change(client, pid: int, delta: int, reason: str):
+    if random.random() < 0.5:
+        return await adjust_change(client, pid, delta, reason)
+    resp = await client.post("/inventory/adjustments",
+                             json=[{"product_id": pid, "delta": delta, "reason": reason}])
+    if resp.status_code == 200 and resp.json()["failed"]:
+        return httpx.Response(409)  # the line was rejected
+    return resp
+
+
+async def run_phase(base_url: str, change, hot, args, reason: str):
+    """Returns ({product_id: acknowledged delta sum}, final quantities, failures, seconds)."""
+    applied = defaultdict(int)
+    failures = Counter()
+    limits = httpx.Limits(max_connections=args.writers, max_keepalive_connections=args.writers)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        for pid in hot:
+            await client.patch(f"/inventory/{pid}", json={"quantity_on_hand": START_QTY})
+
+        async def writer(n: int):
+            rng = random.Random(n)
+            for _ in range(args.ops):
+                pid = rng.choice(hot)
+                delta = rng.choice((-3, -2, -1, 1, 2, 3))
+                try:
+                    status = (await change(client, pid, delta, reason)).status_code
+                except httpx.HTTPError as e:
+                    status = type(e).__name__
+                if status == 200:
+                    applied[pid] += delta
+                else:
+                    failures[status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(writer(n) for n in range(args.writers)))
+        elapsed = time.perf_counter() - started
+        final = {pid: (await client.get(f"/inventory/{pid}")).json()["quantity_on_hand"]
+                 for pid in hot}
+    return applied, final, failures, elapsed
+
+
+def logged(database_url: str, reason: str) -> dict:
+    engine = create_engine(database_url)
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT product_id, SUM(change_qty) FROM inventory_history"
+            " WHERE reason = :reason GROUP BY product_id"
+        ), {"reason": reason})
+        totals = dict(rows.all())
+    engine.dispose()
+    return totals
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--writers", type=int, default=64)
+    parser.add_argument("--ops", type=int, default=50, help="changes per writer")
+    parser.add_argument("--hot", type=int, default=4, help="products the writers contend on")
+    parser.add_argument("--async-db", action="store_true")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--database-url", default=None,
+                        help="already-seeded database to use instead of a temp SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        seed_catalog(products=50, sales=10)
+        database_url = os.environ["DATABASE_URL"]
+        # SQLite runs one writer at a time: give every client a connection
+        # that waits its turn rather than failing on the lock or the pool
+        os.environ.setdefault("DB_POOL_SIZE", str(args.writers))
+        os.environ.setdefault("DB_POOL_TIMEOUT", "300")
+        os.environ.setdefault("DB_SESSION_SETTINGS",
+                              "PRAGMA busy_timeout = 300000; PRAGMA synchronous = OFF")
+    hot = list(range(1, args.hot + 1))
+
+    print(f"{args.writers} writers x {args.ops} changes on {args.hot} products "
+          f"({'async' if args.async_db else 'sync'} db)")
+    print(f"{'phase':<7} {'acked':>6} {'failed':>6} {'lost qty':>8} {'unlogged':>8} {'changes/s':>10}")
+    proc = start_server(args.async_db, args.port, database_url)
+    lost_relative = 0
+    try:
+        for phase, change in (("patch", patch_change), ("adjust", adjust_change),
+                              ("mixed", mixed_change)):
+            reason = f"contention-{phase}-{os.getpid()}"
+            applied, final, failures, elapsed = asyncio.run(
+                run_phase(f"http://127.0.0.1:{args.port}", change, hot, args, reason)
+            )
+            acked = args.writers * args.ops - sum(failures.values())
+            lost = sum(abs(START_QTY + applied[pid] - final[pid]) for pid in hot)
+            history = logged(database_url, reason)
+            # PATCH logs under its own reason, so its history is not checked
+            unlogged = (sum(abs(applied[pid] - history.get(pid, 0)) for pid in hot)
+                        if phase != "patch" else 0)
+            print(f"{phase:<7} {acked:>6} {sum(failures.values()):>6} {lost:>8} {unlogged:>8} "
+                  f"{acked / elapsed:>10.1f}  {dict(failures) or ''}")
+            if phase != "patch":
+                lost_relative += lost + unlogged
+    finally:
+        proc.terminate()
+        proc.wait()
+    return 1 if lost_relative else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
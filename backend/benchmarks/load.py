@@ -0,0 +1,108 @@
+"""
+Sync vs async database mode under concurrent load.
+
+For each mode, starts `uvicorn app.main:app` against a seeded SQLite file
+(ASYNC_DB=false / true), then drives a mix of read endpoints from N
+concurrent clients for a fixed duration and reports requests/sec and
+latency percentiles.
+
+    python -m benchmarks.load --concurrency 50 200 1000 --duration 15
+
+Point --database-url at a MySQL instance to measure the production drivers
+(pymysql vs aiomysql); the load generator itself is a single asyncio
+process, so at very high concurrency check it isn't the bottleneck.
+"""
+import argparse
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+from benchmarks.common import percentile, seed_catalog  # first: points DATABASE_URL at a temp file
+
+import httpx  # noqa: E402
+
+PATHS = [
+    "/products/?limit=20",
+    "/products/7",
+    "/sales/?limit=20",
+    "/inventory/low-stock?limit=20",
+    "/categories/1",
+]
+
+
+async def drive(base_url: str, concurrency: int, duration: float):
+    latencies, errors = [], 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(n: int):
+            nonlocal errors
+            i = n
+            while time.perf_counter() < deadline:
+                t0 = time.perf_counter()
+                try:
+                    resp = await client.get(PATHS[i % len(PATHS)])
+                    ok = resp.status_code == 200
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append((time.perf_counter() - t0) * 1000)
+                errors += not ok
+                i += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return len(latencies) / elapsed, latencies, errors
+
+
+def start_server(mode_async: bool, port: int, database_url: str):
+    env = dict(os.environ, DATABASE_URL=database_url, ASYNC_DB=str(mode_async).lower())
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app",
+         "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.kill()
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[50, 200, 1000])
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--database-url", default=None,
+                        help="already-seeded database to use instead of a temp SQLite file")
+    args = parser.parse_args()
+
+    database_url = args.database_url
+    if database_url is None:
+        seed_catalog(products=2000, sales=5000)
+        database_url = os.environ["DATABASE_URL"]
+
+    print(f"{'mode':<6} {'clients':>7} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for mode_async in (False, True):
+        proc = start_server(mode_async, args.port, database_url)
+        try:
+            for concurrency in args.concurrency:
+                rps, lat, errors = asyncio.run(
+                    drive(f"http://127.0.0.1:{args.port}", concurrency, args.duration)
+                )
+                print(f"{'async' if mode_async else 'sync':<6} {concurrency:>7} {rps:>9.1f} "
+                      f"{percentile(lat, 50):>8.1f} {percentile(lat, 99):>8.1f} {errors:>7}")
+        finally:
+            proc.terminate()
+            proc.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Hit ratio, latency and invalidation of the hot-key lookup cache (app/lookup_cache.py).
+
+First replays a synthetic trace against the W-TinyLFU cache and a plain
+LRU of the same size: --requests lookups of --keys product ids, Zipf-skewed,
+with a sequential crawl of --scan one-off ids a third of the way in, and
+reports each one's hit ratio over the whole trace and after the crawl.
+Then, through the API on a seeded database, checks that writes are seen at
+once (PATCH and adjust of inventory, a sale, a new product taking a SKU
+that was cached as unknown, a category write) and times cached against
+uncached GET /products/{id}, /products/by-sku/{sku} and
+/inventory/{product_id}. Exits 1 if a response is stale or if W-TinyLFU's
+hit ratio is not above LRU's.
+
+    python -m benchmarks.lookup_cache [--keys 1000000] [--capacity 10000]
+"""
+import argparse
+import gc
+import random
+import statistics
+import sys
+import time
+from collections import OrderedDict
+
+from benchmarks.common import percentile, seed_catalog  # first: temp DATABASE_URL
+
+from fastapi.testclient import TestClient               # noqa: E402
+
+from app import lookup_cache                            # noqa: E402
+from app.main import app                                # noqa: E402
+
+
+class LRU:
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True, self._entries[key]
+        return False, None
+
+    def put(self, key, body, version):
+        self._entries[key] = body
+        if len(self._entries) > self.capacity:
+            self._entries.popitem(last=False)
+
+
+def trace(keys: int, requests: int, scan: int, seed: int) -> list:
+    rng = random.Random(seed)
+    weights = [1 / (i + 1) for i in range(keys)]
+    cum, total = [], 0.0
+    for w in weights:
+        total += w
+        cum.append(total)
+    ids = list(range(1, keys + 1))
+    rng.shuffle(ids)
+    out = [("product", k) for k in rng.choices(ids, cum_weights=cum, k=requests)]
+    crawl = [("product", keys + i) for i in range(scan)]
+    at = len(out) // 3
+    return out[:at] + crawl + out[at:]
+
+
+def replay(cache, requests: list, after: int) -> tuple:
+    hits = late = 0
+    for n, key in enumerate(requests):
+        hit, _ = cache.get(key)
+        if hit:
+            hits += 1
+            late += n >= after
+        else:
+            cache.put(key, b"{}", 0)
+    return hits / len(requests), late / (len(requests) - after)
+
+
+def timed(client, paths: list) -> tuple:
+    """(uncached, cached) ms per request, alternating, so drift hits both alike."""
+    uncached, cached = [], []
+    enabled = lookup_cache.cache
+    for path in paths:
+        for cache, samples in ((None, uncached), (enabled, cached)):
+            lookup_cache.cache = cache
+            t0 = time.perf_counter()
+            client.get(path).raise_for_status()
+            samples.append((time.perf_counter() - t0) * 1000)
+    lookup_cache.cache = enabled
+    return uncached, cached
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--keys", type=int, default=1_000_000)
+    parser.add_argument("--requests", type=int, default=500_000)
+    parser.add_argument("--scan", type=int, default=50_000)
+    parser.add_argument("--capacity", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    problems = []
+
+    requests = trace(args.keys, args.requests, args.scan, args.seed)
+    after = len(requests) // 3 + args.scan
+    ratios = {}
+    for name, cache in (("W-TinyLFU", lookup_cache.LookupCache(args.capacity)),
+                        ("LRU", LRU(args.capacity))):
+        t0 = time.perf_counter()
+        ratios[name] = replay(cache, requests, after)
+        per_op = (time.perf_counter() - t0) / len(requests) * 1e6
+        print(f"{name:<10} hit ratio {ratios[name][0]:.1%} overall, {ratios[name][1]:.1%} after "
+              f"the crawl ({per_op:.1f} us per lookup)")
+    if ratios["W-TinyLFU"][0] <= ratios["LRU"][0]:
+        problems.append("W-TinyLFU does not beat LRU")
+    # the trace's millions of tuples would otherwise slow every GC pass below
+    del requests, cache
+    gc.collect()
+
+    seed_catalog(products=300, sales=0)
+    client = TestClient(app)
+    lookup_cache.clear()
+
+    def check(path: str, field: str, want, what: str):
+        got = client.get(path)
+        if got.status_code != 200 or got.json()[field] != want:
+            problems.append(f"{what}: {path} -> {got.status_code} {got.text[:80]}")
+
+    client.get("/inventory/5")
+    client.patch("/inventory/5", json={"quantity_on_hand": 77})
+    check("/inventory/5", "quantity_on_hand", 77, "PATCH")
+    client.post("/inventory/5/adjust", json={"delta": 3, "reason": "bench"})
+    check("/inventory/5", "quantity_on_hand", 80, "adjust")
+    client.post("/inventory/adjustments", json=[{"product_id": 5, "absolute_qty": 60, "reason": "count"}])
+    check("/inventory/5", "quantity_on_hand", 60, "batch adjustment")
+    client.post("/sales/", json={"sale_date": "2025-06-01T10:00:00", "total_amount": 20, "items": [
+        {"product_id": 5, "quantity": 2, "unit_price": 10, "line_total": 20}]})
+    check("/inventory/5", "quantity_on_hand", 58, "sale")
+    if client.get("/products/by-sku/BENCH-NEW").status_code != 404:
+        problems.append("unknown SKU found")
+    created = client.post("/products/", json={"name": "New", "sku": "BENCH-NEW", "price": 5,
+                                              "category_id": 10}).json()
+    check("/products/by-sku/BENCH-NEW", "id", created["id"], "new product by SKU")
+    category = client.get("/products/7").json()["category"]
+    client.post("/categories/", json={"name": "Bench child", "parent_id": category["id"]})
+    check("/products/7", "category", client.get(f"/categories/{category['id']}").json(),
+          "category write")
+
+    client.cookies.clear()      # the writes above pinned this client to the primary
+    rng = random.Random(args.seed)
+    hot = [rng.randint(1, 299) for _ in range(2000)]
+    print(f"{'endpoint':<28} {'uncached p50':>13} {'cached p50':>11} {'cached p99':>11}")
+    for name, path in (("GET /products/{id}", "/products/{}"),
+                       ("GET /products/by-sku/{sku}", "/products/by-sku/SKU-{}"),
+                       ("GET /inventory/{product_id}", "/inventory/{}")):
+        uncached, cached = timed(client, [path.format(k) for k in hot])
+        print(f"{name:<28} {statistics.median(uncached):>10.2f} ms {statistics.median(cached):>8.2f} ms "
+              f"{percentile(cached, 99):>8.2f} ms")
+    stats = lookup_cache.cache.stats()
+    print("hit ratios: " + ", ".join(f"{k} {v['hit_ratio']:.1%}" for k, v in stats["kinds"].items()))
+
+    for p in problems:
+        print(f"MISMATCH {p}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,93 @@
+"""
+Cost of the request instrumentation (app/metrics.py).
+
+Runs the read endpoints of `benchmarks.suite` through the ASGI client with
+the cursor events and MetricsMiddleware on and off in back-to-back batches
+-- interleaved in one process, so drift and warm-up hit both sides alike --
+and reports the median of the paired on/off latency ratios per endpoint and
+for the whole run. Exits 1 if the overall overhead exceeds --budget
+(default 2%). Expect a couple of percent of run-to-run noise either way.
+
+    python -m benchmarks.metrics_overhead [--scale 1k] [--rounds 21]
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from benchmarks.common import seed_scale  # first: temp DATABASE_URL
+
+import httpx                              # noqa: E402
+
+from app import metrics                   # noqa: E402
+from app.database import engine           # noqa: E402
+from app.main import app                  # noqa: E402
+from benchmarks.suite import SCALES, endpoint_cases  # noqa: E402
+
+
+def set_instrumented(on: bool):
+    (metrics.instrument if on else metrics.uninstrument)(engine)
+
+
+async def batch_ms(client, path, kwargs, calls: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        await client.get(path, **kwargs)
+    return (time.perf_counter() - t0) / calls * 1000
+
+
+async def run(args, cases):
+    plain = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+    timed = httpx.AsyncClient(transport=httpx.ASGITransport(app=metrics.MetricsMiddleware(app)),
+                              base_url="http://bench")
+    samples = {name: ([], []) for name, *_ in cases}
+    async with plain, timed:
+        for _, _, path, kwargs in cases:  # warm-up
+            await batch_ms(plain, path, kwargs, 2)
+        for r in range(args.rounds):
+            for name, _, path, kwargs in cases:
+                # each on/off pair runs back to back, alternating which goes first
+                for on in ((False, True) if r % 2 else (True, False)):
+                    set_instrumented(on)
+                    samples[name][on].append(
+                        await batch_ms(timed if on else plain, path, kwargs, args.calls)
+                    )
+    set_instrumented(False)
+    return samples
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="1k")
+    parser.add_argument("--rounds", type=int, default=21)
+    parser.add_argument("--calls", type=int, default=10, help="requests per endpoint per round")
+    parser.add_argument("--budget", type=float, default=0.02)
+    args = parser.parse_args()
+
+    products = seed_scale(SCALES[args.scale])
+    # read endpoints that are not served from a cache or mutate state
+    cases = [c for c in endpoint_cases(products)
+             if c[1] == "GET" and "cached" not in c[0] and c[0] != "GET /sales/cache"]
+    # the app was built with REQUEST_METRICS on: strip the middleware so the
+    # "off" side is the bare app
+    app.user_middleware = [m for m in app.user_middleware if m.cls is not metrics.MetricsMiddleware]
+    app.middleware_stack = app.build_middleware_stack()
+
+    samples = asyncio.run(run(args, cases))
+    for name, (off, on) in samples.items():
+        # batches are paired, so slow drift of the machine cancels out
+        change = statistics.median(b / a for a, b in zip(off, on)) - 1
+        print(f"{name:<46} off {statistics.median(off):8.3f} ms  "
+              f"on {statistics.median(on):8.3f} ms  {change * 100:+6.2f}%")
+    per_round = [
+        sum(samples[n][True][r] for n in samples) / sum(samples[n][False][r] for n in samples)
+        for r in range(args.rounds)
+    ]
+    overall = statistics.median(per_round) - 1
+    print(f"overall: {overall * 100:+.2f}% (budget {args.budget:.0%})")
+    return 1 if overall > args.budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+Batch reads by id list (app/multi_get.py) against one request per id.
+
+Seeds a throwaway SQLite database with --products products and --sales
+sales, then renders --pages storefront pages of --per-page products (a few
+of them unknown ids) plus their stock both ways: a GET /products/{id} and
+GET /inventory/{product_id} per product, and one GET /products/lookup?ids=
+plus one GET /inventory/lookup?product_ids=. Both run with the lookup cache off, so
+every read reaches the database. Reports requests, SQL statements and
+wall time per page, and checks that the batch responses equal the per-id
+ones in order, null for the unknown ids. Then reads --long ids through
+each POST .../lookup endpoint and checks the statement count stays one
+query plus its eager loads per MULTI_GET_CHUNK_SIZE ids. Exits 1 on any
+difference.
+
+    python -m benchmarks.multi_get [--products 20000] [--per-page 200]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+
+from benchmarks.common import seed_catalog  # first: points DATABASE_URL at a temp file
+
+from fastapi.testclient import TestClient   # noqa: E402
+
+from app import lookup_cache                # noqa: E402
+from app.config import settings             # noqa: E402
+from app.database import count_statements   # noqa: E402
+from app.main import app                    # noqa: E402
+
+
+def one_by_one(client, ids: list) -> tuple:
+    products, stock = [], []
+    for i in ids:
+        resp = client.get(f"/products/{i}")
+        products.append(resp.json() if resp.status_code == 200 else None)
+        resp = client.get(f"/inventory/{i}")
+        stock.append(resp.json() if resp.status_code == 200 else None)
+    return products, stock
+
+
+def batched(client, ids: list) -> tuple:
+    joined = ",".join(map(str, ids))
+    products = client.get("/products/lookup", params={"ids": joined})
+    stock = client.get("/inventory/lookup", params={"product_ids": joined})
+    products.raise_for_status()
+    stock.raise_for_status()
+    return products.json(), stock.json()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=20000)
+    parser.add_argument("--sales", type=int, default=2000)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--per-page", type=int, default=200)
+    parser.add_argument("--long", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    problems = []
+
+    seed_catalog(products=args.products, sales=args.sales)
+    client = TestClient(app)
+    lookup_cache.cache = None
+
+    results = {}
+    for name, read, calls in (("one request per id", one_by_one, 2 * args.per_page),
+                              ("id-list requests", batched, 2)):
+        rng = random.Random(args.seed)
+        samples, statements = [], []
+        for _ in range(args.pages):
+            ids = rng.sample(range(1, args.products + 1), args.per_page - 3)
+            ids += [args.products + 1 + rng.randrange(1000) for _ in range(3)]
+            rng.shuffle(ids)
+            with count_statements() as stmts:
+                t0 = time.perf_counter()
+                got = read(client, ids)
+                samples.append((time.perf_counter() - t0) * 1000)
+            statements.append(len(stmts))
+            results.setdefault(name, []).append(got)
+        print(f"{name:<20} {calls:>4} requests {statistics.mean(statements):>6.0f} statements "
+              f"{statistics.median(samples):>9.1f} ms per page of {args.per_page}")
+    for page, (want, got) in enumerate(zip(*results.values())):
+        if want != got:
+            problems.append(f"page {page}: id-list responses differ from per-id ones")
+
+    product_ids = [rng.randrange(1, args.products + 1) for _ in range(args.long)]
+    sale_ids = [rng.randrange(1, args.sales + 1) for _ in range(args.long)]
+    for path, key, wanted, per_chunk in (("/products/lookup", "id", product_ids, 3),
+                                         ("/inventory/lookup", "product_id", product_ids, 1),
+                                         ("/sales/lookup", "id", sale_ids, 3)):
+        budget = per_chunk * -(-len(set(wanted)) // settings.MULTI_GET_CHUNK_SIZE)
+        with count_statements() as stmts:
+            t0 = time.perf_counter()
+            resp = client.post(path, json=wanted)
+            elapsed = (time.perf_counter() - t0) * 1000
+        got = [r and r[key] for r in resp.json()] if resp.status_code == 200 else None
+        if got != wanted:
+            problems.append(f"POST {path}: {resp.status_code}, rows not in request order")
+        if "set-cookie" in resp.headers:
+            problems.append(f"POST {path} pinned the client to the primary")
+        print(f"POST {path:<18} {len(wanted)} ids {len(stmts):>3} statements {elapsed:>7.1f} ms")
+        if len(stmts) > budget:
+            problems.append(f"POST {path}: {len(stmts)} statements, budget {budget}")
+
+    for p in problems:
+        print(f"MISMATCH {p}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
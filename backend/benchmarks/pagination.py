@@ -0,0 +1,70 @@
+"""
+Offset vs keyset pagination latency on `sales`.
+
+Builds a throwaway SQLite database, then times `crud.sales.list_sales` at
+page 1 and at a deep page using `skip` and using an `after` cursor.
+
+    python -m benchmarks.pagination --rows 1000100 --page 10000
+"""
+import argparse
+import statistics
+import time
+from datetime import datetime, timedelta
+
+parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+parser.add_argument("--rows",    type=int, default=1_000_100)
+parser.add_argument("--limit",   type=int, default=100)
+parser.add_argument("--page",    type=int, default=10_000)
+parser.add_argument("--repeats", type=int, default=20)
+args = parser.parse_args()
+
+from benchmarks import common                        # noqa: E402,F401  (temp DATABASE_URL)
+from app import crud, models                         # noqa: E402
+from app.database import Base, SessionLocal, engine  # noqa: E402
+from app.pagination import encode_cursor             # noqa: E402
+
+
+def load(n: int):
+    Base.metadata.create_all(engine)
+    start = datetime(2020, 1, 1)
+    with engine.begin() as conn:
+        batch = 50_000
+        for lo in range(0, n, batch):
+            conn.execute(models.Sale.__table__.insert(), [
+                {"sale_date": start + timedelta(minutes=i), "total_amount": 10}
+                for i in range(lo, min(lo + batch, n))
+            ])
+
+
+def timed(fn) -> float:
+    samples = []
+    for _ in range(args.repeats):
+        t0 = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    load(args.rows)
+    db = SessionLocal()
+    skip = (args.page - 1) * args.limit
+    boundary = (
+        db.query(models.Sale)
+          .order_by(models.Sale.sale_date, models.Sale.id)
+          .offset(skip - 1).limit(1).one()
+    )
+    cursor = encode_cursor(boundary.sale_date, boundary.id)
+
+    print(f"{args.rows:,} sales, limit={args.limit}, median of {args.repeats} runs")
+    print(f"{'page':>8} {'offset ms':>10} {'keyset ms':>10}")
+    for page, skip_n, after in ((1, 0, None), (args.page, skip, cursor)):
+        off = timed(lambda: crud.sales.list_sales(db, skip=skip_n, limit=args.limit))
+        key = timed(lambda: crud.sales.list_sales(db, limit=args.limit, after=after))
+        db.expunge_all()
+        print(f"{page:>8} {off:>10.2f} {key:>10.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
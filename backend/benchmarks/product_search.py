@@ -0,0 +1,193 @@
+"""
+Latency, memory and correctness of the product search index (app/product_search.py).
+
+Generates a synthetic catalog of --products products (names of a Zipf-
+skewed brand, adjective, noun and model code; 12-word descriptions from a
+Zipf-skewed 20k-word vocabulary; SKUs), builds the index and reports build
+time and traced memory per product, then runs a mix of queries --
+two name words, brand prefixes as typed, misspelt nouns, exact and partial
+SKUs, description words, a noun within a category subtree -- and reports
+p50/p95/p99 per kind. Full-word queries are also checked against a brute-
+force scan of the catalog (every product matching every word is found).
+Finally --db-products of them are loaded into a throwaway SQLite database
+and GET /products/search is timed end to end. Exits 1 on a wrong result or
+if the index's p99 exceeds --budget ms.
+
+    python -m benchmarks.product_search [--products 1000000] [--budget 5]
+"""
+import argparse
+import gc
+import random
+import statistics
+import string
+import sys
+import time
+import tracemalloc
+from collections import defaultdict
+
+from benchmarks.common import percentile, seed_catalog  # first: temp DATABASE_URL
+
+from fastapi.testclient import TestClient               # noqa: E402
+
+from app import crud, models, product_search            # noqa: E402
+from app.database import SessionLocal                   # noqa: E402
+from app.main import app                                # noqa: E402
+
+CATEGORIES = 1000
+
+
+def words(rng: random.Random, n: int, syllables=(2, 4)) -> list:
+    out = set()
+    while len(out) < n:
+        out.add("".join(rng.choice(string.ascii_lowercase[:21]) + rng.choice("aeiouy")
+                        for _ in range(rng.randint(*syllables))))
+    return sorted(out)
+
+
+def zipf_picker(rng: random.Random, items: list, s: float = 1.1):
+    weights = [1 / (i + 1) ** s for i in range(len(items))]
+    cum, total = [], 0.0
+    for w in weights:
+        total += w
+        cum.append(total)
+    return lambda k=1: rng.choices(items, cum_weights=cum, k=k)
+
+
+def catalog(n: int, seed: int) -> list:
+    """(id, name, sku, description, category_id) rows."""
+    rng = random.Random(seed)
+    brands, adjectives = words(rng, 3000), words(rng, 200, (1, 2))
+    nouns, vocabulary = words(rng, 800), words(rng, 20000)
+    brand, adjective, noun = zipf_picker(rng, brands), zipf_picker(rng, adjectives), zipf_picker(rng, nouns)
+    describe = zipf_picker(rng, vocabulary)
+    rows = []
+    for pid in range(1, n + 1):
+        b = brand()[0]
+        name = f"{b.title()} {adjective()[0]} {noun()[0]} {rng.choice('xkmz')}{rng.randint(100, 9999)}"
+        sku = f"{b[:3].upper()}-{pid:08d}"
+        rows.append((pid, name, sku, " ".join(describe(12)), rng.randint(1, CATEGORIES)))
+    return rows
+
+
+def typo(rng: random.Random, word: str) -> str:
+    i = rng.randrange(len(word))
+    edit = rng.choice("sdi")
+    if edit == "s":
+        return word[:i] + rng.choice(string.ascii_lowercase.replace(word[i], "")) + word[i + 1:]
+    if edit == "d" and len(word) > 4:
+        return word[:i] + word[i + 1:]
+    return word[:i] + rng.choice(string.ascii_lowercase) + word[i:]
+
+
+def queries(rows: list, rng: random.Random, per_kind: int) -> dict:
+    sample = rng.sample(rows, per_kind)
+    tokens = product_search.tokenize
+    subtree = set(rng.sample(range(1, CATEGORIES + 1), 50))
+    return {
+        "name words": [(f"{tokens(r[1])[0]} {tokens(r[1])[2]}", None) for r in sample],
+        "brand prefix": [(tokens(r[1])[0][:rng.randint(2, 4)], None) for r in sample],
+        "misspelt noun": [(typo(rng, tokens(r[1])[2]), None) for r in sample],
+        "sku": [(r[2], None) for r in sample],
+        "sku prefix": [(r[2][:-2], None) for r in sample],
+        "description word": [(rng.choice(r[3].split()), None) for r in sample],
+        "noun in category": [(tokens(r[1])[2], subtree) for r in sample],
+    }
+
+
+def brute_force(rows: list, query: str) -> set:
+    """Ids of the products with every word of `query` as a word (the last as a prefix)."""
+    *full, last = product_search.tokenize(query)
+    out = set()
+    for pid, name, sku, description, _ in rows:
+        terms = set(product_search.tokenize(f"{name} {sku} {description}"))
+        if all(w in terms for w in full) and any(t.startswith(last) for t in terms):
+            out.add(pid)
+    return out
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--products", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=1000, help="per kind")
+    parser.add_argument("--check", type=int, default=20, help="queries checked by brute force")
+    parser.add_argument("--db-products", type=int, default=20000)
+    parser.add_argument("--budget", type=float, default=5.0, help="index p99, ms")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    rows = catalog(args.products, args.seed)
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    index = product_search.build(rows)
+    built = time.perf_counter() - t0
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"{args.products} products indexed in {built:.1f}s; {memory / 1e6:.0f} MB "
+          f"({memory / args.products:.0f} bytes/product, {len(index._terms)} terms)")
+
+    problems = []
+    overall = []
+    print(f"{'query':<18} {'p50 ms':>7} {'p95 ms':>7} {'p99 ms':>7} {'hits':>5}")
+    for kind, mix in queries(rows, rng, args.queries).items():
+        samples, hits = [], 0
+        for q, categories in mix:
+            t0 = time.perf_counter()
+            found = index.search(q, 20, categories)
+            samples.append((time.perf_counter() - t0) * 1000)
+            hits += bool(found)
+        overall += samples
+        print(f"{kind:<18} {statistics.median(samples):>7.2f} {percentile(samples, 95):>7.2f} "
+              f"{percentile(samples, 99):>7.2f} {hits / len(mix):>5.0%}")
+        if kind in ("sku", "name words") and hits < len(mix):
+            problems.append(f"{kind}: {len(mix) - hits} queries found nothing")
+    p99 = percentile(overall, 99)
+    print(f"{'all':<18} {statistics.median(overall):>7.2f} {percentile(overall, 95):>7.2f} {p99:>7.2f}")
+
+    # every match of a selective full-word query is found, best first
+    exhaustive = product_search.build(rows, max_candidates=args.products)
+    for r in rng.sample(rows, args.check):
+        name = product_search.tokenize(r[1])
+        q = f"{name[2]} {name[0]}"
+        want = brute_force(rows, q)
+        got = exhaustive.search(q, len(want) + 10)
+        if {pid for pid, _ in got} != want:
+            problems.append(f"{q!r}: {len(got)} found, {len(want)} match")
+        if [s for _, s in got] != sorted((s for _, s in got), reverse=True):
+            problems.append(f"{q!r}: not ranked")
+
+    # end to end, through the API on a database-backed catalog
+    seed_catalog(products=0, sales=0)
+    db = SessionLocal()
+    db.execute(models.Product.__table__.insert(), [
+        {"name": n, "sku": s, "description": d, "price": 10, "category_id": 1 + pid % 10}
+        for pid, n, s, d, _ in rows[:args.db_products]
+    ])
+    db.commit()
+    client = TestClient(app)
+    t0 = time.perf_counter()
+    crud.products.build_search_index(db)
+    print(f"API: {args.db_products} products indexed from the database in "
+          f"{time.perf_counter() - t0:.1f}s")
+    samples = []
+    for r in rng.sample(rows[:args.db_products], min(args.queries, args.db_products)):
+        q = " ".join(product_search.tokenize(r[1])[:2])
+        t0 = time.perf_counter()
+        resp = client.get("/products/search", params={"q": q, "limit": 20})
+        samples.append((time.perf_counter() - t0) * 1000)
+        if r[0] not in {p["id"] for p in resp.json()} and len(resp.json()) < 20:
+            problems.append(f"API {q!r} missed product {r[0]}")
+    print(f"API GET /products/search: p50 {statistics.median(samples):.2f} ms, "
+          f"p99 {percentile(samples, 99):.2f} ms")
+    db.close()
+
+    for p in problems:
+        print(f"MISMATCH {p}")
+    if p99 > args.budget:
+        print(f"index p99 over budget ({args.budget} ms)")
+    return 1 if problems or p99 > args.budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
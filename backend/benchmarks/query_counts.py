@@ -0,0 +1,67 @@
+"""
+SQL statement budget per endpoint.
+
+Seeds a throwaway SQLite database with a category tree, products and sales,
+calls each read endpoint through the ASGI test client and fails (exit 1) if
+any of them issues more statements than its budget -- an N+1 regression
+shows up here as a count that grows with `limit`.
+
+    python -m benchmarks.query_counts
+"""
+import sys
+
+from benchmarks.common import seed_catalog  # first: points DATABASE_URL at a temp file
+
+from fastapi.testclient import TestClient                         # noqa: E402
+
+from app import crud                                              # noqa: E402
+from app.database import SessionLocal, count_statements           # noqa: E402
+from app.main import app                                          # noqa: E402
+
+COMPARE_28_DAYS = "/sales/compare?category_id=17&category_id=18&" + "&".join(
+    f"period=2025-01-{d:02}/2025-01-{d:02}" for d in range(1, 29)
+)
+
+# (path, max statements); tree-shaped responses pay one SELECT per level
+BUDGETS = [
+    ("/categories/?limit=100",          4),
+    ("/categories/1",                   4),
+    ("/categories/tree",                1),
+    ("/sales/by-category/1?include_descendants=true&limit=100", 2),
+    ("/products/?limit=100",            4),
+    ("/products/1",                     4),
+    ("/products/search?q=product+1",    5),
+    ("/products/by-sku/SKU-1",          4),
+    ("/products/lookup?ids=2,3,4,999",  4),
+    ("/sales/?limit=100",               2),
+    ("/sales/1",                        2),
+    ("/sales/lookup?ids=2,3,4,999",     2),
+    ("/sales/by-category/3?limit=100",  2),
+    (COMPARE_28_DAYS,                   1),
+    ("/sale-items/?limit=100",          1),
+    ("/inventory/?limit=100",           1),
+    ("/inventory/lookup?product_ids=2,3,999", 1),
+    ("/inventory/low-stock?limit=100",  1),
+    ("/inventory/history?limit=100",    1),
+    ("/inventory/1/as-of?ts=2025-01-02T00:00:00", 3),
+]
+
+
+def main() -> int:
+    seed_catalog()
+    db = SessionLocal()
+    crud.products.build_search_index(db)  # the server builds it in the background
+    db.close()
+    client = TestClient(app)
+    failed = False
+    for path, budget in BUDGETS:
+        with count_statements() as stmts:
+            resp = client.get(path)
+        ok = resp.status_code == 200 and len(stmts) <= budget
+        failed |= not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {len(stmts):>3}/{budget:<3} {resp.status_code} {path[:80]}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
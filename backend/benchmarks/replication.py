@@ -0,0 +1,96 @@
+"""
+Check read-replica routing and read-your-writes (app/replication.py).
+
+Seeds a throwaway SQLite primary, copies it to a second file configured as
+the only DATABASE_REPLICA_URLS entry, and renames product 1 in the copy
+only, so every response shows which database it was read from. Through
+the ASGI test client (lookup cache off) it checks that:
+
+  - a GET from a client without the `primary_until` cookie reads the
+    replica, and so does one whose cookie has expired
+  - a successful write goes to the primary and sets the cookie, after which
+    that client reads the primary while other clients still read the
+    replica; with the lookup cache on, its lookups report X-Cache: BYPASS
+  - a failed write and the read-only POST .../lookup endpoints set no cookie
+
+Exits 1 on any failed check.
+
+    python -m benchmarks.replication
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# before anything from `app` is imported: the replica is a second SQLite file
+REPLICA_PATH = os.path.join(tempfile.mkdtemp(prefix="ecom-replica-"), "replica.db")
+os.environ["DATABASE_REPLICA_URLS"] = f"sqlite:///{REPLICA_PATH}"
+
+from benchmarks.common import DB_PATH, seed_catalog  # noqa: E402
+
+from fastapi.testclient import TestClient           # noqa: E402
+
+from app import lookup_cache, replication           # noqa: E402
+from app.main import app                            # noqa: E402
+
+PRIMARY_NAME, REPLICA_NAME = "Product 0", "Product 0 (replica)"
+
+
+def main() -> int:
+    seed_catalog(products=50, sales=10)
+    source, copy = sqlite3.connect(DB_PATH), sqlite3.connect(REPLICA_PATH)
+    source.backup(copy)
+    copy.execute("UPDATE products SET name = ? WHERE id = 1", (REPLICA_NAME,))
+    copy.commit()
+    source.close()
+    copy.close()
+    cache, lookup_cache.cache = lookup_cache.cache, None
+
+    problems = []
+
+    def check(what: str, ok: bool):
+        print(f"{'ok  ' if ok else 'FAIL'} {what}")
+        if not ok:
+            problems.append(what)
+
+    def read_from(client) -> str:
+        name = client.get("/products/1").json()["name"]
+        return {PRIMARY_NAME: "primary", REPLICA_NAME: "replica"}.get(name, name)
+
+    reader, writer = TestClient(app), TestClient(app)
+    check("GET without the cookie reads the replica", read_from(reader) == "replica")
+    writer.cookies.set(replication.COOKIE, str(int(time.time()) - 1))
+    check("GET with an expired cookie reads the replica", read_from(writer) == "replica")
+    writer.cookies.clear()
+
+    resp = writer.post("/inventory/999999/adjust", json={"delta": 1, "reason": "replication check"})
+    check(f"failed write ({resp.status_code}) sets no cookie", "set-cookie" not in resp.headers)
+    for path in ("/products/lookup", "/inventory/lookup", "/sales/lookup"):
+        resp = writer.post(path, json=[1, 2])
+        check(f"POST {path} ({resp.status_code}) sets no cookie",
+              resp.status_code == 200 and "set-cookie" not in resp.headers)
+    check("after the lookups the client still reads the replica", read_from(writer) == "replica")
+
+    resp = writer.post("/inventory/1/adjust", json={"delta": 5, "reason": "replication check"})
+    check("successful write sets the primary_until cookie",
+          resp.status_code == 200 and replication.COOKIE in writer.cookies)
+    primary = sqlite3.connect(DB_PATH)
+    logged = primary.execute(
+        "SELECT COUNT(*) FROM inventory_history WHERE reason = 'replication check'").fetchone()[0]
+    primary.close()
+    check("the write went to the primary", logged == 1)
+    check("the writing client then reads the primary", read_from(writer) == "primary")
+    check("other clients still read the replica", read_from(reader) == "replica")
+
+    lookup_cache.cache = cache
+    if cache is not None:
+        resp = writer.get("/products/1")
+        check("the writing client bypasses the lookup cache",
+              resp.headers.get("x-cache") == "BYPASS")
+
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
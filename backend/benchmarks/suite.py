@@ -0,0 +1,306 @@
+"""
+Benchmark suite: every router endpoint through an in-process ASGI client,
+plus the CRUD functions called directly, against a throwaway SQLite file
+seeded at a fixed scale.
+
+For each case it reports throughput, p50/p95/p99 latency, SQL statements
+per call and the process's peak RSS so far, and writes everything to a
+JSON file that `benchmarks.compare` can diff against an earlier run.
+
+    python -m benchmarks.suite --scale 100k --output bench-100k.json
+    python -m benchmarks.suite --scale 1k --only sales    # a subset
+    python -m benchmarks.compare bench-old.json bench-new.json
+
+Set ASYNC_DB=true to run the endpoints on the async engine.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import date, datetime
+
+from benchmarks.common import SEED_START, percentile, seed_scale  # first: temp DATABASE_URL
+
+import httpx                                                      # noqa: E402
+import sqlalchemy                                                 # noqa: E402
+
+from app import crud, schemas                                     # noqa: E402
+from app.config import settings                                   # noqa: E402
+from app.database import SessionLocal, count_statements           # noqa: E402
+from app.main import app                                          # noqa: E402
+
+SCALES = {"1k": 1_000, "100k": 100_000, "1m": 1_000_000}
+
+# a product seeded with effectively unlimited stock (every 50th, see seed_scale)
+STOCKED = 1
+MONTH = ("2024-03-01", "2024-03-31")
+NO_CACHE = {"X-Cache-Bypass": "1"}
+
+
+def _sale(n: int = 1) -> dict:
+    return {
+        "sale_date": datetime.now().replace(microsecond=0).isoformat(),
+        "total_amount": 10 * n,
+        "items": [{"product_id": STOCKED, "quantity": 1, "unit_price": 10, "line_total": 10}
+                  for _ in range(n)],
+    }
+
+
+def _counter():
+    n = 0
+
+    def next_():
+        nonlocal n
+        n += 1
+        return n
+    return next_
+
+
+def endpoint_cases(products: int):
+    """(name, method, path or callable returning one, extra request kwargs)."""
+    seq = _counter()
+    weeks = "&".join(f"period=2024-{m:02}-01/2024-{m:02}-07" for m in range(1, 13))
+    bulk = "\n".join(json.dumps(_sale(2)) for _ in range(100))
+    mid = products // 2
+    return [
+        ("GET /categories/",                  "GET",   "/categories/?limit=100", {}),
+        ("GET /categories/tree",              "GET",   "/categories/tree", {}),
+        ("GET /categories/{id}",              "GET",   "/categories/1", {}),
+        ("POST /categories/",                 "POST",  "/categories/",
+         lambda: {"json": {"name": f"Bench {seq()}", "parent_id": 6}}),
+        ("GET /products/",                    "GET",   "/products/?limit=100", {}),
+        ("GET /products/ deep offset",        "GET",   f"/products/?limit=100&skip={mid}", {}),
+        ("GET /products/search",              "GET",   f"/products/search?q=product+{mid // 10}", {}),
+        ("GET /products/{id}",                "GET",   f"/products/{mid}", {}),
+        ("GET /products/by-sku/{sku}",        "GET",   f"/products/by-sku/SKU-{mid}", {}),
+        ("GET /products/lookup (200 ids)",    "GET",   "/products/lookup?ids=" + ",".join(
+            str(mid + i * 7) for i in range(200)), {}),
+        ("POST /products/",                   "POST",  "/products/",
+         lambda: {"json": {"name": "Bench", "sku": f"BENCH-{seq()}", "price": 5,
+                           "category_id": 10}}),
+        ("GET /inventory/",                   "GET",   "/inventory/?limit=100", {}),
+        ("GET /inventory/low-stock",          "GET",   "/inventory/low-stock?limit=100", {}),
+        ("GET /inventory/history",            "GET",   "/inventory/history?limit=100", {}),
+        ("GET /inventory/history?product_id", "GET",   "/inventory/history?limit=100&product_id=7", {}),
+        ("GET /inventory/history/export",     "GET",
+         "/inventory/history/export?start_date=2024-03-01&end_date=2024-03-02", {}),
+        ("GET /inventory/as-of",              "GET",   "/inventory/as-of?ts=2024-06-01T00:00:00", {}),
+        ("GET /inventory/{product_id}",       "GET",   f"/inventory/{mid}", {}),
+        ("GET /inventory/{product_id}/as-of", "GET",
+         f"/inventory/{mid}/as-of?ts=2024-06-01T00:00:00", {}),
+        ("PATCH /inventory/{product_id}",     "PATCH", f"/inventory/{STOCKED + 50}",
+         lambda: {"json": {"quantity_on_hand": 10**9 - seq(), "reorder_threshold": 10}}),
+        ("POST /inventory/{product_id}/history", "POST", f"/inventory/{STOCKED}/history",
+         {"json": {"product_id": STOCKED, "inventory_id": STOCKED, "change_qty": 0,
+                   "reason": "bench"}}),
+        ("POST /sales/",                      "POST",  "/sales/", lambda: {"json": _sale(2)}),
+        ("POST /sales/bulk (100 sales)",      "POST",  "/sales/bulk",
+         {"content": bulk, "headers": {"content-type": "application/x-ndjson"}}),
+        ("GET /sales/",                       "GET",   "/sales/?limit=100", {}),
+        ("GET /sales/{id}",                   "GET",   "/sales/1", {}),
+        ("GET /sales/by-product/{id}",        "GET",   "/sales/by-product/7?limit=100", {}),
+        ("GET /sales/by-category/{id} subtree", "GET",
+         "/sales/by-category/1?include_descendants=true&limit=100", {}),
+        ("GET /sales/stats daily",            "GET",
+         f"/sales/stats?period=daily&start_date={MONTH[0]}&end_date={MONTH[1]}",
+         {"headers": NO_CACHE}),
+        ("GET /sales/stats daily (cached)",   "GET",
+         f"/sales/stats?period=daily&start_date={MONTH[0]}&end_date={MONTH[1]}", {}),
+        ("GET /sales/stats hourly tz",        "GET",
+         "/sales/stats?period=hourly&start_date=2024-03-01&end_date=2024-03-07&tz=Asia/Kolkata",
+         {"headers": NO_CACHE}),
+        ("GET /sales/stats monthly category", "GET",
+         "/sales/stats?period=monthly&category_id=1&include_descendants=true",
+         {"headers": NO_CACHE}),
+        ("GET /sales/compare 12 periods",     "GET",
+         f"/sales/compare?{weeks}&category_id=1&category_id=2&include_descendants=true",
+         {"headers": NO_CACHE}),
+        ("GET /sales/cache",                  "GET",   "/sales/cache", {}),
+        ("GET /sales/export",                 "GET",
+         "/sales/export?start_date=2024-03-01&end_date=2024-03-02", {}),
+        ("GET /sale-items/",                  "GET",   "/sale-items/?limit=100", {}),
+        ("GET /sale-items/export",            "GET",   "/sale-items/export?sale_id=1", {}),
+    ]
+
+
+def crud_cases(products: int):
+    """(name, fn(db)) -- each call gets a fresh session."""
+    d1, d2 = (date.fromisoformat(d) for d in MONTH)
+    weeks = [(date(2024, m, 1), date(2024, m, 7)) for m in range(1, 13)]
+
+    def create_sale(db):
+        crud.sales.create_sale(db, schemas.SaleCreate(**_sale(2)))
+
+    def create_sales_bulk(db):
+        crud.sales.create_sales_bulk(db, [schemas.SaleCreate(**_sale(2)) for _ in range(100)])
+
+    def apply_stock_changes(db):
+        crud.inventory.apply_stock_changes(db, {STOCKED: -1, STOCKED + 50: -1}, "bench")
+        db.commit()
+
+    def cold_tree(db):
+        crud.categories.invalidate_tree()
+        crud.categories.get_tree(db)
+
+    return [
+        ("crud.sales.create_sale",            create_sale),
+        ("crud.sales.create_sales_bulk (100)", create_sales_bulk),
+        ("crud.sales.get_sales",              lambda db: crud.sales.get_sales(db, limit=100)),
+        ("crud.sales.get_sales_rows",         lambda db: crud.sales.get_sales_rows(db, limit=100)),
+        ("crud.sales.get_revenue_summary",    lambda db: crud.sales.get_revenue_summary(db, "daily", d1, d2)),
+        ("crud.sales.compare_periods",        lambda db: crud.sales.compare_periods(db, weeks, [1], True)),
+        ("crud.buckets.revenue_buckets tz",   lambda db: crud.buckets.revenue_buckets(db, "hour", d1, d1, "Asia/Kolkata")),
+        ("crud.rollups.daily_totals",         lambda db: crud.rollups.daily_totals(
+            db, datetime(2024, 1, 1, 12), datetime(2024, 6, 30, 12))),
+        ("crud.products.list_products",       lambda db: crud.products.list_products(db, limit=100)),
+        ("crud.products.list_products_rows",  lambda db: crud.products.list_products_rows(db, limit=100)),
+        ("crud.inventory.list_low_stock",     lambda db: crud.inventory.list_low_stock(db, None, 100)),
+        ("crud.inventory.apply_stock_changes", apply_stock_changes),
+        ("crud.inventory_history.list_inventory_history",
+         lambda db: crud.inventory_history.list_inventory_history(db, product_id=7)),
+        ("crud.categories.get_tree (cold)",   cold_tree),
+    ]
+
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(latencies, statements, elapsed) -> dict:
+    return {
+        "iterations": len(latencies),
+        "throughput": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "statements": sum(statements) / len(statements),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def measure(call, duration: float, max_iterations: int) -> dict:
+    call()  # warm-up: compiled-statement cache, connection pool, tree snapshot
+    latencies, statements = [], []
+    started = time.perf_counter()
+    while len(latencies) < max_iterations and (
+        len(latencies) < 5 or time.perf_counter() - started < duration
+    ):
+        with count_statements() as stmts:
+            t0 = time.perf_counter()
+            call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        statements.append(len(stmts))
+    return summarize(latencies, statements, time.perf_counter() - started)
+
+
+async def measure_async(call, duration: float, max_iterations: int) -> dict:
+    await call()
+    latencies, statements = [], []
+    started = time.perf_counter()
+    while len(latencies) < max_iterations and (
+        len(latencies) < 5 or time.perf_counter() - started < duration
+    ):
+        with count_statements() as stmts:
+            t0 = time.perf_counter()
+            await call()
+            latencies.append((time.perf_counter() - t0) * 1000)
+        statements.append(len(stmts))
+    return summarize(latencies, statements, time.perf_counter() - started)
+
+
+async def run_endpoints(cases, args, results):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for name, method, path, kwargs in cases:
+            async def call():
+                extra = kwargs() if callable(kwargs) else kwargs
+                resp = await client.request(method, path, **extra)
+                if resp.status_code >= 400:
+                    raise RuntimeError(f"{name}: HTTP {resp.status_code} {resp.text[:200]}")
+            results[name] = await measure_async(call, args.duration, args.max_iterations)
+            report(name, results[name])
+
+
+def run_crud(cases, args, results):
+    for name, fn in cases:
+        def call():
+            db = SessionLocal()
+            try:
+                fn(db)
+            finally:
+                db.close()
+        results[name] = measure(call, args.duration, args.max_iterations)
+        report(name, results[name])
+
+
+def report(name: str, r: dict):
+    print(f"{name:<46} {r['throughput']:>9.1f}/s {r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} "
+          f"{r['p99_ms']:>8.2f} {r['statements']:>6.1f} {r['peak_rss_mb']:>8.1f}", flush=True)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", choices=SCALES, default="1k",
+                        help="number of sales seeded (items and history scale with it)")
+    parser.add_argument("--duration", type=float, default=2.0, help="seconds per case")
+    parser.add_argument("--max-iterations", type=int, default=500)
+    parser.add_argument("--only", default=None, help="run cases whose name contains this")
+    parser.add_argument("--output", default=None, help="JSON results file (default bench-<scale>.json)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    products = seed_scale(SCALES[args.scale])
+    seed_seconds = time.perf_counter() - t0
+    db = SessionLocal()
+    crud.products.build_search_index(db)  # the server builds it in the background
+    db.close()
+    print(f"seeded {args.scale}: {SCALES[args.scale]} sales, {products} products "
+          f"in {seed_seconds:.1f}s (first sale {SEED_START:%Y-%m-%d})")
+    print(f"{'case':<46} {'throughput':>11} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+          f"{'stmts':>6} {'rss MB':>8}")
+
+    def keep(name):
+        return args.only is None or args.only in name
+
+    results = {}
+    asyncio.run(run_endpoints(
+        [c for c in endpoint_cases(products) if keep(c[0])], args, results
+    ))
+    run_crud([c for c in crud_cases(products) if keep(c[0])], args, results)
+
+    out = {
+        "meta": {
+            "scale": args.scale,
+            "sales": SCALES[args.scale],
+            "products": products,
+            "seed_seconds": seed_seconds,
+            "async_db": settings.ASYNC_DB,
+            "git": git_revision(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "platform": platform.platform(),
+        },
+        "cases": results,
+    }
+    path = args.output or f"bench-{args.scale}.json"
+    with open(path, "w") as f:
+        json.dump(out, f, indent=2)
+    print(f"results written to {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+"""
+Maintenance commands.
+
+    python manage.py rebuild-rollups [--start 2024-01-01] [--end 2024-12-31]
+    python manage.py rebuild-category-closure
+    python manage.py archive-history [--before 2024-01-01]
+    python manage.py snapshot-inventory [--until 2025-12-31] [--since 2025-01-01]
+    python manage.py check-inventory-snapshots [--repair]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+
+from app import crud
+from app.config import settings
+from app.database import SessionLocal
+
+
+def rebuild_rollups(args):
+    db = SessionLocal()
+    try:
+        crud.rollups.rebuild_rollups(db, args.start, args.end)
+    finally:
+        db.close()
+    print("Sales rollups rebuilt.")
+
+
+def rebuild_category_closure(args):
+    db = SessionLocal()
+    try:
+        crud.categories.rebuild_closure(db)
+    finally:
+        db.close()
+    print("Category closure rebuilt.")
+
+
+def archive_history(args):
+    before = args.before or date.today() - timedelta(days=settings.HISTORY_RETENTION_DAYS)
+    if before > date.today():
+        raise SystemExit("--before must not be in the future")
+    db = SessionLocal()
+    try:
+        result = crud.inventory_history.archive_history(db, datetime.combine(before, datetime.min.time()))
+    except BlockingIOError:
+        raise SystemExit(f"another archive-history run holds {settings.HISTORY_ARCHIVE_DIR}")
+    finally:
+        db.close()
+    print(f"Archived {result['archived']} history rows before {result['horizon']} "
+          f"to {settings.HISTORY_ARCHIVE_DIR}; {result['deleted']} rows compacted "
+          f"into opening balances for {result['products']} products.")
+
+
+def snapshot_inventory(args):
+    until = datetime.combine(args.until or date.today(), datetime.min.time())
+    since = datetime.combine(args.since, datetime.min.time()) if args.since else None
+    db = SessionLocal()
+    try:
+        written = crud.snapshot_inventory(db, until, since)
+    finally:
+        db.close()
+    if written:
+        print(f"Wrote {len(written)} inventory snapshots, {written[0]} to {written[-1]}.")
+    else:
+        print("Inventory snapshots are up to date.")
+
+
+def check_inventory_snapshots(args):
+    db = SessionLocal()
+    try:
+        report = crud.check_snapshots(db, repair=args.repair)
+    finally:
+        db.close()
+    for bad in report:
+        sample = ", ".join(f"product {pid}: {stored} != {replay}" for pid, stored, replay in bad["sample"])
+        print(f"{bad['taken_at']}: {bad['mismatched']} products differ ({sample})")
+    if not report:
+        print("All inventory snapshots match the history.")
+    elif args.repair:
+        print(f"Rewrote {len(report)} snapshots from the history.")
+    else:
+        raise SystemExit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="E-commerce Admin API maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    p = commands.add_parser("rebuild-rollups", help="recompute sales rollups from raw rows")
+    p.add_argument("--start", type=date.fromisoformat, default=None)
+    p.add_argument("--end",   type=date.fromisoformat, default=None)
+    p.set_defaults(func=rebuild_rollups)
+
+    p = commands.add_parser("rebuild-category-closure",
+                            help="recompute category_closure from parent_id")
+    p.set_defaults(func=rebuild_category_closure)
+
+    p = commands.add_parser("archive-history",
+                            help="move old inventory history to compressed segment files")
+    p.add_argument("--before", type=date.fromisoformat, default=None,
+                   help="horizon date (default: HISTORY_RETENTION_DAYS ago)")
+    p.set_defaults(func=archive_history)
+
+    p = commands.add_parser("snapshot-inventory",
+                            help="write the per-product stock snapshots due since the last run")
+    p.add_argument("--until", type=date.fromisoformat, default=None,
+                   help="last snapshot, at midnight starting this day (default: today)")
+    p.add_argument("--since", type=date.fromisoformat, default=None,
+                   help="first snapshot when there are none yet (default: --until)")
+    p.set_defaults(func=snapshot_inventory)
+
+    p = commands.add_parser("check-inventory-snapshots",
+                            help="verify every snapshot against a full replay of the history")
+    p.add_argument("--repair", action="store_true", help="rewrite the snapshots that differ")
+    p.set_defaults(func=check_inventory_snapshots)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,124 +1,353 @@
-from app.database import SessionLocal, Base
-from sqlalchemy import text
-from app import models
-from datetime import datetime, timedelta
-
-
-def clear_tables(db):
-    # If you’re on MySQL, temporarily disable FK checks so deletes don’t error out
-    db.execute(text("SET FOREIGN_KEY_CHECKS = 0;"))
-    # Delete from every table, child first
-    for table in reversed(Base.metadata.sorted_tables):
-        db.execute(table.delete())
-    db.execute(text("SET FOREIGN_KEY_CHECKS = 1;"))
-    db.commit()
-
-def populate_db():
-    db = SessionLocal()
+"""
+Deterministic synthetic data generator.
+
+    python seed_data.py                                  # small demo dataset
+    python seed_data.py --reset --products 200000 --days 365 --sales-per-day 27400
+
+The same arguments (and --seed) always produce the same rows. Products are
+drawn with Zipf-distributed popularity (--zipf 0 is uniform), sales follow a
+daytime-weighted hour profile with a weekend bump, and every sale line is
+reflected in inventory: quantity_on_hand ends at (initial stock - units
+sold), and with --history-density 1 the inventory_history rows add up to
+it exactly, as if every sale had gone through the API.
+
+Rows are bulk-loaded in --batch sized transactions through the fastest path
+the database offers: plain executemany under relaxed pragmas on SQLite,
+PyMySQL's multi-row VALUES rewrite (or LOAD DATA LOCAL INFILE with
+--load-data) on MySQL, Core executemany elsewhere. Rollups, the category
+closure and the low-stock table are rebuilt at the end.
+
+Tables must be empty (sale ids are assigned here), or pass --reset.
+"""
+import argparse
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import create_engine, func, inspect, select
+
+from app import crud, models
+from app.config import settings
+from app.database import Base, SessionLocal, engine
+
+# relative sales volume per hour of the day, and per weekday (Mon..Sun)
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 3, 5, 7, 8, 9, 9, 10, 9, 9, 9, 9, 10, 11, 11, 10, 7, 4, 2]
+WEEKDAY_WEIGHTS = [0.9, 0.9, 0.9, 0.95, 1.1, 1.3, 1.2]
+QUANTITY_WEIGHTS = {1: 80, 2: 15, 3: 5}
+
+SALE_COLUMNS = ("id", "sale_date", "customer_name", "total_amount")
+ITEM_COLUMNS = ("sale_id", "product_id", "quantity", "unit_price", "line_total")
+HISTORY_COLUMNS = ("inventory_id", "product_id", "change_qty", "reason", "changed_at")
+# bulk-loaded tables whose secondary indexes SQLite drops during the load
+BULK_TABLES = (models.Sale.__table__, models.SaleItem.__table__, models.InventoryHistory.__table__)
+
+
+class Writer:
+    """Bulk INSERT of positional rows through the dialect's fastest path."""
 
-    # clear_tables(db)
-
-    # 1. Add parent Categories
-    electronics   = models.Category(name="Electronics")
-    clothing      = models.Category(name="Clothing")
-    home_kitchen  = models.Category(name="Home & Kitchen")
-    beauty        = models.Category(name="Beauty")
-    toys          = models.Category(name="Toys")
-
-    db.add_all([electronics, clothing, home_kitchen, beauty, toys])
-    db.commit()  # so each .id is populated
-
-    # 2. Add child Categories using parent objects
-    laptops       = models.Category(name="Laptops",       parent_id=electronics.id)
-    smartphones   = models.Category(name="Smartphones",   parent_id=electronics.id)
-    t_shirts      = models.Category(name="T-Shirts",      parent_id=clothing.id)
-    jeans         = models.Category(name="Jeans",         parent_id=clothing.id)
-    vacuums       = models.Category(name="Vacuums",       parent_id=home_kitchen.id)
-    coffee_makers = models.Category(name="Coffee Makers", parent_id=home_kitchen.id)
-
-    db.add_all([laptops, smartphones, t_shirts, jeans, vacuums, coffee_makers])
-    db.commit()
-
-    # 3. Add Products
-    products = [
-        models.Product(name="Apple MacBook Pro 16-inch",    sku="MBP-16-2025",        price=2499.99, category_id=laptops.id),
-        models.Product(name="Samsung Galaxy S21",           sku="SGS21-2025",         price=799.99,  category_id=smartphones.id),
-        models.Product(name="Sony WH-1000XM4 Headphones",   sku="WH-1000XM4",         price=348.00,  category_id=electronics.id),
-        models.Product(name="Nike Air Force 1 Sneakers",   sku="AF1-2025",           price=90.00,   category_id=t_shirts.id),
-        models.Product(name="Levi's 501 Original Jeans",    sku="501-2025",           price=59.99,   category_id=jeans.id),
-        models.Product(name="Dyson V11 Cordless Vacuum",    sku="DY-V11-2025",        price=599.99,  category_id=vacuums.id),
-        models.Product(name="Keurig K-Elite Coffee Maker",  sku="K-Elite-2025",       price=129.99,  category_id=coffee_makers.id),
-        models.Product(name="Olay Regenerist Face Cream",   sku="Olay-2025",          price=24.99,   category_id=beauty.id),
-        models.Product(name="LEGO Star Wars Millennium Falcon", sku="LEGO-SW-2025",   price=159.99,  category_id=toys.id),
-    ]
-    db.add_all(products)
-    db.commit()
-
-    # 4. Add Sales & SaleItems
-    now = datetime.now()
-    sales = [
-        models.Sale(total_amount=2500.00, sale_date=now - timedelta(days=10)),
-        models.Sale(total_amount=850.00,  sale_date=now - timedelta(days=15)),
-        models.Sale(total_amount=120.00,  sale_date=now - timedelta(days=20)),
-        models.Sale(total_amount=600.00,  sale_date=now - timedelta(days=5)),
-        models.Sale(total_amount=340.00,  sale_date=now - timedelta(days=1)),
-    ]
-    db.add_all(sales)
-    db.commit()
-
-    sale_items = [
-        models.SaleItem(sale_id=sales[0].id, product_id=products[0].id, quantity=1, unit_price=2499.99, line_total=2499.99),
-        models.SaleItem(sale_id=sales[1].id, product_id=products[1].id, quantity=1, unit_price=799.99,  line_total=799.99),
-        models.SaleItem(sale_id=sales[2].id, product_id=products[7].id, quantity=1, unit_price=24.99,   line_total=24.99),
-        models.SaleItem(sale_id=sales[3].id, product_id=products[4].id, quantity=2, unit_price=59.99,   line_total=119.98),
-        models.SaleItem(sale_id=sales[4].id, product_id=products[2].id, quantity=1, unit_price=348.00,  line_total=348.00),
-    ]
-    db.add_all(sale_items)
-    db.commit()
-
-    # 5. Add Inventory entries
-    inventory_data = [
-        models.Inventory(product_id=products[0].id, quantity_on_hand=50,  reorder_threshold=5),
-        models.Inventory(product_id=products[1].id, quantity_on_hand=200, reorder_threshold=20),
-        models.Inventory(product_id=products[2].id, quantity_on_hand=150, reorder_threshold=15),
-        models.Inventory(product_id=products[3].id, quantity_on_hand=30,  reorder_threshold=5),
-        models.Inventory(product_id=products[4].id, quantity_on_hand=100, reorder_threshold=10),
-        models.Inventory(product_id=products[5].id, quantity_on_hand=120, reorder_threshold=20),
-        models.Inventory(product_id=products[6].id, quantity_on_hand=80,  reorder_threshold=8),
-        models.Inventory(product_id=products[7].id, quantity_on_hand=300, reorder_threshold=30),
-        models.Inventory(product_id=products[8].id, quantity_on_hand=50,  reorder_threshold=5),
-    ]
-    db.add_all(inventory_data)
-    db.commit()
-
-    # 6. Add InventoryHistory for each inventory
-    history_entries = []
-    for inv in inventory_data:
-        # initial stock entry 30 days ago:
-        history_entries.append(
-            models.InventoryHistory(
-                inventory_id=inv.id,
-                product_id=inv.product_id,
-                change_qty=inv.quantity_on_hand,
-                reason="Initial stock",
-                changed_at=now - timedelta(days=30),
+    def __init__(self, conn, load_data: bool = False):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+        self.load_data = load_data and self.dialect == "mysql"
+        self.mark = "?" if conn.dialect.paramstyle == "qmark" else "%s"
+        self.rows = 0
+        self.deferred = []
+        self._times = None
+
+    def stamps(self, day: datetime, seconds):
+        """
+        DateTime values for `seconds` past midnight of `day`; SQLite gets
+        SQLAlchemy's storage format directly, built from a per-second table.
+        """
+        if self.dialect == "sqlite":
+            if self._times is None:
+                self._times = [f"{s // 3600:02}:{s // 60 % 60:02}:{s % 60:02}.000000"
+                               for s in range(86400)]
+            prefix = f"{day:%Y-%m-%d} "
+            return [prefix + self._times[s] for s in seconds]
+        return [day + timedelta(seconds=s) for s in seconds]
+
+    def begin_load(self):
+        if self.dialect == "sqlite":
+            for pragma in ("synchronous = OFF", "temp_store = MEMORY", "cache_size = -262144"):
+                self.conn.exec_driver_sql(f"PRAGMA {pragma}")
+            # one sorted index build at the end beats maintaining each per row;
+            # MySQL keeps them (InnoDB needs them for the foreign keys)
+            for table in BULK_TABLES:
+                existing = {ix["name"] for ix in inspect(self.conn).get_indexes(table.name)}
+                for index in table.indexes:
+                    if index.name in existing:
+                        index.drop(self.conn)
+                        self.deferred.append(index)
+        elif self.dialect == "mysql":
+            self.conn.exec_driver_sql("SET SESSION unique_checks = 0, foreign_key_checks = 0")
+        elif self.dialect == "postgresql":
+            self.conn.exec_driver_sql("SET synchronous_commit = off")
+
+    def end_load(self):
+        for index in self.deferred:
+            index.create(self.conn)
+        self.conn.commit()
+        if self.dialect == "sqlite":
+            self.conn.exec_driver_sql("PRAGMA synchronous = FULL")
+        elif self.dialect == "mysql":
+            self.conn.exec_driver_sql("SET SESSION unique_checks = 1, foreign_key_checks = 1")
+
+    def insert(self, table, columns, rows):
+        if not rows:
+            return
+        self.rows += len(rows)
+        if self.load_data:
+            return self._load_data(table, columns, rows)
+        if self.dialect in ("sqlite", "mysql"):
+            quote = self.conn.dialect.identifier_preparer.quote
+            self.conn.exec_driver_sql(
+                f"INSERT INTO {quote(table.name)} ({', '.join(map(quote, columns))}) "
+                f"VALUES ({', '.join([self.mark] * len(columns))})",
+                rows,
             )
-        )
-        # sample sale 7 days ago:
-        history_entries.append(
-            models.InventoryHistory(
-                inventory_id=inv.id,
-                product_id=inv.product_id,
-                change_qty=-2,
-                reason="Sample sale",
-                changed_at=now - timedelta(days=7),
+        else:
+            self.conn.execute(table.insert(), [dict(zip(columns, r)) for r in rows])
+
+    def _load_data(self, table, columns, rows):
+        fd, path = tempfile.mkstemp(suffix=".tsv")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.writelines(
+                    "\t".join(r"\N" if v is None else str(v) for v in row) + "\n" for row in rows
+                )
+            self.conn.exec_driver_sql(
+                f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE `{table.name}` "
+                f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)})"
             )
+        finally:
+            os.unlink(path)
+
+
+def reset_tables(conn):
+    """Delete every row of every mapped table, child tables first."""
+    tables = list(reversed(Base.metadata.sorted_tables))
+    if conn.dialect.name == "postgresql":
+        conn.exec_driver_sql(
+            f"TRUNCATE {', '.join(t.name for t in tables)} RESTART IDENTITY CASCADE"
+        )
+        return
+    if conn.dialect.name == "mysql":
+        conn.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 0")
+    for table in tables:
+        conn.execute(table.delete())
+    if conn.dialect.name == "mysql":
+        conn.exec_driver_sql("SET FOREIGN_KEY_CHECKS = 1")
+
+
+def sync_sequences(conn):
+    """PostgreSQL serials don't advance for explicit ids; move them past max(id)."""
+    if conn.dialect.name != "postgresql":
+        return
+    for table in (models.Category, models.Product, models.Inventory, models.Sale):
+        name = table.__tablename__
+        conn.exec_driver_sql(
+            f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+            f"COALESCE((SELECT MAX(id) FROM {name}), 0) + 1, false)"
         )
 
-    db.add_all(history_entries)
-    db.commit()
 
-    print("Database populated with demo data!")
+def category_levels(total: int, depth: int):
+    """Level sizes growing geometrically from the roots down to `depth` levels."""
+    depth = max(1, min(depth, total))
+    branch = max(1.0, total ** (1 / depth))
+    sizes = [max(1, round(branch ** (d + 1))) for d in range(depth - 1)]
+    sizes.append(max(1, total - sum(sizes)))
+    return sizes
+
+
+def load_catalog(w: Writer, rng: random.Random, args):
+    """Categories, products and (placeholder) inventory; returns prices and thresholds."""
+    cat_t, prod_t, inv_t = (models.Category.__table__, models.Product.__table__,
+                            models.Inventory.__table__)
+    rows, levels, next_id = [], [], 1
+    for d, size in enumerate(category_levels(args.categories, args.depth)):
+        above = levels[-1] if levels else None
+        level = list(range(next_id, next_id + size))
+        rows.extend(
+            (cid, f"Category {cid}", above[i % len(above)] if above else None)
+            for i, cid in enumerate(level)
+        )
+        levels.append(level)
+        next_id += size
+    w.insert(cat_t, ("id", "name", "parent_id"), rows)
+    parents = {r[2] for r in rows}
+    leaves = [r[0] for r in rows if r[0] not in parents]
+
+    prices = [0.0]  # index by product id
+    products = []
+    for pid in range(1, args.products + 1):
+        price = round(min(max(rng.lognormvariate(3.3, 1.0), 0.99), 9999.99), 2)
+        prices.append(price)
+        products.append((pid, f"Product {pid}", f"SKU-{pid:08d}", price, rng.choice(leaves)))
+    w.insert(prod_t, ("id", "name", "sku", "price", "category_id"), products)
+    thresholds = [0] + [rng.randint(5, 50) for _ in range(args.products)]
+    w.insert(inv_t, ("id", "product_id", "quantity_on_hand", "reorder_threshold"),
+             [(pid, pid, 0, thresholds[pid]) for pid in range(1, args.products + 1)])
+    return prices, thresholds
+
+
+def load_sales(w: Writer, rng: random.Random, args, prices):
+    """Sales, their lines and per-sale history rows; returns units sold per product."""
+    sale_t, item_t, hist_t = (models.Sale.__table__, models.SaleItem.__table__,
+                              models.InventoryHistory.__table__)
+    n = args.products
+    # popularity rank -> product id, shuffled so hot products span categories
+    by_rank = list(range(1, n + 1))
+    rng.shuffle(by_rank)
+    popularity = list(itertools.accumulate(1 / (r + 1) ** args.zipf for r in range(n)))
+    hours = list(itertools.accumulate(HOUR_WEIGHTS))
+    qty_values = list(QUANTITY_WEIGHTS)
+    qty_weights = list(itertools.accumulate(QUANTITY_WEIGHTS.values()))
+    line_counts = list(range(1, 2 * args.items_per_sale))
+
+    sold = [0] * (n + 1)
+    sales, items, history = [], [], []
+    sale_id, started = 0, time.perf_counter()
+
+    def flush():
+        w.insert(sale_t, SALE_COLUMNS, sales)
+        w.insert(item_t, ITEM_COLUMNS, items)
+        w.insert(hist_t, HISTORY_COLUMNS, history)
+        w.conn.commit()
+        sales.clear(), items.clear(), history.clear()
+
+    for d in range(args.days):
+        day = datetime.combine(args.start + timedelta(days=d), datetime.min.time())
+        count = max(0, round(args.sales_per_day * WEEKDAY_WEIGHTS[day.weekday()]
+                             * rng.uniform(0.9, 1.1)))
+        stamps = w.stamps(day, sorted(
+            h * 3600 + rng.randrange(3600)
+            for h in rng.choices(range(24), cum_weights=hours, k=count)
+        ))
+        lines = rng.choices(line_counts, k=count)
+        picks = rng.choices(by_rank, cum_weights=popularity, k=sum(lines))
+        qtys = rng.choices(qty_values, cum_weights=qty_weights, k=len(picks))
+        customers = rng.choices(range(1, args.customers + 1), k=count) if args.customers else None
+
+        pos = 0
+        for i in range(count):
+            sale_id += 1
+            stamp = stamps[i]
+            cart = {}
+            for pid, q in zip(picks[pos:pos + lines[i]], qtys[pos:pos + lines[i]]):
+                cart[pid] = cart.get(pid, 0) + q
+            pos += lines[i]
+            total = 0.0
+            for pid, q in cart.items():
+                line_total = round(q * prices[pid], 2)
+                total += line_total
+                sold[pid] += q
+                items.append((sale_id, pid, q, prices[pid], line_total))
+            sales.append((sale_id, stamp,
+                          f"Customer {customers[i]}" if customers else None, round(total, 2)))
+            if rng.random() < args.history_density:
+                reason = f"Sale #{sale_id}"
+                history.extend((pid, pid, -q, reason, stamp) for pid, q in cart.items())
+
+        if len(items) >= args.batch:
+            flush()
+            rate = sale_id / (time.perf_counter() - started)
+            print(f"  day {d + 1}/{args.days}: {sale_id:,} sales ({rate:,.0f}/s)", flush=True)
+    flush()
+    return sold, sale_id
+
+
+def load_stock(w: Writer, rng: random.Random, args, sold, thresholds):
+    """
+    Final quantity_on_hand per product -- a few below their threshold -- and
+    the opening stock rows that make the history add up to it.
+    """
+    inv_t, hist_t = models.Inventory.__table__, models.InventoryHistory.__table__
+    opening, = w.stamps(datetime.combine(args.start - timedelta(days=1), datetime.min.time()), [0])
+    final = [rng.randint(0, 4 * thresholds[pid]) for pid in range(len(sold))]
+    quote = w.conn.dialect.identifier_preparer.quote
+    w.conn.exec_driver_sql(
+        f"UPDATE {quote(inv_t.name)} SET quantity_on_hand = {w.mark} WHERE id = {w.mark}",
+        [(final[pid], pid) for pid in range(1, len(sold))],
+    )
+    w.insert(hist_t, HISTORY_COLUMNS, [
+        (pid, pid, final[pid] + sold[pid], "Initial stock", opening)
+        for pid in range(1, len(sold))
+    ])
+    w.conn.commit()
+
+
+def populate_db(args):
+    rng = random.Random(args.seed)
+    bind = engine
+    if args.load_data and engine.dialect.name == "mysql":
+        bind = create_engine(settings.DATABASE_URL, connect_args={"local_infile": True})
+
+    started = time.perf_counter()
+    with bind.connect() as conn:
+        if args.reset:
+            reset_tables(conn)
+            conn.commit()
+        elif any(conn.scalar(select(func.count()).select_from(t)) for t in
+                 (models.Category.__table__, models.Product.__table__, models.Sale.__table__)):
+            sys.exit("Tables are not empty; pass --reset to delete existing data first.")
+
+        w = Writer(conn, args.load_data)
+        w.begin_load()
+        prices, thresholds = load_catalog(w, rng, args)
+        conn.commit()
+        sold, n_sales = load_sales(w, rng, args, prices)
+        load_stock(w, rng, args, sold, thresholds)
+        w.end_load()
+        sync_sequences(conn)
+        conn.commit()
+    loaded = time.perf_counter() - started
+    print(f"Loaded {w.rows:,} rows ({n_sales:,} sales) in {loaded:.1f}s; rebuilding derived tables")
+
+    db = SessionLocal()
+    try:
+        crud.categories.rebuild_closure(db)
+        crud.inventory.rebuild_low_stock(db)
+        crud.rollups.rebuild_rollups(db)
+    finally:
+        db.close()
+    print(f"Database populated in {time.perf_counter() - started:.1f}s.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate deterministic synthetic data")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--categories", type=int, default=30, help="total categories")
+    parser.add_argument("--depth", type=int, default=2, help="levels in the category tree")
+    parser.add_argument("--products", type=int, default=200)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2024, 1, 1),
+                        help="first sale day")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--sales-per-day", type=float, default=50,
+                        help="average; weekdays and noise vary it per day")
+    parser.add_argument("--items-per-sale", type=int, default=3,
+                        help="average lines per sale (uniform over 1..2n-1)")
+    parser.add_argument("--zipf", type=float, default=1.1,
+                        help="product popularity skew exponent; 0 is uniform")
+    parser.add_argument("--customers", type=int, default=10_000,
+                        help="distinct customer names; 0 leaves them NULL")
+    parser.add_argument("--history-density", type=float, default=1.0,
+                        help="fraction of sales that log inventory_history rows")
+    parser.add_argument("--batch", type=int, default=200_000,
+                        help="sale lines per load transaction")
+    parser.add_argument("--load-data", action="store_true",
+                        help="MySQL: load through LOAD DATA LOCAL INFILE (server needs local_infile=ON)")
+    parser.add_argument("--reset", action="store_true", help="delete all existing rows first")
+    args = parser.parse_args()
+    if args.items_per_sale < 1 or args.products < 1 or args.categories < 1:
+        parser.error("--items-per-sale, --products and --categories must be at least 1")
+    populate_db(args)
+
 
 if __name__ == "__main__":
-    populate_db()
+    main()